@@ -1,5 +1,8 @@
 import argparse
-from xhcart_core.api import pack_header_icon
+import multiprocessing
+import os
+import sys
+from xhcart_core.server import request_daemon
 
 def main():
     """
@@ -9,6 +12,7 @@ def main():
     parser.add_argument('pack_json', help='pack.json文件路径')
     parser.add_argument('out_path', help='输出cart.bin文件路径')
     parser.add_argument('--verbose', action='store_true', help='打印详细信息')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='RES图片转换并行进程数（0表示全部CPU核心，默认取pack.json的build.jobs）')
     
     args = parser.parse_args()
     
@@ -17,7 +21,21 @@ def main():
     print(f"Output: {args.out_path}")
     print(f"Building...")
     
-    pack_header_icon(args.pack_json, args.out_path)
+    # 有构建守护进程（serve）在运行时交给它构建，省去启动时导入Pillow等开销
+    response = request_daemon({
+        "command": "build",
+        "pack_json": os.path.abspath(args.pack_json),
+        "out_path": os.path.abspath(args.out_path),
+        "jobs": args.jobs
+    })
+    if response is None:
+        from xhcart_core.api import pack_header_icon
+        pack_header_icon(args.pack_json, args.out_path, jobs=args.jobs)
+    elif response['status'] != 'ok':
+        print(f"Error: {response.get('message', 'build daemon request failed')}", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == '__main__':
+    # PyInstaller单文件程序中使用进程池需要freeze_support
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -1,17 +1,21 @@
+import importlib.util
+from typing import List, Optional
 from xhcart_core.config.load import load_pack_json
 from xhcart_core.format.xhgc.header import HeaderV2
 from xhcart_core.utils.io import atomic_write
-from xhcart_core.pipeline.build_icon import BuildIcon
-from xhcart_core.pipeline.build_manf import BuildManf
-from xhcart_core.pipeline.build_entry import BuildEntry
-from xhcart_core.pipeline.build_data import BuildData
-
-# 尝试导入Pillow，如果不可用则设置标志
-try:
-    import PIL
-    PILLOW_AVAILABLE = True
-except ImportError:
-    PILLOW_AVAILABLE = False
+from xhcart_core.pipeline.build_cart import CartBuilder
+
+def _require_pillow(purpose: str) -> None:
+    """
+    检查Pillow是否已安装
+
+    只查找模块而不导入，Pillow由真正转换图片的代码按需导入，缓存全部命中时不加载。
+
+    Args:
+        purpose (str): 需要Pillow的用途，用于错误信息
+    """
+    if importlib.util.find_spec('PIL') is None:
+        raise ImportError(f"Pillow is required for {purpose}. Please install it with 'pip install Pillow'")
 
 def pack_header(pack_json: str, out_path: str) -> None:
     """
@@ -33,17 +37,20 @@ def pack_header(pack_json: str, out_path: str) -> None:
     # 原子写入文件
     atomic_write(out_path, header_data)
 
-def pack_header_icon(pack_json: str, out_path: str) -> None:
+def pack_header_icon(pack_json: str, out_path: str, jobs: Optional[int] = None, incremental: bool = True, explain: bool = False, in_place: bool = False) -> None:
     """
     生成包含header和icon的cart.bin文件
 
     Args:
         pack_json (str): pack.json文件路径
         out_path (str): 输出文件路径
+        jobs (Optional[int]): RES图片转换并行进程数，覆盖pack.json中的build.jobs
+        incremental (bool): 是否按构建清单复用上一次构建中未变化的段
+        explain (bool): 是否输出每个段复用/重建的原因
+        in_place (bool): 段大小都未变化时用mmap原地修改已有cart.bin，否则仍原子重写
     """
     # 检查Pillow是否可用
-    if not PILLOW_AVAILABLE:
-        raise ImportError("Pillow is required for image processing. Please install it with 'pip install Pillow'")
+    _require_pillow('image processing')
 
     # 加载配置
     pack_spec = load_pack_json(pack_json)
@@ -52,21 +59,59 @@ def pack_header_icon(pack_json: str, out_path: str) -> None:
     if not pack_spec.icon:
         raise ValueError("icon configuration missing in pack.json")
 
-    # 创建BuildIcon对象并构建
-    builder = BuildIcon(pack_spec)
+    if jobs is not None:
+        if jobs < 0:
+            raise ValueError("jobs must be a non-negative integer")
+        pack_spec.build.jobs = jobs
+
+    # 收集全部段后一次性写出cart.bin
+    builder = CartBuilder(pack_spec, incremental=incremental, explain=explain, in_place=in_place)
     builder.build(out_path)
 
-    # 创建BuildManf对象并构建
-    manf_builder = BuildManf(pack_spec)
-    manf_builder.build(out_path)
+def watch_cart(pack_json: str, out_path: str, jobs: Optional[int] = None, in_place: bool = False, explain: bool = False, poll_interval: Optional[float] = None, debounce: Optional[float] = None) -> None:
+    """
+    监视pack.json、icon和chunk目录，文件变化后增量重建cart.bin（阻塞直到中断）
 
-    # 创建BuildEntry对象并构建
-    entry_builder = BuildEntry(pack_spec)
-    entry_builder.build(out_path)
+    Args:
+        pack_json (str): pack.json文件路径
+        out_path (str): 输出文件路径
+        jobs (Optional[int]): RES图片转换并行进程数，覆盖pack.json中的build.jobs
+        in_place (bool): 段大小都未变化时用mmap原地修改已有cart.bin
+        explain (bool): 是否输出每个段复用/重建的原因
+        poll_interval (Optional[float]): 轮询间隔（秒）
+        debounce (Optional[float]): 去抖时间（秒）
+    """
+    from xhcart_core.pipeline.watch import CartWatcher
 
-    # 创建BuildData对象并构建
-    data_builder = BuildData(pack_spec)
-    data_builder.build(out_path)
+    def rebuild():
+        # 每次构建重新读取pack.json，字体、字节码等进程内缓存保持热状态
+        pack_header_icon(pack_json, out_path, jobs=jobs, incremental=True, explain=explain, in_place=in_place)
+
+    CartWatcher(pack_json, out_path, rebuild, poll_interval=poll_interval, debounce=debounce).run()
+
+def pack_many(inputs: List[str], out_dir: str, list_path: Optional[str] = None, workers: int = 1, incremental: bool = True) -> dict:
+    """
+    批量生成cart.bin
+
+    Args:
+        inputs (List[str]): pack.json路径或glob
+        out_dir (str): 输出目录（输出文件命名见cart_output_paths）
+        list_path (Optional[str]): 每行一个pack.json路径或glob的列表文件
+        workers (int): 并行进程数（0表示全部CPU核心）
+        incremental (bool): 是否按构建清单复用上一次构建中未变化的段
+
+    Returns:
+        dict: 汇总结果
+    """
+    # 检查Pillow是否可用
+    _require_pillow('image processing')
+
+    from xhcart_core.pipeline import pack_many as batch
+    pack_paths = batch.expand_pack_inputs(inputs, list_path)
+    if not pack_paths:
+        raise ValueError("no pack.json given")
+    out_paths = batch.cart_output_paths(pack_paths, out_dir)
+    return batch.pack_many(pack_paths, out_paths, workers=workers, incremental=incremental)
 
 def inspect_header(header_path: str) -> dict:
     """
@@ -97,6 +142,19 @@ def inspect_header(header_path: str) -> dict:
     # 解析header
     return header.inspect(header_data)
 
+def open_cart(cart_path: str):
+    """
+    以mmap方式打开cart.bin，按需读取Header、槽位、MANF字段和INDEX中的文件
+
+    Args:
+        cart_path (str): cart.bin文件路径
+
+    Returns:
+        CartReader: 读取器（支持with语句，用完后close）
+    """
+    from xhcart_core.format.xhgc.reader import CartReader
+    return CartReader(cart_path)
+
 def verify_header(header_path: str) -> bool:
     """
     验证header.bin文件的CRC32
@@ -128,3 +186,43 @@ def verify_header(header_path: str) -> bool:
 
     # 比较CRC32
     return stored_crc == calculated_crc
+
+def verify_cart(inputs: List[str], workers: int = 0) -> dict:
+    """
+    校验cart.bin中的全部CRC32（Header、各段、整镜像、INDEX条目）
+
+    Args:
+        inputs (List[str]): cart.bin路径或目录（递归查找*.bin）
+        workers (int): 并行线程数（0表示全部CPU核心）
+
+    Returns:
+        dict: 汇总结果（总数、通过数、失败数和每个cart的失败区域）
+    """
+    from xhcart_core.pipeline.verify_cart import expand_cart_inputs, verify_carts
+    return verify_carts(expand_cart_inputs(inputs), workers=workers)
+
+def text_a8_batch(jobs_path: str, out_dir: str, workers: int = 1, emit_json: bool = False, emit_header: bool = False, emit_jpg: bool = False, emit_incbin: bool = False) -> dict:
+    """
+    按任务文件（JSON或CSV）批量渲染文本A8
+
+    Args:
+        jobs_path (str): 任务文件路径
+        out_dir (str): 输出目录
+        workers (int): 并行进程数（0表示全部CPU核心）
+        emit_json (bool): 是否输出JSON元数据
+        emit_header (bool): 是否输出C头文件
+        emit_jpg (bool): 是否输出JPG预览文件
+        emit_incbin (bool): 是否输出.incbin汇编桩和extern声明头文件
+
+    Returns:
+        dict: 汇总结果
+    """
+    # 检查Pillow是否可用
+    _require_pillow('text rendering')
+
+    from xhcart_core.tools.text_a8 import load_text_a8_jobs, process_text_a8_batch
+    jobs = load_text_a8_jobs(jobs_path)
+    return process_text_a8_batch(
+        jobs, out_dir, workers=workers,
+        emit_json=emit_json, emit_header=emit_header, emit_jpg=emit_jpg, emit_incbin=emit_incbin
+    )
@@ -1,11 +1,26 @@
 import argparse
+import json
+import multiprocessing
+import os
+import sys
 from pathlib import Path
-from xhcart_core.api import pack_header, pack_header_icon, inspect_header, verify_header
+from xhcart_core.api import pack_header, pack_header_icon, inspect_header, verify_header, verify_cart, text_a8_batch, watch_cart, pack_many
+from xhcart_core.server import BuildServer, request_daemon
+
+def _daemon_result(response: dict):
+    """
+    取出守护进程的结果；请求失败时打印错误并以退出码1结束
+    """
+    if response['status'] != 'ok':
+        print(f"Error: {response.get('message', 'build daemon request failed')}", file=sys.stderr)
+        sys.exit(1)
+    return response.get('result')
 
 def main():
     """
     命令行入口
     """
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser(description='XHGC Cart Header Tool')
     subparsers = parser.add_subparsers(dest='command', required=True)
     
@@ -18,6 +33,32 @@ def main():
     pack_icon_parser = subparsers.add_parser('pack-header-icon', help='Generate cart.bin with header and icon')
     pack_icon_parser.add_argument('pack_json', help='pack.json file path')
     pack_icon_parser.add_argument('-o', '--output', dest='out_path', help='Output cart.bin file path', required=True)
+    pack_icon_parser.add_argument('-j', '--jobs', type=int, default=None, help='Parallel RES image conversion processes (0 = all CPUs, default: build.jobs in pack.json)')
+    pack_icon_parser.add_argument('--no-incremental', dest='incremental', action='store_false', help='Rebuild every segment instead of reusing unchanged ones from the previous cart.bin')
+    pack_icon_parser.add_argument('--explain', action='store_true', help='Report why each segment was reused or rebuilt')
+    pack_icon_parser.add_argument('--in-place', action='store_true', help='Patch the previous cart.bin in place via mmap when no segment changes size')
+    
+    # pack-many 命令
+    pack_many_parser = subparsers.add_parser('pack-many', help='Build many carts from pack.json paths or globs in one process pool')
+    pack_many_parser.add_argument('inputs', nargs='*', help='pack.json paths or glob patterns (quote globs; ** is recursive)')
+    pack_many_parser.add_argument('-o', '--output', dest='out_dir', help='Output directory for the cart.bin files', required=True)
+    pack_many_parser.add_argument('-l', '--list', dest='list_path', default=None, help='Text file with one pack.json path or glob per line')
+    pack_many_parser.add_argument('-j', '--jobs', type=int, default=0, help='Parallel cart build processes (0 = all CPUs, default: 0)')
+    pack_many_parser.add_argument('--no-incremental', dest='incremental', action='store_false', help='Rebuild every segment of every cart')
+    
+    # watch 命令
+    watch_parser = subparsers.add_parser('watch', help='Rebuild cart.bin incrementally whenever pack.json, the icon or chunk files change')
+    watch_parser.add_argument('pack_json', help='pack.json file path')
+    watch_parser.add_argument('-o', '--output', dest='out_path', help='Output cart.bin file path', required=True)
+    watch_parser.add_argument('-j', '--jobs', type=int, default=None, help='Parallel RES image conversion processes (0 = all CPUs, default: build.jobs in pack.json)')
+    watch_parser.add_argument('--interval', type=float, default=None, help='Polling interval in seconds (default: 0.2)')
+    watch_parser.add_argument('--debounce', type=float, default=None, help='Quiet period in seconds after the last change before rebuilding (default: 0.3)')
+    watch_parser.add_argument('--explain', action='store_true', help='Report why each segment was reused or rebuilt')
+    watch_parser.add_argument('--in-place', action='store_true', help='Patch the previous cart.bin in place via mmap when no segment changes size')
+    
+    # serve 命令
+    serve_parser = subparsers.add_parser('serve', help='Run a build daemon with warm caches on a local Unix socket')
+    serve_parser.add_argument('--socket', dest='socket_path', default=None, help='Unix socket path (default: $XHCART_SOCKET, $XDG_RUNTIME_DIR/xhcart.sock or <tmp>/xhcart-<uid>.sock)')
     
     # inspect-header 命令
     inspect_parser = subparsers.add_parser('inspect-header', help='Inspect header.bin or cart.bin fields')
@@ -27,6 +68,21 @@ def main():
     verify_parser = subparsers.add_parser('verify-header', help='Verify header.bin or cart.bin CRC32')
     verify_parser.add_argument('header_path', help='header.bin or cart.bin file path')
     
+    # verify-cart 命令
+    verify_cart_parser = subparsers.add_parser('verify-cart', help='Verify every CRC32 in cart.bin images (header, segments, image, INDEX entries)')
+    verify_cart_parser.add_argument('inputs', nargs='+', help='cart.bin paths or directories (searched recursively for *.bin)')
+    verify_cart_parser.add_argument('-j', '--jobs', type=int, default=0, help='Parallel CRC threads (0 = all CPUs, default: 0)')
+    
+    # text-a8-batch 命令
+    text_batch_parser = subparsers.add_parser('text-a8-batch', help='Render many text A8 images from a JSON/CSV jobs file')
+    text_batch_parser.add_argument('jobs_path', help='Jobs file (.json or .csv) with text, font, height, out')
+    text_batch_parser.add_argument('-o', '--output', dest='out_dir', help='Output directory for relative out paths', required=True)
+    text_batch_parser.add_argument('-j', '--jobs', type=int, default=1, help='Parallel render processes (0 = all CPUs, default: 1)')
+    text_batch_parser.add_argument('--emit-json', action='store_true', help='Also write .json metadata')
+    text_batch_parser.add_argument('--emit-header', action='store_true', help='Also write .h C array header')
+    text_batch_parser.add_argument('--emit-jpg', action='store_true', help='Also write .jpg preview')
+    text_batch_parser.add_argument('--emit-incbin', action='store_true', help='Also write .S .incbin stub and extern .h (instead of --emit-header)')
+    
     args = parser.parse_args()
     
     if args.command == 'pack-header':
@@ -34,10 +90,69 @@ def main():
         print(f"Successfully generated header: {args.out_path}")
     
     elif args.command == 'pack-header-icon':
-        pack_header_icon(args.pack_json, args.out_path)
+        # 有守护进程在运行时交给它构建，否则在本进程内构建
+        response = request_daemon({
+            "command": "build",
+            "pack_json": os.path.abspath(args.pack_json),
+            "out_path": os.path.abspath(args.out_path),
+            "jobs": args.jobs,
+            "incremental": args.incremental,
+            "explain": args.explain,
+            "in_place": args.in_place
+        })
+        if response is None:
+            pack_header_icon(args.pack_json, args.out_path, jobs=args.jobs, incremental=args.incremental, explain=args.explain, in_place=args.in_place)
+        else:
+            _daemon_result(response)
+    
+    elif args.command == 'pack-many':
+        summary = pack_many(args.inputs, args.out_dir, list_path=args.list_path, workers=args.jobs, incremental=args.incremental)
+        print(json.dumps(summary, ensure_ascii=False))
+        if summary['failed']:
+            sys.exit(1)
+    
+    elif args.command == 'serve':
+        server = BuildServer(args.socket_path)
+        server.bind()
+        print(json.dumps({"step": "serve", "status": "listening", "socket": server.socket_path, "pid": os.getpid()}))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    
+    elif args.command == 'watch':
+        try:
+            watch_cart(
+                args.pack_json, args.out_path, jobs=args.jobs, in_place=args.in_place,
+                explain=args.explain, poll_interval=args.interval, debounce=args.debounce
+            )
+        except KeyboardInterrupt:
+            pass
+    
+    elif args.command == 'verify-cart':
+        summary = verify_cart(args.inputs, workers=args.jobs)
+        print(json.dumps(summary, ensure_ascii=False))
+        if summary['failed']:
+            sys.exit(1)
+    
+    elif args.command == 'text-a8-batch':
+        summary = text_a8_batch(
+            args.jobs_path, args.out_dir, workers=args.jobs,
+            emit_json=args.emit_json, emit_header=args.emit_header,
+            emit_jpg=args.emit_jpg, emit_incbin=args.emit_incbin
+        )
+        print(json.dumps(summary, ensure_ascii=False))
+        if summary['failed']:
+            sys.exit(1)
     
     elif args.command == 'inspect-header':
-        info = inspect_header(args.header_path)
+        response = request_daemon({"command": "inspect", "path": os.path.abspath(args.header_path)})
+        if response is None:
+            info = inspect_header(args.header_path)
+        else:
+            info = _daemon_result(response)
+            info['magic'] = info['magic'].encode('latin-1')
         print("Header Inspection:")
         print("-" * 80)
         print(f"Magic: {info['magic']}")
@@ -63,7 +178,11 @@ def main():
                 print(f"{slot['name']:<10} 0x{slot['offset']:04X} 0x{slot['data_offset']:08X} {slot['size']:<10} 0x{slot['crc32']:08X}")
     
     elif args.command == 'verify-header':
-        result = verify_header(args.header_path)
+        response = request_daemon({"command": "verify", "path": os.path.abspath(args.header_path)})
+        if response is None:
+            result = verify_header(args.header_path)
+        else:
+            result = _daemon_result(response)
         if result:
             print("Header CRC32 verification PASSED")
         else:
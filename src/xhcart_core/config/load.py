@@ -71,6 +71,26 @@ def load_pack_json(pack_json_path: str) -> PackSpec:
     if alignment_bytes != 4096:
         raise ConfigError("build.alignment_bytes must be 4096")
 
+    # 解析jobs
+    jobs = build_data.get('jobs', 1)
+    if isinstance(jobs, bool) or not isinstance(jobs, int) or jobs < 0:
+        raise ConfigError("build.jobs must be a non-negative integer")
+
+    # 解析dedup
+    dedup = build_data.get('dedup', False)
+    if not isinstance(dedup, bool):
+        raise ConfigError("build.dedup must be a boolean")
+
+    # 解析INDEX布局
+    index_layout = build_data.get('index_layout', 'sorted')
+    if index_layout not in ('sorted', 'hash', 'paged'):
+        raise ConfigError("build.index_layout must be \"sorted\", \"hash\" or \"paged\"")
+    index_bloom = build_data.get('index_bloom', False)
+    if not isinstance(index_bloom, bool):
+        raise ConfigError("build.index_bloom must be a boolean")
+    if index_bloom and index_layout != 'hash':
+        raise ConfigError("build.index_bloom requires build.index_layout = \"hash\"")
+
     # 创建BuildSpec
     build = BuildSpec(
         output=build_data.get('output'),
@@ -78,7 +98,11 @@ def load_pack_json(pack_json_path: str) -> PackSpec:
         align=alignment_bytes,
         alignment_bytes=alignment_bytes,
         deterministic=build_data.get('deterministic', True),
-        fail_on_conflict=build_data.get('fail_on_conflict', True)
+        fail_on_conflict=build_data.get('fail_on_conflict', True),
+        jobs=jobs,
+        dedup=dedup,
+        index_layout=index_layout,
+        index_bloom=index_bloom
     )
 
     # 解析hash字段
@@ -86,8 +110,8 @@ def load_pack_json(pack_json_path: str) -> PackSpec:
     hash_spec = HashSpec(
         header_crc32=hash_data.get('header_crc32', True),
         image_crc32=hash_data.get('image_crc32', False),
-        per_chunk_crc32=hash_data.get('per_chunk_crc32', False),
-        per_file_crc32=hash_data.get('per_file_crc32', False)
+        per_chunk_crc32=hash_data.get('per_chunk_crc32', True),
+        per_file_crc32=hash_data.get('per_file_crc32', True)
     )
 
     # 解析icon/icons字段
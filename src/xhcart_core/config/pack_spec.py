@@ -31,6 +31,10 @@ class BuildSpec:
     alignment_bytes: int = 4096
     deterministic: bool = True
     fail_on_conflict: bool = True
+    jobs: int = 1  # RES图片转换并行进程数，0表示使用全部CPU核心
+    dedup: bool = False  # DATA中内容相同的文件只存一份（改变DATA布局，需显式启用）
+    index_layout: str = 'sorted'  # INDEX条目布局：sorted（按路径排序）、hash（按path_hash分桶）或paged（4KB页+fence表）
+    index_bloom: bool = False  # hash布局时附带Bloom过滤器
 
 @dataclass
 class HashSpec:
@@ -39,8 +43,8 @@ class HashSpec:
     """
     header_crc32: bool = True
     image_crc32: bool = False
-    per_chunk_crc32: bool = False
-    per_file_crc32: bool = False
+    per_chunk_crc32: bool = True  # 地址表各段CRC32
+    per_file_crc32: bool = True
 
 @dataclass
 class PackSpec:
@@ -14,4 +14,13 @@ class ToolError(Exception):
     """
     工具错误异常
     """
-    pass
\ No newline at end of file
+    pass
+
+class LuaCompileError(ToolError):
+    """
+    Lua编译错误异常，failures包含每个失败文件的path和message
+    """
+    def __init__(self, failures: list):
+        self.failures = failures
+        details = '; '.join(f"{failure['path']}: {failure['message']}" for failure in failures)
+        super().__init__(f"{len(failures)} Lua file(s) failed to compile: {details}")
@@ -25,6 +25,11 @@ class HeaderV2:
     OFFSET_ENTRY = 252
     OFFSET_MIN_FW = 380
     
+    # flags位：声明镜像中写入了哪些CRC32，校验端据此判断CRC字段为0是否为损坏
+    FLAG_HEADER_CRC32 = 0x00000001
+    FLAG_FILE_CRC32 = 0x00000002
+    FLAG_CHUNK_CRC32 = 0x00000004
+    
     # 地址表区域
     HEADER_SIZE = 4096
     ADDR_TABLE_BASE = 0x0F00  # 3840
@@ -95,8 +100,8 @@ class HeaderV2:
         # 写入header_size
         struct.pack_into('<I', header, self.OFFSET_HEADER_SIZE, self.HEADER_SIZE)
         
-        # 写入flags
-        struct.pack_into('<I', header, self.OFFSET_FLAGS, 0)
+        # 写入flags：pack()总是写入Header CRC32
+        struct.pack_into('<I', header, self.OFFSET_FLAGS, self.FLAG_HEADER_CRC32)
         
         # 写入cart_id
         cart_id_str = self.pack_spec.meta.cart_id
@@ -171,10 +176,13 @@ class HeaderV2:
         
         return bytes(header)
     
-    def pack_without_crc(self) -> bytes:
+    def pack_without_crc(self, flags: int = 0) -> bytes:
         """
         序列化Header但不计算CRC32
         
+        Args:
+            flags (int): flags字段（FLAG_*组合）
+        
         Returns:
             bytes: 序列化后的二进制数据（CRC32字段为0）
         """
@@ -191,7 +199,7 @@ class HeaderV2:
         struct.pack_into('<I', header, self.OFFSET_HEADER_SIZE, self.HEADER_SIZE)
         
         # 写入flags
-        struct.pack_into('<I', header, self.OFFSET_FLAGS, 0)
+        struct.pack_into('<I', header, self.OFFSET_FLAGS, flags)
         
         # 写入cart_id
         cart_id_str = self.pack_spec.meta.cart_id
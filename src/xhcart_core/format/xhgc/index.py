@@ -0,0 +1,231 @@
+import struct
+
+class IndexTable:
+    """
+    XHGCIDX2 INDEX格式（slot4）
+
+    只包含格式常量和解析函数，打包端（BuildData）和读取端（CartReader）共用。
+    """
+
+    # 固定常量
+    INDEX_MAGIC = b'XHGCIDX2'
+    INDEX_VERSION = 1
+    # 含压缩条目时使用：entry.flags低4位为codec，entry.reserved为raw_size
+    INDEX_VERSION_CODEC = 2
+    # 启用solid块时使用：在version 2基础上Header扩展16字节记录块表位置
+    INDEX_VERSION_SOLID = 3
+    INDEX_SOLID_HEADER_SIZE = 48
+    # 非排序布局（hash分桶等）使用：Header flags描述其后的扩展段
+    INDEX_VERSION_LAYOUT = 4
+    INDEX_FLAG_SOLID = 0x0001
+    INDEX_FLAG_HASH = 0x0002
+    INDEX_FLAG_BLOOM = 0x0004
+    INDEX_FLAG_PAGED = 0x0008
+    INDEX_EXT_SIZE = 16
+    # Bloom过滤器探测次数
+    INDEX_BLOOM_HASHES = 4
+    # paged布局：条目和路径字符串按4KB页存放，页首8字节记录条目数和字符串区偏移
+    INDEX_PAGE_SIZE = 4096
+    INDEX_PAGE_HEADER_SIZE = 8
+    INDEX_HEADER_SIZE = 32
+    INDEX_ENTRY_SIZE = 32
+    INDEX_HEADER_FORMAT = '<8sHHIIIII'
+    INDEX_ENTRY_FORMAT = '<IIIII BB H H H I'
+
+    # 条目codec（entry.flags低4位）
+    XHGC_CODEC_NONE = 0
+    XHGC_CODEC_LZ4 = 1
+    XHGC_CODEC_LZ4_SOLID = 2
+    ENTRY_CODEC_MASK = 0x000F
+
+    # solid块：DATA末尾的块表每项16字节(块偏移, 存储大小, 原始大小, CRC32)
+    SOLID_BLOCK_SIZE = 16 * 1024
+    SOLID_BLOCK_ENTRY_SIZE = 16
+    SOLID_BLOCK_FORMAT = '<IIII'
+
+    @classmethod
+    def fnv1a_32(cls, value: str) -> int:
+        """
+        计算路径的FNV-1a 32位哈希（条目path_hash）
+        """
+        h = 0x811C9DC5
+        for byte in value.encode('utf-8'):
+            h ^= byte
+            h = (h * 0x01000193) & 0xFFFFFFFF
+        return h
+
+    @classmethod
+    def bloom_bits(cls, path_hash: int, bit_count: int) -> list:
+        """
+        由path_hash双重哈希得到Bloom过滤器的INDEX_BLOOM_HASHES个位号
+        h1 = path_hash，h2 = rotl(path_hash, 16) | 1，第i位 = (h1 + i * h2) mod bit_count
+        """
+        step = (((path_hash << 16) | (path_hash >> 16)) & 0xFFFFFFFF) | 1
+        return [((path_hash + i * step) & 0xFFFFFFFF) & (bit_count - 1) for i in range(cls.INDEX_BLOOM_HASHES)]
+
+    @classmethod
+    def parse_header(cls, index_content: bytes) -> dict:
+        """
+        解析INDEX Header及扩展段并检查范围
+
+        Args:
+            index_content (bytes): INDEX表内容
+
+        Returns:
+            dict: version、count、entries_off、strings_off、strings_size、flags，
+                以及solid（块表位置）、buckets（桶表/Bloom过滤器位置）和pages（页和fence表位置），没有时为None
+        """
+        if len(index_content) < cls.INDEX_HEADER_SIZE:
+            raise ValueError("INDEX too short")
+
+        magic, version, entry_size, count, entries_off, strings_off, strings_size, flags = struct.unpack_from(
+            cls.INDEX_HEADER_FORMAT, index_content, 0
+        )
+        if magic != cls.INDEX_MAGIC or entry_size != cls.INDEX_ENTRY_SIZE or version not in (
+            cls.INDEX_VERSION, cls.INDEX_VERSION_CODEC, cls.INDEX_VERSION_SOLID, cls.INDEX_VERSION_LAYOUT
+        ):
+            raise ValueError("Unsupported INDEX format")
+        if version == cls.INDEX_VERSION_SOLID:
+            flags = cls.INDEX_FLAG_SOLID
+        elif version != cls.INDEX_VERSION_LAYOUT:
+            flags = 0
+        known_flags = cls.INDEX_FLAG_SOLID | cls.INDEX_FLAG_HASH | cls.INDEX_FLAG_BLOOM | cls.INDEX_FLAG_PAGED
+        if flags & ~known_flags or (flags & cls.INDEX_FLAG_HASH and flags & cls.INDEX_FLAG_PAGED):
+            raise ValueError("Unsupported INDEX flags")
+
+        header = {
+            'version': version,
+            'count': count,
+            'entries_off': entries_off,
+            'strings_off': strings_off,
+            'strings_size': strings_size,
+            'flags': flags,
+            'solid': None,
+            'buckets': None,
+            'pages': None
+        }
+        ext_off = cls.INDEX_HEADER_SIZE
+        if flags & cls.INDEX_FLAG_SOLID:
+            if len(index_content) < ext_off + cls.INDEX_EXT_SIZE:
+                raise ValueError("INDEX too short")
+            table_off, block_count, block_size, _ = struct.unpack_from('<IIII', index_content, ext_off)
+            header['solid'] = {'table_off': table_off, 'block_count': block_count, 'block_size': block_size}
+            ext_off += cls.INDEX_EXT_SIZE
+        if flags & cls.INDEX_FLAG_HASH:
+            if len(index_content) < ext_off + cls.INDEX_EXT_SIZE:
+                raise ValueError("INDEX too short")
+            bucket_count, buckets_off, bloom_off, bloom_size = struct.unpack_from('<IIII', index_content, ext_off)
+            if bucket_count == 0 or bucket_count & (bucket_count - 1) or buckets_off + (bucket_count + 1) * 4 > len(index_content):
+                raise ValueError("INDEX bucket table out of range")
+            if bloom_size and (bloom_size & (bloom_size - 1) or bloom_off + bloom_size > len(index_content)):
+                raise ValueError("INDEX bloom filter out of range")
+            header['buckets'] = {
+                'bucket_count': bucket_count,
+                'buckets_off': buckets_off,
+                'bloom_off': bloom_off,
+                'bloom_size': bloom_size
+            }
+            ext_off += cls.INDEX_EXT_SIZE
+        if flags & cls.INDEX_FLAG_PAGED:
+            if len(index_content) < ext_off + cls.INDEX_EXT_SIZE:
+                raise ValueError("INDEX too short")
+            page_size, page_count, fence_off, pages_off = struct.unpack_from('<IIII', index_content, ext_off)
+            ext_off += cls.INDEX_EXT_SIZE
+            if page_size < cls.INDEX_PAGE_HEADER_SIZE + cls.INDEX_ENTRY_SIZE or fence_off < ext_off \
+                    or fence_off + page_count * 4 > pages_off or pages_off + page_count * page_size > len(index_content):
+                raise ValueError("INDEX pages out of range")
+            header['pages'] = {
+                'page_size': page_size,
+                'page_count': page_count,
+                'fence_off': fence_off,
+                'pages_off': pages_off
+            }
+            return header
+        if entries_off < ext_off or strings_off + strings_size > len(index_content) or entries_off + count * entry_size > strings_off:
+            raise ValueError("INDEX tables out of range")
+        return header
+
+    @classmethod
+    def iter_entries(cls, index_content: bytes, header: dict):
+        """
+        按存储顺序遍历INDEX条目
+
+        Args:
+            index_content (bytes): INDEX表内容
+            header (dict): parse_header()的返回值
+
+        Yields:
+            tuple: (条目字段元组, 路径字符串起点, 路径字符串区终点)；path_off相对字符串起点
+        """
+        pages = header['pages']
+        if pages is None:
+            strings_off = header['strings_off']
+            strings_end = strings_off + header['strings_size']
+            for i in range(header['count']):
+                fields = struct.unpack_from(cls.INDEX_ENTRY_FORMAT, index_content, header['entries_off'] + i * cls.INDEX_ENTRY_SIZE)
+                yield fields, strings_off, strings_end
+            return
+
+        total = 0
+        for page in range(pages['page_count']):
+            page_off = pages['pages_off'] + page * pages['page_size']
+            count, strings_off = struct.unpack_from('<HH', index_content, page_off)
+            if cls.INDEX_PAGE_HEADER_SIZE + count * cls.INDEX_ENTRY_SIZE > strings_off or strings_off > pages['page_size']:
+                raise ValueError("INDEX page out of range")
+            for i in range(count):
+                fields = struct.unpack_from(
+                    cls.INDEX_ENTRY_FORMAT, index_content, page_off + cls.INDEX_PAGE_HEADER_SIZE + i * cls.INDEX_ENTRY_SIZE
+                )
+                yield fields, page_off, page_off + pages['page_size']
+            total += count
+        if total != header['count']:
+            raise ValueError("INDEX page entry count mismatch")
+
+    @classmethod
+    def entry_from_fields(cls, fields: tuple, path: str, version: int) -> dict:
+        """
+        把iter_entries()产出的条目字段转换为BuildData.build_index输入格式的条目
+
+        Args:
+            fields (tuple): 条目字段元组
+            path (str): 条目路径
+            version (int): INDEX版本
+
+        Returns:
+            dict: 索引条目
+        """
+        _, _, data_off, size, crc32, res_type, img_format, width, height, flags, raw_size = fields
+        return {
+            'path': path,
+            'offset': data_off,
+            'size': size,
+            'crc32': crc32,
+            'type': res_type,
+            'format': img_format,
+            'width': width,
+            'height': height,
+            'codec': flags & cls.ENTRY_CODEC_MASK if version != cls.INDEX_VERSION else cls.XHGC_CODEC_NONE,
+            'raw_size': raw_size if version != cls.INDEX_VERSION else size
+        }
+
+    @classmethod
+    def parse(cls, index_content: bytes) -> tuple:
+        """
+        解析INDEX表
+
+        Args:
+            index_content (bytes): INDEX表内容
+
+        Returns:
+            tuple: (parse_header()的返回值, 按路径字典序排列的条目列表)
+        """
+        header = cls.parse_header(index_content)
+        index_entries = []
+        for fields, strings_off, strings_end in cls.iter_entries(index_content, header):
+            path_start = strings_off + fields[1]
+            path_end = index_content.index(b'\x00', path_start, strings_end)
+            path = bytes(index_content[path_start:path_end]).decode('utf-8')
+            index_entries.append(cls.entry_from_fields(fields, path, header['version']))
+        if header['flags'] & (cls.INDEX_FLAG_HASH | cls.INDEX_FLAG_PAGED):
+            index_entries.sort(key=lambda x: x['path'])
+        return header, index_entries
@@ -0,0 +1,31 @@
+class ManfTable:
+    """
+    MANF段格式（slot2）
+
+    只包含格式常量，打包端（BuildManf）和读取端（CartReader）共用。
+    """
+
+    # MANF Header 固定值
+    MANF_MAGIC = 0x464E414D  # "MANF"
+    MANF_VERSION = 1
+    MANF_HEADER_SIZE = 16
+    # 字段表每项8字节：字段ID(1) + 保留(3) + 字段偏移(4)
+    FIELD_ENTRY_SIZE = 8
+
+    # 字段ID映射
+    FIELD_IDS = {
+        'title': 0x01,
+        'title_zh': 0x02,
+        'publisher': 0x03,
+        'version': 0x04,
+        'cart_id': 0x05,
+        'entry': 0x06,
+        'min_fw': 0x07,
+        'id': 0x08,
+        'description_default': 0x09,
+        'description_zh': 0x0A,
+        'category': 0x0B,
+        'tags': 0x0C,
+        'author_name': 0x0D,
+        'author_contact': 0x0E
+    }
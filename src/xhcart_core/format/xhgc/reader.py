@@ -0,0 +1,320 @@
+import bisect
+import functools
+import mmap
+import struct
+from typing import Dict, Iterator, Optional, Union
+from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.format.xhgc.header import HeaderV2
+from xhcart_core.format.xhgc.index import IndexTable
+from xhcart_core.format.xhgc.manf import ManfTable
+
+class CartReader:
+    """
+    基于mmap的cart.bin只读访问
+
+    打开时只映射文件，不读取任何段；Header字段、地址表、MANF和INDEX都在首次访问时
+    按需解析。按路径查找条目时根据INDEX布局使用二分查找（sorted）、桶表和Bloom
+    过滤器（hash）或fence表（paged），只触及查找路径上的少量页。未压缩文件的内容
+    以DATA的memoryview切片返回，不复制数据。
+
+    返回的memoryview引用映射区域，close()前需要先释放（或在with块内使用完毕）。
+    """
+
+    def __init__(self, path: str):
+        """
+        打开并映射cart.bin
+
+        Args:
+            path (str): cart.bin文件路径
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                raise ValueError(f"Not a cart image: {path}")
+        self._view = memoryview(self._mm)
+        if len(self._mm) < HeaderV2.HEADER_SIZE or self._mm[:len(HeaderV2.MAGIC)] != HeaderV2.MAGIC:
+            self.close()
+            raise ValueError(f"Not a cart image: {path}")
+        # 最近一次解压的solid块(块号, 数据)，同一块内的连续读取不重复解压
+        self._solid_cache = None
+
+    def __enter__(self) -> 'CartReader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        解除映射；仍有未释放的memoryview时抛出BufferError
+        """
+        if self._mm is None:
+            return
+        self._view.release()
+        self._mm.close()
+        self._mm = None
+
+    @property
+    def size(self) -> int:
+        return len(self._mm)
+
+    @functools.cached_property
+    def header(self) -> Dict:
+        """
+        Header字段（格式与inspect_header相同）
+        """
+        return HeaderV2(pack_spec=None).inspect(bytes(self._view[:HeaderV2.HEADER_SIZE]))
+
+    def slot(self, slot_index: int) -> tuple:
+        """
+        读取地址表槽位
+
+        Args:
+            slot_index (int): 槽位索引（AddrTable.SLOT_*）
+
+        Returns:
+            tuple: (offset, size, crc32)
+        """
+        return AddrTable.read_slot(self._mm, slot_index)
+
+    def segment(self, slot_index: int) -> memoryview:
+        """
+        返回槽位指向的段内容（memoryview，不复制）
+
+        Args:
+            slot_index (int): 槽位索引（AddrTable.SLOT_*）
+
+        Returns:
+            memoryview: 段内容，槽位为空时长度为0
+        """
+        offset, size, _ = self.slot(slot_index)
+        if size == 0:
+            return self._view[0:0]
+        if offset + size > len(self._mm):
+            raise ValueError(f"slot{slot_index} out of range: offset={offset} size={size}")
+        return self._view[offset:offset + size]
+
+    def view(self, offset: int, size: int) -> memoryview:
+        """
+        返回镜像中[offset, offset + size)的memoryview（不复制），越界时抛出ValueError
+        """
+        if offset < 0 or size < 0 or offset + size > len(self._mm):
+            raise ValueError(f"range out of image: offset={offset} size={size}")
+        return self._view[offset:offset + size]
+
+    @functools.cached_property
+    def _manf_fields(self) -> Dict[int, tuple]:
+        manf = self.segment(AddrTable.SLOT_MANF)
+        if len(manf) == 0:
+            return {}
+        if len(manf) < ManfTable.MANF_HEADER_SIZE:
+            raise ValueError("MANF too short")
+        magic, _, total_size, field_count = struct.unpack_from('<IIII', manf, 0)
+        if magic != ManfTable.MANF_MAGIC or total_size > len(manf) or ManfTable.MANF_HEADER_SIZE + field_count * ManfTable.FIELD_ENTRY_SIZE > total_size:
+            raise ValueError("Unsupported MANF format")
+        fields = {}
+        for i in range(field_count):
+            field_id, offset = struct.unpack_from('<B3xI', manf, ManfTable.MANF_HEADER_SIZE + i * ManfTable.FIELD_ENTRY_SIZE)
+            if offset + 2 > total_size:
+                raise ValueError("MANF field out of range")
+            size = struct.unpack_from('<H', manf, offset)[0]
+            if offset + 2 + size > total_size:
+                raise ValueError("MANF field out of range")
+            fields[field_id] = (offset + 2, size)
+        return fields
+
+    def manf_field(self, name: str) -> Optional[Union[str, int]]:
+        """
+        按字段名读取MANF字段
+
+        Args:
+            name (str): 字段名（ManfTable.FIELD_IDS的键，例如title、cart_id、tags）
+
+        Returns:
+            Optional[Union[str, int]]: cart_id为整数，其他为字符串；字段不存在时为None
+        """
+        if name not in ManfTable.FIELD_IDS:
+            raise KeyError(f"Unknown MANF field: {name}")
+        field = self._manf_fields.get(ManfTable.FIELD_IDS[name])
+        if field is None:
+            return None
+        offset, size = field
+        value = self.segment(AddrTable.SLOT_MANF)[offset:offset + size]
+        if name == 'cart_id':
+            return struct.unpack('<Q', value)[0]
+        return bytes(value).decode('utf-8')
+
+    @functools.cached_property
+    def _index(self) -> Dict:
+        index_offset, index_size, _ = self.slot(AddrTable.SLOT_INDEX)
+        # 只解析Header和扩展段，条目在查找时按需读取
+        header = IndexTable.parse_header(self.segment(AddrTable.SLOT_INDEX))
+        return dict(header, index_offset=index_offset, index_size=index_size)
+
+    @property
+    def index_header(self) -> Dict:
+        """
+        INDEX Header及扩展段（IndexTable.parse_header的返回值，附加index_offset/index_size）
+        """
+        return self._index
+
+    def _index_entry(self, entry_off: int, strings_start: int, strings_end: int) -> tuple:
+        """
+        读取INDEX段内偏移entry_off处的条目，返回(字段元组, 路径UTF-8字节)
+        """
+        base = self._index['index_offset']
+        fields = struct.unpack_from(IndexTable.INDEX_ENTRY_FORMAT, self._mm, base + entry_off)
+        path_start = base + strings_start + fields[1]
+        path_end = self._mm.find(b'\x00', path_start, base + strings_end)
+        if path_end < 0:
+            raise ValueError("INDEX path string out of range")
+        return fields, self._mm[path_start:path_end]
+
+    def find(self, path: str) -> Optional[Dict]:
+        """
+        按路径查找INDEX条目
+
+        Args:
+            path (str): cart内路径
+
+        Returns:
+            Optional[Dict]: 与parse_index格式相同的条目，不存在时为None
+        """
+        index = self._index
+        path_bytes = path.encode('utf-8')
+        path_hash = IndexTable.fnv1a_32(path)
+        base = index['index_offset']
+        entry_size = IndexTable.INDEX_ENTRY_SIZE
+
+        if index['pages'] is not None:
+            # fence表二分选页，只读取这一页
+            pages = index['pages']
+            fence_count = pages['page_count']
+            fences = struct.unpack_from(f'<{fence_count}I', self._mm, base + pages['fence_off'])
+            page = bisect.bisect_right(fences, path_hash) - 1
+            if page < 0:
+                return None
+            page_off = pages['pages_off'] + page * pages['page_size']
+            count = struct.unpack_from('<H', self._mm, base + page_off)[0]
+            if IndexTable.INDEX_PAGE_HEADER_SIZE + count * entry_size > pages['page_size']:
+                raise ValueError("INDEX page out of range")
+            first = page_off + IndexTable.INDEX_PAGE_HEADER_SIZE
+            candidates = [(first + i * entry_size, page_off, page_off + pages['page_size']) for i in range(count)]
+        elif index['buckets'] is not None:
+            buckets = index['buckets']
+            if buckets['bloom_size']:
+                bloom_off = base + buckets['bloom_off']
+                for bit in IndexTable.bloom_bits(path_hash, buckets['bloom_size'] * 8):
+                    if not self._mm[bloom_off + (bit >> 3)] & (1 << (bit & 7)):
+                        return None
+            bucket = path_hash & (buckets['bucket_count'] - 1)
+            start, end = struct.unpack_from('<II', self._mm, base + buckets['buckets_off'] + bucket * 4)
+            if start > end or end > index['count']:
+                raise ValueError("INDEX bucket table corrupted")
+            strings_end = index['strings_off'] + index['strings_size']
+            candidates = [
+                (index['entries_off'] + i * entry_size, index['strings_off'], strings_end) for i in range(start, end)
+            ]
+        else:
+            # 条目按路径排序：二分查找路径，命中后用path_hash确认
+            strings_end = index['strings_off'] + index['strings_size']
+            lo, hi = 0, index['count']
+            candidates = []
+            while lo < hi:
+                mid = (lo + hi) // 2
+                entry_off = index['entries_off'] + mid * entry_size
+                fields, entry_path = self._index_entry(entry_off, index['strings_off'], strings_end)
+                if entry_path < path_bytes:
+                    lo = mid + 1
+                elif entry_path > path_bytes:
+                    hi = mid
+                else:
+                    candidates = [(entry_off, index['strings_off'], strings_end)]
+                    break
+
+        for entry_off, strings_start, strings_end in candidates:
+            entry_hash = struct.unpack_from('<I', self._mm, base + entry_off)[0]
+            if entry_hash != path_hash:
+                continue
+            fields, entry_path = self._index_entry(entry_off, strings_start, strings_end)
+            if entry_path == path_bytes:
+                return IndexTable.entry_from_fields(fields, path, index['version'])
+        return None
+
+    def entries(self) -> Iterator[Dict]:
+        """
+        按存储顺序遍历所有INDEX条目
+        """
+        index = self._index
+        base = index['index_offset']
+        for fields, strings_start, strings_end in IndexTable.iter_entries(self.segment(AddrTable.SLOT_INDEX), index):
+            path_start = base + strings_start + fields[1]
+            path_end = self._mm.find(b'\x00', path_start, base + strings_end)
+            if path_end < 0:
+                raise ValueError("INDEX path string out of range")
+            yield IndexTable.entry_from_fields(fields, self._mm[path_start:path_end].decode('utf-8'), index['version'])
+
+    def read(self, path: str) -> memoryview:
+        """
+        读取文件内容
+
+        未压缩的文件返回DATA段的memoryview切片（不复制）；LZ4压缩的文件解压后返回，
+        solid块中的文件解压整个块（缓存最近一个块）后返回其中的切片。
+
+        Args:
+            path (str): cart内路径
+
+        Returns:
+            memoryview: 文件内容
+        """
+        entry = self.find(path)
+        if entry is None:
+            raise KeyError(path)
+        return self.read_entry(entry)
+
+    def read_entry(self, entry: Dict) -> memoryview:
+        """
+        读取find()/entries()返回的条目内容（见read）
+        """
+        data = self.segment(AddrTable.SLOT_DATA)
+        codec = entry['codec']
+        if codec == IndexTable.XHGC_CODEC_LZ4_SOLID:
+            block = self._solid_block(data, entry['offset'])
+            start = entry['size']
+            if start + entry['raw_size'] > len(block):
+                raise ValueError(f"solid entry out of range: {entry['path']}")
+            return memoryview(block)[start:start + entry['raw_size']]
+
+        if entry['offset'] + entry['size'] > len(data):
+            raise ValueError(f"DATA entry out of range: {entry['path']}")
+        stored = data[entry['offset']:entry['offset'] + entry['size']]
+        if codec == IndexTable.XHGC_CODEC_NONE:
+            return stored
+        if codec == IndexTable.XHGC_CODEC_LZ4:
+            from xhcart_core.tools.lz4_block import decompress_block
+            return memoryview(decompress_block(stored, entry['raw_size']))
+        raise ValueError(f"Unsupported codec {codec}: {entry['path']}")
+
+    def _solid_block(self, data: memoryview, block_id: int) -> bytes:
+        if self._solid_cache is not None and self._solid_cache[0] == block_id:
+            return self._solid_cache[1]
+        solid = self._index['solid']
+        if solid is None or block_id >= solid['block_count']:
+            raise ValueError(f"solid block out of range: {block_id}")
+        table_entry = solid['table_off'] + block_id * IndexTable.SOLID_BLOCK_ENTRY_SIZE
+        if table_entry + IndexTable.SOLID_BLOCK_ENTRY_SIZE > len(data):
+            raise ValueError("solid block table out of range")
+        block_off, size, raw_size, _ = struct.unpack_from(IndexTable.SOLID_BLOCK_FORMAT, data, table_entry)
+        if block_off + size > len(data):
+            raise ValueError(f"solid block out of range: {block_id}")
+        stored = data[block_off:block_off + size]
+        if size == raw_size:
+            block = bytes(stored)
+        else:
+            from xhcart_core.tools.lz4_block import decompress_block
+            block = decompress_block(stored, raw_size)
+        self._solid_cache = (block_id, block)
+        return block
@@ -1,9 +1,18 @@
+import hashlib
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from xhcart_core.config.pack_spec import PackSpec
-from xhcart_core.utils.io import atomic_write
+from typing import Optional
+from xhcart_core.config.pack_spec import PackSpec, BuildSpec, HashSpec
+from xhcart_core.format.xhgc.index import IndexTable
 from xhcart_core.utils.align import align_to
-from xhcart_core.utils.hashing import calculate_crc32
-from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.utils.hashing import calculate_crc32, crc32_combine
+from xhcart_core.tools.luavm import LuaCompiler
+from xhcart_core.tools.image_cache import cached_image_conversion
+from xhcart_core.tools.lz4_block import compress_block
+from xhcart_core.utils.cache import file_sha256, open_default_cache
 import struct
 
 class BuildData:
@@ -11,13 +20,29 @@ class BuildData:
     构建DATA区的类
     """
 
-    # 固定常量
-    HEADER_SIZE = 4096
-    ALIGN_SIZE = 4096
-    INDEX_MAGIC = b'XHGCIDX2'
-    INDEX_VERSION = 1
-    INDEX_HEADER_SIZE = 32
-    INDEX_ENTRY_SIZE = 32
+    # INDEX格式常量（定义见IndexTable）
+    INDEX_MAGIC = IndexTable.INDEX_MAGIC
+    INDEX_VERSION = IndexTable.INDEX_VERSION
+    INDEX_VERSION_CODEC = IndexTable.INDEX_VERSION_CODEC
+    INDEX_VERSION_SOLID = IndexTable.INDEX_VERSION_SOLID
+    INDEX_SOLID_HEADER_SIZE = IndexTable.INDEX_SOLID_HEADER_SIZE
+    INDEX_VERSION_LAYOUT = IndexTable.INDEX_VERSION_LAYOUT
+    INDEX_FLAG_SOLID = IndexTable.INDEX_FLAG_SOLID
+    INDEX_FLAG_HASH = IndexTable.INDEX_FLAG_HASH
+    INDEX_FLAG_BLOOM = IndexTable.INDEX_FLAG_BLOOM
+    INDEX_FLAG_PAGED = IndexTable.INDEX_FLAG_PAGED
+    INDEX_EXT_SIZE = IndexTable.INDEX_EXT_SIZE
+    # hash布局：平均每桶条目数上限、Bloom过滤器每条目位数
+    INDEX_BUCKET_LOAD = 2
+    INDEX_BLOOM_BITS_PER_ENTRY = 10
+    INDEX_PAGE_SIZE = IndexTable.INDEX_PAGE_SIZE
+    INDEX_PAGE_HEADER_SIZE = IndexTable.INDEX_PAGE_HEADER_SIZE
+    SOLID_BLOCK_ENTRY_SIZE = IndexTable.SOLID_BLOCK_ENTRY_SIZE
+    SOLID_BLOCK_SIZE = IndexTable.SOLID_BLOCK_SIZE
+    INDEX_HEADER_SIZE = IndexTable.INDEX_HEADER_SIZE
+    INDEX_ENTRY_SIZE = IndexTable.INDEX_ENTRY_SIZE
+    INDEX_HEADER_FORMAT = IndexTable.INDEX_HEADER_FORMAT
+    INDEX_ENTRY_FORMAT = IndexTable.INDEX_ENTRY_FORMAT
     XHGC_RES_IMAGE = 1
     XHGC_RES_SCRIPT = 2
     XHGC_IMG_NONE = 0
@@ -26,6 +51,12 @@ class BuildData:
     RES_IMAGE_MAGIC = b'XIMG'
     RES_IMAGE_FORMAT_BGRA8888 = 1
     RES_IMAGE_HEADER_SIZE = 24
+    READ_BLOCK_SIZE = 1024 * 1024
+    XHGC_CODEC_NONE = IndexTable.XHGC_CODEC_NONE
+    XHGC_CODEC_LZ4 = IndexTable.XHGC_CODEC_LZ4
+    XHGC_CODEC_LZ4_SOLID = IndexTable.XHGC_CODEC_LZ4_SOLID
+    ENTRY_CODEC_MASK = IndexTable.ENTRY_CODEC_MASK
+    CHUNK_CODECS = {'none': XHGC_CODEC_NONE, 'lz4': XHGC_CODEC_LZ4}
 
     def __init__(self, pack_spec: PackSpec):
         """
@@ -35,24 +66,33 @@ class BuildData:
             pack_spec (PackSpec): 配置数据
         """
         self.pack_spec = pack_spec
+        self.compiled_lua = {}
+        # 最近一次write_data/parse_index得到的solid块表位置，build_index写入INDEX v3 Header
+        self.solid_layout = None
 
-    def build(self, out_path: str):
+    def build_segments(self) -> tuple:
         """
-        构建包含DATA区的cart.bin
+        在内存中生成INDEX段（slot4）和DATA段（slot5）payload
 
-        Args:
-            out_path (str): 输出文件路径
+        Returns:
+            tuple: (index_content, data_content, files_in_data)
         """
-        # 读取现有的cart.bin文件
-        with open(out_path, 'rb') as f:
-            cart_data = bytearray(f.read())
+        data_content = io.BytesIO()
+        index_entries, _, _ = self.write_data(data_content, self.plan_files())
 
-        # 提取header数据
-        header_data = bytearray(cart_data[:self.HEADER_SIZE])
+        # 构建INDEX表（slot4）
+        index_content = self.build_index(index_entries)
 
-        # 构建DATA区数据
-        data_content = bytearray()
-        index_entries = []
+        return index_content, data_content.getbuffer(), len(index_entries)
+
+    def plan_files(self) -> list:
+        """
+        按DATA写入顺序列出所有LUA/RES文件，不读取文件内容
+
+        Returns:
+            list: 文件计划列表，每项包含path、file_path、chunk_type、chunk
+        """
+        planned_files = []
 
         # 处理LUA和RES chunks
         for chunk in self.pack_spec.chunks:
@@ -78,222 +118,649 @@ class BuildData:
             if order == 'lex':
                 files.sort()
 
-            # 处理每个文件
             for file_path in files:
                 # 计算相对路径
                 rel_path = self._calculate_relative_path(file_path, strip_prefix)
 
-                # 生成包内路径
-                pack_path = name_prefix + rel_path
-
-                # 读取文件内容，RES图片可按配置转换为BGRA8888 raw数据
-                file_content, file_meta = self._read_chunk_file(file_path, chunk_type, chunk)
-
-                # 计算文件大小和CRC32
-                file_size = len(file_content)
-                file_crc32 = calculate_crc32(file_content)
-                file_offset = len(data_content)
-
-                # 添加到DATA区
-                data_content.extend(file_content)
-
-                # 记录索引条目
-                index_entries.append({
-                    'path': pack_path,
-                    'offset': file_offset,
-                    'size': file_size,
-                    'crc32': file_crc32,
-                    'type': file_meta.get('type', self._resource_type_for_chunk(chunk_type)),
-                    'format': file_meta.get('format', self.XHGC_IMG_NONE),
-                    'width': file_meta.get('width', 0),
-                    'height': file_meta.get('height', 0)
+                planned_files.append({
+                    'path': name_prefix + rel_path,
+                    'file_path': file_path,
+                    'chunk_type': chunk_type,
+                    'chunk': chunk
                 })
 
-        # 计算DATA区大小和CRC32
-        data_size = len(data_content)
-        data_crc32 = calculate_crc32(data_content) if data_size > 0 else 0
+        return planned_files
 
-        # 构建INDEX表（slot4）
-        index_content = self.build_index(index_entries)
+    def index_size(self, planned_files: list) -> int:
+        """
+        根据文件计划预先计算INDEX段大小（只与条目数和路径有关）
 
-        # 计算INDEX大小和CRC32
-        index_size = len(index_content)
-        index_crc32 = calculate_crc32(index_content) if index_size > 0 else 0
-
-        # 计算INDEX偏移量（4KB对齐，在LUA之后）
-        index_offset = align_to(len(cart_data), self.ALIGN_SIZE)
-
-        # 计算DATA偏移量（4KB对齐，在INDEX之后）
-        data_offset = align_to(index_offset + index_size, self.ALIGN_SIZE)
-        index_padding_size = data_offset - (index_offset + index_size)
-        index_padding = b'\x00' * index_padding_size
-
-        # 写入slot4 (INDEX)
-        AddrTable.write_slot(header_data, AddrTable.SLOT_INDEX, index_offset, index_size, index_crc32)
-
-        # 写入slot5 (DATA)
-        AddrTable.write_slot(header_data, AddrTable.SLOT_DATA, data_offset, data_size, data_crc32)
-
-        # 计算总大小并对齐
-        total_size = data_offset + data_size
-        aligned_size = align_to(total_size, self.ALIGN_SIZE)
-        padding_size = aligned_size - total_size
-        padding = b'\x00' * padding_size
-
-        # 从配置中读取CRC32设置
-        header_crc32 = True  # 默认计算header的CRC32
-        image_crc32 = False  # 默认不计算整个镜像的CRC32
-
-        if self.pack_spec.hash:
-            header_crc32 = self.pack_spec.hash.header_crc32
-            image_crc32 = self.pack_spec.hash.image_crc32
-
-        existing_payload = cart_data[self.HEADER_SIZE:]
-        cart_data = (
-            header_data
-            + existing_payload
-            + index_content
-            + index_padding
-            + data_content
-            + padding
-        )
-        AddrTable.write_present_slot_payload_crcs(header_data, cart_data)
+        Args:
+            planned_files (list): plan_files()的返回值
 
-        # 计算并写入Header CRC32
-        if header_crc32:
-            header_data_with_crc = self.calculate_and_write_header_crc(header_data)
-        else:
-            header_data_with_crc = header_data
-
-        # 组装完整数据（包含更新后的header）- 顺序：INDEX在DATA之前
-        cart_data = (
-            header_data_with_crc
-            + existing_payload
-            + index_content
-            + index_padding
-            + data_content
-            + padding
-        )
+        Returns:
+            int: INDEX段字节数
+        """
+        flags = self._index_layout_flags(self._solid_enabled(planned_files))
+        if flags & self.INDEX_FLAG_PAGED:
+            pages = self._index_pages([item['path'] for item in planned_files])
+            return self._index_pages_off(flags, len(pages)) + len(pages) * self.INDEX_PAGE_SIZE
+        strings_size = sum(len(item['path'].encode('utf-8')) + 1 for item in planned_files)
+        return self._index_tables_size(flags, len(planned_files)) + strings_size
+
+    def write_data(self, out, planned_files: list, segment_crc32: bool = True) -> tuple:
+        """
+        将文件逐个流式写入DATA区，并累计DATA区CRC32
+
+        内存占用只与单个文件大小有关：普通文件按块读取，RES图片逐个转换。
+        每个字节只计算一次CRC：启用hash.per_file_crc32时先算文件CRC，
+        再用crc32_combine合并为DATA区CRC；否则直接累计DATA区CRC，
+        INDEX条目crc32填0。segment_crc32为False且未启用per_file_crc32时
+        不计算DATA区CRC（返回0）。
+        启用build.dedup时，最终内容相同的文件只写入一次，重复的INDEX条目
+        指向同一个data_off/size/crc32。chunk设置compress = "lz4"时写入的是
+        压缩后的数据（见_iter_encoded_files），size/crc32对应压缩数据。
+        chunk设置solid_max_size时，不超过该大小的文件按顺序拼入固定大小的
+        solid块，块满后整体LZ4压缩写入DATA，块表写在DATA末尾（self.solid_layout）。
 
-        # 如果需要计算整个镜像的CRC32
-        if image_crc32:
-            # 计算整个镜像的CRC32
-            image_crc = calculate_crc32(cart_data)
-
-            # 创建新的header副本，写入镜像CRC32到slot14
-            final_header_data = header_data_with_crc.copy()
-            AddrTable.write_slot(final_header_data, AddrTable.SLOT_IMAGE_CRC, 0, len(cart_data), image_crc)
-
-            # 再次计算Header CRC32（因为修改了slot6）
-            if header_crc32:
-                final_header_data = self.calculate_and_write_header_crc(final_header_data)
-
-            # 最终组装数据
-            cart_data = (
-                final_header_data
-                + existing_payload
-                + index_content
-                + index_padding
-                + data_content
-                + padding
-            )
+        Args:
+            out: 已定位到DATA段起点的可写二进制文件对象
+            planned_files (list): plan_files()的返回值
+            segment_crc32 (bool): 是否需要DATA区CRC32
+
+        Returns:
+            tuple: (index_entries, data_size, data_crc32)
+        """
+        per_file_crc32 = self._per_file_crc32_enabled()
+        dedup = self._dedup_enabled()
+        size_counts = self._source_size_counts(planned_files) if dedup else {}
+        blobs = {}
+        index_entries = []
+        data_size = 0
+        data_crc32 = 0
+
+        def write_block(stored: bytes) -> tuple:
+            # solid块整体写入DATA，返回(data_off, 块CRC32)
+            nonlocal data_size, data_crc32
+            block_offset = data_size
+            block_crc32 = calculate_crc32(stored)
+            out.write(stored)
+            data_crc32 = crc32_combine(data_crc32, block_crc32, len(stored))
+            data_size += len(stored)
+            return block_offset, block_crc32
+
+        solid = _SolidBlockPacker(self.SOLID_BLOCK_SIZE, write_block) if self._solid_enabled(planned_files) else None
+
+        for item, (file_blocks, file_meta) in zip(planned_files, self._iter_encoded_files(planned_files)):
+            digest = self._content_digest(item, file_blocks, size_counts) if dedup else None
+            blob_key = (file_meta.get('solid', False), digest)
+            if digest is not None and blob_key in blobs:
+                if hasattr(file_blocks, 'close'):
+                    file_blocks.close()
+                index_entries.append(self._index_entry(item, file_meta, *blobs[blob_key]))
+                continue
 
-        # 原子写入文件
-        atomic_write(out_path, cart_data)
-
-        # 输出JSON格式结果
-        import json, sys
-        result = {
-            "step": "data",
-            "status": "ok",
-            "file_size": len(cart_data),
-            "index_offset": index_offset,
-            "index_size": index_size,
-            "index_crc32": f"0x{index_crc32:08X}",
-            "data_offset": data_offset,
-            "data_size": data_size,
-            "data_crc32": f"0x{data_crc32:08X}",
-            "index_padding_size": index_padding_size,
-            "padding_size": len(padding),
-            "files_in_data": len(index_entries)
+            if file_meta.get('solid'):
+                # 小文件放入solid块：offset记录块号，size记录块内偏移
+                raw_data = file_blocks[0]
+                block_id, block_off = solid.add(raw_data)
+                location = (block_id, block_off, calculate_crc32(raw_data) if per_file_crc32 else 0)
+                if digest is not None:
+                    blobs[blob_key] = location
+                index_entries.append(self._index_entry(item, file_meta, *location))
+                continue
+
+            file_offset = data_size
+            file_crc32 = 0
+            for block in file_blocks:
+                out.write(block)
+                if per_file_crc32:
+                    file_crc32 = calculate_crc32(block, file_crc32)
+                elif segment_crc32:
+                    data_crc32 = calculate_crc32(block, data_crc32)
+                data_size += len(block)
+
+            file_size = data_size - file_offset
+            if per_file_crc32:
+                data_crc32 = crc32_combine(data_crc32, file_crc32, file_size)
+            if digest is not None:
+                blobs[blob_key] = (file_offset, file_size, file_crc32)
+
+            # 记录索引条目
+            index_entries.append(self._index_entry(item, file_meta, file_offset, file_size, file_crc32))
+
+        self.solid_layout = None
+        if solid is not None:
+            # 写出最后一个块，块表放在DATA末尾
+            solid.flush()
+            table_offset = data_size
+            table = solid.table()
+            out.write(table)
+            data_crc32 = calculate_crc32(table, data_crc32)
+            data_size += len(table)
+            self.solid_layout = {
+                'table_off': table_offset,
+                'block_count': len(solid.blocks),
+                'block_size': self.SOLID_BLOCK_SIZE
+            }
+
+        if not per_file_crc32 and not segment_crc32:
+            # 未逐块累计，solid块合并的部分CRC没有意义
+            data_crc32 = 0
+        return index_entries, data_size, data_crc32
+
+    def _index_entry(self, item: dict, file_meta: dict, offset: int, size: int, crc32: int) -> dict:
+        return {
+            'path': item['path'],
+            'offset': offset,
+            'size': size,
+            'crc32': crc32,
+            'type': file_meta.get('type', self._resource_type_for_chunk(item['chunk_type'])),
+            'format': file_meta.get('format', self.XHGC_IMG_NONE),
+            'width': file_meta.get('width', 0),
+            'height': file_meta.get('height', 0),
+            'codec': self.XHGC_CODEC_LZ4_SOLID if file_meta.get('solid') else file_meta.get('codec', self.XHGC_CODEC_NONE),
+            'raw_size': file_meta.get('raw_size', size)
         }
-        print(json.dumps(result))
-        sys.stdout.flush()
+
+    def _source_size_counts(self, planned_files: list) -> dict:
+        """
+        统计源文件大小出现次数；大小唯一的普通文件不可能与其他普通文件重复，不需要哈希
+        """
+        counts = {}
+        for item in planned_files:
+            try:
+                size = os.path.getsize(item['file_path'])
+            except OSError:
+                # 读取时再报错
+                continue
+            counts[size] = counts.get(size, 0) + 1
+        return counts
+
+    def _content_digest(self, item: dict, file_blocks, size_counts: dict) -> Optional[str]:
+        """
+        计算文件最终内容的SHA-256，用于DATA去重
+
+        转换后的图片和字节码已在内存中，直接哈希；按块读取的普通文件只在
+        源文件大小与其他文件相同时才预先读取一遍计算哈希，否则返回None（不参与去重）。
+        """
+        if isinstance(file_blocks, list):
+            digest = hashlib.sha256()
+            for block in file_blocks:
+                digest.update(block)
+            return digest.hexdigest()
+
+        try:
+            size = os.path.getsize(item['file_path'])
+        except OSError:
+            return None
+        if size_counts.get(size, 0) < 2:
+            return None
+        return file_sha256(item['file_path'])
+
+    def dedup_report(self, index_entries: list) -> dict:
+        """
+        统计INDEX中与前面条目共享DATA区域的条目数和节省的字节数
+
+        Args:
+            index_entries (list): 索引条目列表（build_index输入或parse_index结果）
+
+        Returns:
+            dict: {"files": 重复条目数, "bytes_saved": 节省的字节数}
+        """
+        seen = set()
+        files = 0
+        bytes_saved = 0
+        for entry in index_entries:
+            solid = entry.get('codec') == self.XHGC_CODEC_LZ4_SOLID
+            # solid条目的offset/size是块号和块内偏移，按原始大小统计
+            size = entry['raw_size'] if solid else entry['size']
+            if size == 0:
+                continue
+            region = (solid, entry['offset'], entry['size'])
+            if region in seen:
+                files += 1
+                bytes_saved += size
+            seen.add(region)
+        return {"files": files, "bytes_saved": bytes_saved}
+
+    def _iter_encoded_files(self, planned_files: list):
+        """
+        在_iter_chunk_files基础上按chunk的compress配置压缩文件，产出(数据块列表, 元数据)
+
+        jobs > 1时压缩任务交给线程池（lz4压缩时释放GIL），最多提前jobs*2个文件，
+        结果仍按计划顺序产出。压缩后不小于原始数据的文件按原样存储（codec为none）。
+        不超过chunk solid_max_size的文件不单独压缩，元数据标记solid，由write_data放入solid块。
+        """
+        codecs = [self._chunk_codec(item['chunk']) for item in planned_files]
+        thresholds = [self._chunk_solid_max_size(item['chunk']) for item in planned_files]
+        files = self._iter_chunk_files(planned_files)
+        if not any(codecs):
+            yield from files
+            return
+
+        jobs = self._resolve_jobs()
+        pool = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        pending = deque()
+        try:
+            for codec, solid_max_size, (file_blocks, file_meta) in zip(codecs, thresholds, files):
+                if codec == self.XHGC_CODEC_NONE:
+                    pending.append((None, file_blocks, file_meta))
+                elif pool is None:
+                    pending.append((None, *_encode_file(b''.join(file_blocks), file_meta, codec, solid_max_size)))
+                else:
+                    pending.append((pool.submit(_encode_file, b''.join(file_blocks), file_meta, codec, solid_max_size), None, None))
+                while len(pending) > max(1, jobs * 2):
+                    yield self._finish_encoded(pending.popleft())
+            while pending:
+                yield self._finish_encoded(pending.popleft())
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _finish_encoded(self, pending_item: tuple) -> tuple:
+        future, file_blocks, file_meta = pending_item
+        if future is not None:
+            return future.result()
+        return file_blocks, file_meta
+
+    def _chunk_solid_max_size(self, chunk: dict) -> int:
+        solid_max_size = chunk.get('solid_max_size', 0)
+        if isinstance(solid_max_size, bool) or not isinstance(solid_max_size, int) or not 0 <= solid_max_size <= self.SOLID_BLOCK_SIZE:
+            raise ValueError(f"chunk solid_max_size must be an integer between 0 and {self.SOLID_BLOCK_SIZE}")
+        if solid_max_size and self._chunk_codec(chunk) != self.XHGC_CODEC_LZ4:
+            raise ValueError("chunk solid_max_size requires compress = \"lz4\"")
+        return solid_max_size
+
+    def _solid_enabled(self, planned_files: list) -> bool:
+        return any(self._chunk_solid_max_size(item['chunk']) for item in planned_files)
+
+    def _chunk_codec(self, chunk: dict) -> int:
+        compress = chunk.get('compress', 'none')
+        if not isinstance(compress, str) or compress.lower() not in self.CHUNK_CODECS:
+            raise ValueError(f"Unsupported chunk compress: {compress}")
+        return self.CHUNK_CODECS[compress.lower()]
+
+    def _iter_chunk_files(self, planned_files: list):
+        """
+        按计划顺序逐个产出(数据块迭代器, 元数据)
+
+        jobs > 1时RES图片转换提前提交到进程池，但结果仍按计划顺序消费，
+        因此DATA布局与串行转换完全一致。同时在途的转换任务数限制为jobs*2，
+        避免提前转换的图片堆积在内存中。
+        """
+        jobs = self._resolve_jobs()
+        image_indices = [
+            i for i, item in enumerate(planned_files)
+            if item['chunk_type'] == 'RES' and self._should_convert_res_image(item['file_path'], item['chunk'])
+        ]
+
+        if jobs <= 1 or len(image_indices) <= 1:
+            for item in planned_files:
+                yield self._open_chunk_file(item['file_path'], item['chunk_type'], item['chunk'])
+            return
+
+        window = jobs * 2
+        futures = {}
+        submit_pos = 0
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(image_indices)))
+        try:
+            for i, item in enumerate(planned_files):
+                while submit_pos < len(image_indices) and (
+                    len(futures) < window or image_indices[submit_pos] <= i
+                ):
+                    index = image_indices[submit_pos]
+                    image_item = planned_files[index]
+                    futures[index] = pool.submit(_convert_res_image_job, image_item['file_path'], image_item['chunk'])
+                    submit_pos += 1
+
+                future = futures.pop(i, None)
+                if future is None:
+                    yield self._open_chunk_file(item['file_path'], item['chunk_type'], item['chunk'])
+                else:
+                    raw_data, file_meta = future.result()
+                    yield [raw_data], file_meta
+        finally:
+            # 出错时取消尚未开始的转换任务
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def compile_lua_files(self, planned_files: list, extra_paths: list = ()) -> dict:
+        """
+        批量编译启用compile的LUA chunk文件（以及extra_paths，如ENTRY入口文件）
+
+        所有文件并发交给luavm编译，全部结束后统一报告错误；
+        字节码保存在compiled_lua中，写入DATA时直接使用。
+
+        Args:
+            planned_files (list): plan_files()的返回值
+            extra_paths (list): 需要一起编译的其他Lua文件
+
+        Returns:
+            dict: str(路径) -> 字节码；没有需要编译的LUA chunk文件时为空
+        """
+        sources = self.lua_compile_sources(planned_files)
+        if not sources:
+            return {}
+
+        compiler = LuaCompiler(jobs=self._resolve_jobs(), cache=open_default_cache('luac'))
+        compiled = compiler.compile_files(list(extra_paths) + sources)
+        self.compiled_lua.update(compiled)
+        return compiled
+
+    def lua_compile_sources(self, planned_files: list) -> list:
+        """
+        列出需要编译为字节码写入DATA的LUA chunk文件
+        """
+        return [
+            item['file_path'] for item in planned_files
+            if item['chunk_type'] == 'LUA' and self._should_compile_lua(item['chunk'])
+        ]
+
+    def _should_compile_lua(self, chunk: dict) -> bool:
+        compile_lua = chunk.get('compile', False)
+        if not isinstance(compile_lua, bool):
+            raise ValueError("LUA compile must be a boolean")
+        return compile_lua
+
+    def _resolve_jobs(self) -> int:
+        jobs = 1
+        if self.pack_spec is not None and self.pack_spec.build is not None:
+            jobs = self.pack_spec.build.jobs
+        if jobs == 0:
+            jobs = os.cpu_count() or 1
+        return jobs
+
+    def _dedup_enabled(self) -> bool:
+        if self.pack_spec is None or self.pack_spec.build is None:
+            return BuildSpec().dedup
+        return self.pack_spec.build.dedup
+
+    def _index_layout_flags(self, solid: bool) -> int:
+        """
+        根据build.index_layout/index_bloom和是否启用solid块计算INDEX Header flags
+        """
+        build = self.pack_spec.build if self.pack_spec is not None and self.pack_spec.build is not None else BuildSpec()
+        flags = self.INDEX_FLAG_SOLID if solid else 0
+        if build.index_layout == 'hash':
+            flags |= self.INDEX_FLAG_HASH
+            if build.index_bloom:
+                flags |= self.INDEX_FLAG_BLOOM
+        elif build.index_layout == 'paged':
+            flags |= self.INDEX_FLAG_PAGED
+        return flags
+
+    def _index_pages(self, paths: list) -> list:
+        """
+        把路径按(path_hash, 路径)排序后依次装入INDEX_PAGE_SIZE字节的页
+
+        path_hash相同的条目总在同一页，设备端按fence key选中一页后不需要再看相邻页。
+
+        Returns:
+            list: 每页一个[(path_hash, path), ...]列表
+        """
+        keyed = sorted((self._fnv1a_32(path), path) for path in paths)
+        capacity = self.INDEX_PAGE_SIZE - self.INDEX_PAGE_HEADER_SIZE
+        pages = []
+        page = []
+        used = 0
+        i = 0
+        while i < len(keyed):
+            # 取出path_hash相同的一组条目
+            j = i
+            run_size = 0
+            while j < len(keyed) and keyed[j][0] == keyed[i][0]:
+                run_size += self.INDEX_ENTRY_SIZE + len(keyed[j][1].encode('utf-8')) + 1
+                j += 1
+            if run_size > capacity:
+                raise ValueError(f"INDEX entries do not fit in one page: {keyed[i][1]}")
+            if used + run_size > capacity:
+                pages.append(page)
+                page = []
+                used = 0
+            page.extend(keyed[i:j])
+            used += run_size
+            i = j
+        if page:
+            pages.append(page)
+        return pages
+
+    def _index_pages_off(self, flags: int, page_count: int) -> int:
+        """
+        paged布局第一页相对INDEX段起点的偏移：Header、扩展和fence表之后按页对齐
+        """
+        fence_off = self.INDEX_HEADER_SIZE + self.INDEX_EXT_SIZE * (2 if flags & self.INDEX_FLAG_SOLID else 1)
+        return align_to(fence_off + page_count * 4, self.INDEX_PAGE_SIZE)
+
+    def _index_tables_size(self, flags: int, count: int) -> int:
+        """
+        INDEX中除string table以外的字节数（Header、扩展、entry表、桶表、Bloom过滤器）
+        """
+        size = self.INDEX_HEADER_SIZE + count * self.INDEX_ENTRY_SIZE
+        if flags & self.INDEX_FLAG_SOLID:
+            size += self.INDEX_EXT_SIZE
+        if flags & self.INDEX_FLAG_HASH:
+            size += self.INDEX_EXT_SIZE + (self._index_bucket_count(count) + 1) * 4
+        if flags & self.INDEX_FLAG_BLOOM:
+            size += self._index_bloom_size(count)
+        return size
+
+    def _index_bucket_count(self, count: int) -> int:
+        """
+        桶数：不小于count / INDEX_BUCKET_LOAD的2的幂（设备端用掩码取桶号）
+        """
+        bucket_count = 1
+        while bucket_count * self.INDEX_BUCKET_LOAD < count:
+            bucket_count <<= 1
+        return bucket_count
+
+    def _index_bloom_size(self, count: int) -> int:
+        """
+        Bloom过滤器字节数：每条目约INDEX_BLOOM_BITS_PER_ENTRY位，向上取2的幂，至少8字节
+        """
+        bloom_size = 8
+        while bloom_size * 8 < count * self.INDEX_BLOOM_BITS_PER_ENTRY:
+            bloom_size <<= 1
+        return bloom_size
+
+    def _per_file_crc32_enabled(self) -> bool:
+        if self.pack_spec is None or self.pack_spec.hash is None:
+            return HashSpec().per_file_crc32
+        return self.pack_spec.hash.per_file_crc32
 
     def build_index(self, index_entries):
         """
         构建INDEX表
 
+        build.index_layout = "hash"时条目按path_hash分桶排列（桶内按path_hash、路径排序），
+        entry表和string table之后追加桶表（bucket_count + 1个uint32起始条目号），
+        启用build.index_bloom时再追加Bloom过滤器，使用version 4。
+        build.index_layout = "paged"时条目和路径字符串按4KB页存放（见_build_paged_index）。
+
         Args:
             index_entries (list): 索引条目列表
 
         Returns:
             bytearray: INDEX表内容
         """
-        import struct
-
         # 按路径字典序升序排列
         index_entries.sort(key=lambda x: x['path'])
 
         # 创建INDEX内容
         index_content = bytearray()
 
+        # 只有包含压缩条目时才使用新版本，未压缩的INDEX与之前完全相同
+        codec_version = any(entry.get('codec', self.XHGC_CODEC_NONE) != self.XHGC_CODEC_NONE for entry in index_entries)
+
         entry_count = len(index_entries)
+        solid_layout = self.solid_layout
+        flags = self._index_layout_flags(solid_layout is not None)
+        if flags & self.INDEX_FLAG_PAGED:
+            return self._build_paged_index(index_entries, flags)
+        path_hashes = {entry['path']: self._fnv1a_32(entry['path']) for entry in index_entries}
+        bucket_count = self._index_bucket_count(entry_count)
+        if flags & self.INDEX_FLAG_HASH:
+            # 同一桶的条目连续存放，设备端读一次桶表即可得到候选条目范围
+            index_entries = sorted(index_entries, key=lambda x: (
+                path_hashes[x['path']] & (bucket_count - 1), path_hashes[x['path']], x['path']
+            ))
+
         entries_off = self.INDEX_HEADER_SIZE
+        if flags & self.INDEX_FLAG_SOLID:
+            entries_off += self.INDEX_EXT_SIZE
+        if flags & self.INDEX_FLAG_HASH:
+            entries_off += self.INDEX_EXT_SIZE
         strings_off = entries_off + entry_count * self.INDEX_ENTRY_SIZE
 
         entries_content = bytearray()
         strings_content = bytearray()
         for entry in index_entries:
-            path_bytes = entry['path'].encode('utf-8') + b'\x00'
             path_off = len(strings_content)
-            strings_content.extend(path_bytes)
-
-            data_offset = entry['offset']
-            data_size = entry['size']
-            crc32 = entry['crc32']
-            entry_data = struct.pack(
-                '<IIIII BB H H H I',
-                self._fnv1a_32(entry['path']),
-                path_off,
-                data_offset,
-                data_size,
-                crc32,
-                entry.get('type', 0),
-                entry.get('format', 0),
-                entry.get('width', 0),
-                entry.get('height', 0),
-                0,  # flags
-                0   # reserved
-            )
-            assert len(entry_data) == self.INDEX_ENTRY_SIZE, (
-                f"INDEX entry length should be {self.INDEX_ENTRY_SIZE} bytes, got {len(entry_data)}"
-            )
-            entries_content.extend(entry_data)
+            strings_content.extend(entry['path'].encode('utf-8') + b'\x00')
+            entries_content.extend(self._index_entry_bytes(entry, path_hashes[entry['path']], path_off, codec_version or flags))
+
+        if flags & ~self.INDEX_FLAG_SOLID:
+            version = self.INDEX_VERSION_LAYOUT
+        elif solid_layout is not None:
+            version = self.INDEX_VERSION_SOLID
+        elif codec_version:
+            version = self.INDEX_VERSION_CODEC
+        else:
+            version = self.INDEX_VERSION
 
         strings_size = len(strings_content)
         index_content.extend(struct.pack(
-            '<8sHHIIIII',
+            self.INDEX_HEADER_FORMAT,
             self.INDEX_MAGIC,
-            self.INDEX_VERSION,
+            version,
             self.INDEX_ENTRY_SIZE,
             entry_count,
             entries_off,
             strings_off,
             strings_size,
-            0
+            flags if version == self.INDEX_VERSION_LAYOUT else 0
         ))
+        index_content.extend(self._index_solid_ext())
+        if flags & self.INDEX_FLAG_HASH:
+            # hash扩展：桶数、桶表偏移、Bloom过滤器偏移和字节数（均相对INDEX段起点）
+            buckets_off = strings_off + strings_size
+            bloom_off = buckets_off + (bucket_count + 1) * 4
+            bloom_size = self._index_bloom_size(entry_count) if flags & self.INDEX_FLAG_BLOOM else 0
+            index_content.extend(struct.pack(
+                '<IIII', bucket_count, buckets_off, bloom_off if bloom_size else 0, bloom_size
+            ))
         index_content.extend(entries_content)
         index_content.extend(strings_content)
 
+        if flags & self.INDEX_FLAG_HASH:
+            # 桶表：bucket_count + 1个起始条目号，桶b的条目为[starts[b], starts[b + 1])
+            starts = [0] * (bucket_count + 1)
+            for entry in index_entries:
+                starts[(path_hashes[entry['path']] & (bucket_count - 1)) + 1] += 1
+            for bucket in range(bucket_count):
+                starts[bucket + 1] += starts[bucket]
+            index_content.extend(struct.pack(f'<{bucket_count + 1}I', *starts))
+            if bloom_size:
+                bloom = bytearray(bloom_size)
+                for path_hash in path_hashes.values():
+                    for bit in IndexTable.bloom_bits(path_hash, bloom_size * 8):
+                        bloom[bit >> 3] |= 1 << (bit & 7)
+                index_content.extend(bloom)
+
         return index_content
 
+    def _build_paged_index(self, index_entries: list, flags: int) -> bytearray:
+        """
+        构建paged布局的INDEX（version 4，INDEX_FLAG_PAGED）
+
+        条目按(path_hash, 路径)排序后装入4KB页，每页是
+        [条目数u16, 字符串区偏移u16, 保留u32][entry...][路径字符串...]，entry.path_off相对页起点。
+        Header之后的fence表为每页第一个条目的path_hash，设备端缓存fence表（或读一个扇区）
+        二分选页，再读一页即可完成查找。
+        """
+        by_path = {entry['path']: entry for entry in index_entries}
+        pages = self._index_pages(list(by_path))
+        pages_off = self._index_pages_off(flags, len(pages))
+
+        index_content = bytearray(struct.pack(
+            self.INDEX_HEADER_FORMAT,
+            self.INDEX_MAGIC,
+            self.INDEX_VERSION_LAYOUT,
+            self.INDEX_ENTRY_SIZE,
+            len(index_entries),
+            pages_off,
+            pages_off + len(pages) * self.INDEX_PAGE_SIZE,
+            0,
+            flags
+        ))
+        index_content.extend(self._index_solid_ext())
+        fence_off = len(index_content) + self.INDEX_EXT_SIZE
+        # paged扩展：页大小、页数、fence表偏移、第一页偏移（均相对INDEX段起点）
+        index_content.extend(struct.pack('<IIII', self.INDEX_PAGE_SIZE, len(pages), fence_off, pages_off))
+        index_content.extend(struct.pack(f'<{len(pages)}I', *(page[0][0] for page in pages)))
+        index_content.extend(bytes(pages_off - len(index_content)))
+
+        for page in pages:
+            strings_off = self.INDEX_PAGE_HEADER_SIZE + len(page) * self.INDEX_ENTRY_SIZE
+            entries_content = bytearray()
+            strings_content = bytearray()
+            for path_hash, path in page:
+                path_off = strings_off + len(strings_content)
+                strings_content.extend(path.encode('utf-8') + b'\x00')
+                entries_content.extend(self._index_entry_bytes(by_path[path], path_hash, path_off, True))
+            page_content = struct.pack('<HHI', len(page), strings_off, 0) + entries_content + strings_content
+            index_content.extend(page_content)
+            index_content.extend(bytes(self.INDEX_PAGE_SIZE - len(page_content)))
+        return index_content
+
+    def _index_entry_bytes(self, entry: dict, path_hash: int, path_off: int, extended: bool) -> bytes:
+        """
+        打包一个32字节INDEX条目；extended为False时（version 1）flags/reserved写0
+        """
+        data_size = entry['size']
+        entry_data = struct.pack(
+            self.INDEX_ENTRY_FORMAT,
+            path_hash,
+            path_off,
+            entry['offset'],
+            data_size,
+            entry['crc32'],
+            entry.get('type', 0),
+            entry.get('format', 0),
+            entry.get('width', 0),
+            entry.get('height', 0),
+            entry.get('codec', self.XHGC_CODEC_NONE) if extended else 0,  # flags
+            entry.get('raw_size', data_size) if extended else 0  # v2+: raw_size，v1: reserved
+        )
+        assert len(entry_data) == self.INDEX_ENTRY_SIZE, (
+            f"INDEX entry length should be {self.INDEX_ENTRY_SIZE} bytes, got {len(entry_data)}"
+        )
+        return entry_data
+
+    def _index_solid_ext(self) -> bytes:
+        """
+        solid扩展：块表偏移（相对DATA段起点）、块数、块大小、保留；未启用solid块时为空
+        """
+        solid_layout = self.solid_layout
+        if solid_layout is None:
+            return b''
+        return struct.pack('<IIII', solid_layout['table_off'], solid_layout['block_count'], solid_layout['block_size'], 0)
+
+    def parse_index(self, index_content: bytes) -> list:
+        """
+        解析INDEX表，返回与build_index输入格式相同的条目列表
+
+        Args:
+            index_content (bytes): INDEX表内容
+
+        Returns:
+            list: 索引条目列表（按路径字典序）
+        """
+        header, index_entries = IndexTable.parse(index_content)
+        self.solid_layout = header['solid']
+        return index_entries
+
     def _fnv1a_32(self, value: str) -> int:
-        h = 0x811C9DC5
-        for byte in value.encode('utf-8'):
-            h ^= byte
-            h = (h * 0x01000193) & 0xFFFFFFFF
-        return h
+        return IndexTable.fnv1a_32(value)
 
     def _find_files(self, glob_pattern: str, exclude_patterns: list) -> list:
         """
@@ -325,21 +792,59 @@ class BuildData:
 
         return files
 
+    def read_planned_file(self, item: dict) -> tuple:
+        """
+        读取plan_files()中的一个文件，返回(写入DATA的字节, 元数据)
+        """
+        payload, file_meta = self._read_chunk_file(item['file_path'], item['chunk_type'], item['chunk'])
+        codec = self._chunk_codec(item['chunk'])
+        if codec != self.XHGC_CODEC_NONE:
+            blocks, file_meta = _encode_file(payload, file_meta, codec, self._chunk_solid_max_size(item['chunk']))
+            payload = blocks[0]
+        return payload, file_meta
+
     def _read_chunk_file(self, file_path: str, chunk_type: str, chunk: dict) -> tuple:
         """
         读取chunk文件内容。RES图片可选转换为BGRA8888 raw数据。
         """
-        if chunk_type == 'RES' and self._should_convert_res_image(file_path, chunk):
-            return self._convert_res_image(file_path, chunk)
+        file_blocks, file_meta = self._open_chunk_file(file_path, chunk_type, chunk)
+        return b''.join(file_blocks), file_meta
 
-        with open(file_path, 'rb') as f:
-            return f.read(), {
-                'type': self._resource_type_for_chunk(chunk_type),
+    def _open_chunk_file(self, file_path: str, chunk_type: str, chunk: dict) -> tuple:
+        """
+        打开chunk文件，返回(数据块迭代器, 元数据)。普通文件按READ_BLOCK_SIZE分块读取。
+        """
+        if chunk_type == 'RES' and self._should_convert_res_image(file_path, chunk):
+            raw_data, file_meta = self._convert_res_image(file_path, chunk)
+            return [raw_data], file_meta
+
+        if chunk_type == 'LUA' and self._should_compile_lua(chunk):
+            # 优先使用批量编译结果，否则单独编译
+            luac_data = self.compiled_lua.get(str(file_path))
+            if luac_data is None:
+                luac_data = LuaCompiler(cache=open_default_cache('luac')).compile_file(Path(file_path))
+            return [luac_data], {
+                'type': self.XHGC_RES_SCRIPT,
                 'format': self.XHGC_IMG_NONE,
                 'width': 0,
                 'height': 0
             }
 
+        return self._iter_file_blocks(file_path), {
+            'type': self._resource_type_for_chunk(chunk_type),
+            'format': self.XHGC_IMG_NONE,
+            'width': 0,
+            'height': 0
+        }
+
+    def _iter_file_blocks(self, file_path: str):
+        with open(file_path, 'rb') as f:
+            while True:
+                block = f.read(self.READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
     def _resource_type_for_chunk(self, chunk_type: str) -> int:
         if chunk_type == 'LUA':
             return self.XHGC_RES_SCRIPT
@@ -371,12 +876,24 @@ class BuildData:
         background = preprocess.get('background', '#000000')
         resample = preprocess.get('resample', 'lanczos')
 
-        try:
-            from xhcart_core.tools.img_pillow import process_resource_image_with_metadata
-        except ImportError as e:
-            raise ImportError("Pillow is required for RES image conversion. Please install it with 'pip install Pillow'") from e
+        image_metadata = chunk.get('image_metadata', False)
+        params = {
+            'target': 'res',
+            'format': 'BGRA8888',
+            'width': width,
+            'height': height,
+            'mode': mode,
+            'background': background,
+            'resample': resample,
+            'image_metadata': bool(image_metadata)
+        }
+
+        def convert():
+            try:
+                from xhcart_core.tools.img_pillow import process_resource_image_with_metadata
+            except ImportError as e:
+                raise ImportError("Pillow is required for RES image conversion. Please install it with 'pip install Pillow'") from e
 
-        try:
             raw_data, actual_width, actual_height = process_resource_image_with_metadata(
                 image_path=Path(file_path),
                 width=width,
@@ -385,17 +902,25 @@ class BuildData:
                 background=background,
                 resample=resample
             )
-            if chunk.get('image_metadata', False):
+            if image_metadata:
                 raw_data = self._build_res_image_container(raw_data, actual_width, actual_height)
-            return raw_data, {
-                'type': self.XHGC_RES_IMAGE,
-                'format': self.XHGC_IMG_BGRA8888,
-                'width': actual_width,
-                'height': actual_height
-            }
+            return raw_data, actual_width, actual_height
+
+        # 转换结果按源文件内容和预处理参数缓存，命中时不加载Pillow
+        try:
+            raw_data, actual_width, actual_height = cached_image_conversion(Path(file_path), params, convert)
+        except ImportError:
+            raise
         except Exception as e:
             raise ValueError(f"Failed to convert RES image to BGRA8888: {file_path}: {str(e)}") from e
 
+        return raw_data, {
+            'type': self.XHGC_RES_IMAGE,
+            'format': self.XHGC_IMG_BGRA8888,
+            'width': actual_width,
+            'height': actual_height
+        }
+
     def _build_res_image_container(self, raw_data: bytes, width: int, height: int) -> bytes:
         stride = width * 4
         expected_size = stride * height
@@ -444,31 +969,66 @@ class BuildData:
 
         return rel_path
 
-    def calculate_and_write_header_crc(self, header_bytes):
-        """
-        计算并写入Header CRC32
-
-        Args:
-            header_bytes (bytearray): 原始header数据（长度为4096）
 
-        Returns:
-            bytearray: 包含CRC32的header数据
-        """
-        import struct
-        from xhcart_core.format.xhgc.header import HeaderV2
+def _convert_res_image_job(file_path: str, chunk: dict) -> tuple:
+    """
+    进程池任务：转换单个RES图片（模块级函数以便pickle）
+    """
+    return BuildData(pack_spec=None)._convert_res_image(file_path, chunk)
 
-        # 确保输入数据长度为4096
-        if len(header_bytes) != 4096:
-            raise ValueError("Header length must be 4096 bytes")
+def _encode_file(data: bytes, file_meta: dict, codec: int, solid_max_size: int = 0) -> tuple:
+    """
+    压缩单个文件；压缩后不变小时按原样存储。不超过solid_max_size的文件不单独压缩，
+    标记为solid交给solid块统一压缩
 
-        # 创建一个副本，将CRC区域置为0
-        header_copy = header_bytes.copy()
-        header_copy[HeaderV2.CRC_OFFSET:HeaderV2.CRC_OFFSET+4] = b'\x00\x00\x00\x00'
+    Returns:
+        tuple: ([写入DATA的数据], 附加codec和raw_size的元数据)
+    """
+    if len(data) <= solid_max_size:
+        return [data], dict(file_meta, solid=True, raw_size=len(data))
+    stored = compress_block(data) if codec == BuildData.XHGC_CODEC_LZ4 else data
+    if len(stored) >= len(data):
+        stored, codec = data, BuildData.XHGC_CODEC_NONE
+    return [stored], dict(file_meta, codec=codec, raw_size=len(data))
+
+class _SolidBlockPacker:
+    """
+    把小文件依次拼入固定大小的块，块满时整体LZ4压缩写出
 
-        # 计算CRC32
-        crc = calculate_crc32(header_copy)
+    文件不跨块：放不下时先写出当前块再开新块，读取任一小文件只需解压一个块。
+    压缩后不变小的块按原样存储（块表中size == raw_size）。
+    """
 
-        # 以little-endian方式写入CRC32到0x0FFC..0x0FFF
-        struct.pack_into('<I', header_bytes, HeaderV2.CRC_OFFSET, crc)
+    def __init__(self, block_size: int, write_block):
+        self.block_size = block_size
+        self.write_block = write_block
+        self.buffer = bytearray()
+        # (data_off, size, raw_size, crc32)
+        self.blocks = []
 
-        return header_bytes
+    def add(self, data: bytes) -> tuple:
+        """
+        追加一个文件，返回(块号, 块内偏移)
+        """
+        if len(self.buffer) + len(data) > self.block_size:
+            self.flush()
+        block_off = len(self.buffer)
+        self.buffer.extend(data)
+        return len(self.blocks), block_off
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        raw_data = bytes(self.buffer)
+        stored = compress_block(raw_data)
+        if len(stored) >= len(raw_data):
+            stored = raw_data
+        data_off, crc32 = self.write_block(stored)
+        self.blocks.append((data_off, len(stored), len(raw_data), crc32))
+        self.buffer = bytearray()
+
+    def table(self) -> bytes:
+        """
+        块表：每块16字节(data_off, size, raw_size, crc32)
+        """
+        return b''.join(struct.pack('<IIII', *block) for block in self.blocks)
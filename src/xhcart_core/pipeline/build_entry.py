@@ -1,31 +1,14 @@
 from pathlib import Path
+from typing import Dict, Optional
 from xhcart_core.config.pack_spec import PackSpec
-from xhcart_core.utils.io import atomic_write
-from xhcart_core.utils.align import align_to
-from xhcart_core.utils.hashing import calculate_crc32
-from xhcart_core.format.xhgc.addr_table import AddrTable
-import subprocess
-import tempfile
-import sys
-import os
-
-def get_luavm_path():
-    if getattr(sys, 'frozen', False):
-        # PyInstaller 打包后，资源在 sys._MEIPASS 下
-        return os.path.join(sys._MEIPASS, 'tool', 'bin', 'luavm')
-    else:
-        # 开发环境
-        return os.path.join(os.path.dirname(__file__), '..', '..', '..', 'tool', 'bin', 'luavm')
+from xhcart_core.tools.luavm import LuaCompiler, get_luavm_path
+from xhcart_core.utils.cache import open_default_cache
 
 class BuildEntry:
     """
     构建ENTRY的类
     """
 
-    # 固定常量
-    HEADER_SIZE = 4096
-    ALIGN_SIZE = 4096
-
     def __init__(self, pack_spec: PackSpec):
         """
         初始化BuildEntry
@@ -35,55 +18,25 @@ class BuildEntry:
         """
         self.pack_spec = pack_spec
 
-    def calculate_and_write_header_crc(self, header_bytes):
+    def build_segment(self, compiled: Optional[Dict[str, bytes]] = None) -> bytes:
         """
-        计算并写入Header CRC32
+        生成ENTRY段payload（slot3）
 
         Args:
-            header_bytes (bytearray): 原始header数据（长度为4096）
+            compiled (Optional[Dict[str, bytes]]): 已批量编译的字节码（str(路径) -> 字节码），
+                包含入口文件时直接复用，不再单独调用luavm
 
         Returns:
-            bytearray: 包含CRC32的header数据
-        """
-        import struct
-        from xhcart_core.format.xhgc.header import HeaderV2
-
-        # 确保输入数据长度为4096
-        if len(header_bytes) != 4096:
-            raise ValueError("Header length must be 4096 bytes")
-
-        # 创建一个副本，将CRC区域置为0
-        header_copy = header_bytes.copy()
-        header_copy[HeaderV2.CRC_OFFSET:HeaderV2.CRC_OFFSET+4] = b'\x00\x00\x00\x00'
-
-        # 计算CRC32
-        crc = calculate_crc32(header_copy)
-
-        # 以little-endian方式写入CRC32到0x0FFC..0x0FFF
-        struct.pack_into('<I', header_bytes, HeaderV2.CRC_OFFSET, crc)
-
-        return header_bytes
-
-    def build(self, out_path: str):
+            bytes: 入口Lua编译后的字节码
         """
-        构建包含ENTRY的cart.bin
-
-        Args:
-            out_path (str): 输出文件路径
-        """
-        # 读取现有的cart.bin文件
-        with open(out_path, 'rb') as f:
-            cart_data = bytearray(f.read())
-
-        # 提取header数据
-        header_data = bytearray(cart_data[:self.HEADER_SIZE])
-
         # 解析entry路径
-        lua_path = self._resolve_entry_path()
+        lua_path = self.resolve_entry_path()
+        if compiled and str(lua_path) in compiled:
+            return compiled[str(lua_path)]
 
         # 编译Lua文件
         try:
-            luac_data = self._compile_lua(lua_path)
+            return self._compile_lua(lua_path)
         except Exception as e:
             # 输出错误信息
             import json, sys
@@ -96,77 +49,7 @@ class BuildEntry:
             sys.stdout.flush()
             raise
 
-        # 计算ENTRY偏移量（4KB对齐）
-        entry_offset = align_to(len(cart_data), self.ALIGN_SIZE)
-
-        # 计算ENTRY大小和CRC32
-        entry_size = len(luac_data)
-        entry_crc32 = calculate_crc32(luac_data) if entry_size > 0 else 0
-
-        # 写入slot3 (ENTRY)
-        AddrTable.write_slot(header_data, AddrTable.SLOT_ENTRY, entry_offset, entry_size, entry_crc32)
-
-        # 计算总大小并对齐
-        total_size = entry_offset + entry_size
-        aligned_size = align_to(total_size, self.ALIGN_SIZE)
-        padding_size = aligned_size - total_size
-        padding = b'\x00' * padding_size
-
-        # 从配置中读取CRC32设置
-        header_crc32 = True  # 默认计算header的CRC32
-        image_crc32 = False  # 默认不计算整个镜像的CRC32
-
-        if self.pack_spec.hash:
-            header_crc32 = self.pack_spec.hash.header_crc32
-            image_crc32 = self.pack_spec.hash.image_crc32
-
-        existing_payload = cart_data[self.HEADER_SIZE:]
-        cart_data = header_data + existing_payload + luac_data + padding
-        AddrTable.write_present_slot_payload_crcs(header_data, cart_data)
-
-        # 计算并写入Header CRC32
-        if header_crc32:
-            header_data_with_crc = self.calculate_and_write_header_crc(header_data)
-        else:
-            header_data_with_crc = header_data
-
-        # 组装完整数据（包含更新后的header）
-        cart_data = header_data_with_crc + existing_payload + luac_data + padding
-
-        # 如果需要计算整个镜像的CRC32
-        if image_crc32:
-            # 计算整个镜像的CRC32
-            image_crc = calculate_crc32(cart_data)
-
-            # 创建新的header副本，写入镜像CRC32到slot14
-            final_header_data = header_data_with_crc.copy()
-            AddrTable.write_slot(final_header_data, AddrTable.SLOT_IMAGE_CRC, 0, len(cart_data), image_crc)
-
-            # 再次计算Header CRC32（因为修改了slot6）
-            if header_crc32:
-                final_header_data = self.calculate_and_write_header_crc(final_header_data)
-
-            # 最终组装数据
-            cart_data = final_header_data + existing_payload + luac_data + padding
-
-        # 原子写入文件
-        atomic_write(out_path, cart_data)
-
-        # 输出JSON格式结果
-        import json, sys
-        result = {
-            "step": "entry",
-            "status": "ok",
-            "file_size": len(cart_data),
-            "entry_offset": entry_offset,
-            "entry_size": len(luac_data),
-            "entry_crc32": f"0x{entry_crc32:08X}",
-            "padding_size": len(padding)
-        }
-        print(json.dumps(result))
-        sys.stdout.flush()
-
-    def _resolve_entry_path(self) -> Path:
+    def resolve_entry_path(self) -> Path:
         """
         解析entry路径
 
@@ -209,44 +92,8 @@ class BuildEntry:
         Returns:
             bytes: 编译后的字节码
         """
-        if not lua_path.exists():
-            raise ValueError(f"Lua file not found: {lua_path}")
-
         # 确保文件是.lua结尾
-        if lua_path.suffix.lower() != '.lua':
+        if lua_path.exists() and lua_path.suffix.lower() != '.lua':
             raise ValueError(f"Entry file must be a .lua file: {lua_path}")
 
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.luac', delete=False) as tmp:
-            tmp_path = tmp.name
-
-        try:
-            # 构建编译命令
-            luavm_path = Path(get_luavm_path())
-            if not luavm_path.exists():
-                raise ValueError(f"luavm not found: {luavm_path}")
-
-            cmd = [str(luavm_path), "--compile", str(lua_path), tmp_path]
-
-            # 执行编译命令
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True
-            )
-
-            # 检查编译是否成功
-            if result.returncode != 0:
-                message = result.stderr.strip() or result.stdout.strip()
-                raise ValueError(f"Failed to compile Lua file: {message}")
-
-            # 读取编译后的字节码
-            with open(tmp_path, 'rb') as f:
-                luac_data = f.read()
-
-            return luac_data
-        finally:
-            # 清理临时文件
-            import os
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        return LuaCompiler(cache=open_default_cache('luac')).compile_file(lua_path)
@@ -1,9 +1,5 @@
-from pathlib import Path
 from xhcart_core.config.pack_spec import PackSpec
-from xhcart_core.utils.io import atomic_write
-from xhcart_core.utils.align import align_to
-from xhcart_core.utils.hashing import calculate_crc32
-from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.format.xhgc.manf import ManfTable
 import struct
 
 class BuildManf:
@@ -11,31 +7,12 @@ class BuildManf:
     构建MANF段的类
     """
     
-    # 固定常量
-    HEADER_SIZE = 4096
-    ALIGN_SIZE = 4096
-    
-    # MANF Header 固定值
-    MANF_MAGIC = 0x464E414D  # "MANF"
-    MANF_VERSION = 1
+    # MANF Header 固定值（定义见ManfTable）
+    MANF_MAGIC = ManfTable.MANF_MAGIC
+    MANF_VERSION = ManfTable.MANF_VERSION
     
     # 字段ID映射
-    FIELD_IDS = {
-        'title': 0x01,
-        'title_zh': 0x02,
-        'publisher': 0x03,
-        'version': 0x04,
-        'cart_id': 0x05,
-        'entry': 0x06,
-        'min_fw': 0x07,
-        'id': 0x08,
-        'description_default': 0x09,
-        'description_zh': 0x0A,
-        'category': 0x0B,
-        'tags': 0x0C,
-        'author_name': 0x0D,
-        'author_contact': 0x0E
-    }
+    FIELD_IDS = ManfTable.FIELD_IDS
     
     def __init__(self, pack_spec: PackSpec):
         """
@@ -46,92 +23,14 @@ class BuildManf:
         """
         self.pack_spec = pack_spec
     
-    def build(self, out_path: str):
-        """
-        构建包含MANF段的cart.bin
-        
-        Args:
-            out_path (str): 输出文件路径
+    def build_segment(self) -> bytes:
         """
-        # 读取现有的cart.bin文件
-        with open(out_path, 'rb') as f:
-            cart_data = bytearray(f.read())
-        
-        # 提取header数据
-        header_data = bytearray(cart_data[:self.HEADER_SIZE])
-        
-        # 构建MANF段数据
-        manf_content = self._build_manf_content()
-        
-        # 计算MANF大小和CRC32
-        manf_size = len(manf_content)
-        manf_crc32 = calculate_crc32(manf_content) if manf_size > 0 else 0
-        
-        # 计算MANF偏移量（4KB对齐）
-        manf_offset = align_to(len(cart_data), self.ALIGN_SIZE)
-        
-        # 写入slot2 (MANF)
-        AddrTable.write_slot(header_data, AddrTable.SLOT_MANF, manf_offset, manf_size, manf_crc32)
-        
-        # 计算总大小并对齐
-        total_size = manf_offset + manf_size
-        aligned_size = align_to(total_size, self.ALIGN_SIZE)
-        padding_size = aligned_size - total_size
-        padding = b'\x00' * padding_size
-        
-        # 从配置中读取CRC32设置
-        header_crc32 = True  # 默认计算header的CRC32
-        image_crc32 = False  # 默认不计算整个镜像的CRC32
-        
-        if self.pack_spec.hash:
-            header_crc32 = self.pack_spec.hash.header_crc32
-            image_crc32 = self.pack_spec.hash.image_crc32
-        
-        existing_payload = cart_data[self.HEADER_SIZE:]
-        cart_data = header_data + existing_payload + manf_content + padding
-        AddrTable.write_present_slot_payload_crcs(header_data, cart_data)
+        生成MANF段payload（slot2）
 
-        # 计算并写入Header CRC32
-        if header_crc32:
-            header_data_with_crc = self.calculate_and_write_header_crc(header_data)
-        else:
-            header_data_with_crc = header_data
-        
-        # 组装完整数据（包含更新后的header）
-        cart_data = header_data_with_crc + existing_payload + manf_content + padding
-        
-        # 如果需要计算整个镜像的CRC32
-        if image_crc32:
-            # 计算整个镜像的CRC32
-            image_crc = calculate_crc32(cart_data)
-            
-            # 创建新的header副本，写入镜像CRC32到slot14
-            final_header_data = header_data_with_crc.copy()
-            AddrTable.write_slot(final_header_data, AddrTable.SLOT_IMAGE_CRC, 0, len(cart_data), image_crc)
-            
-            # 再次计算Header CRC32（因为修改了slot6）
-            if header_crc32:
-                final_header_data = self.calculate_and_write_header_crc(final_header_data)
-            
-            # 最终组装数据
-            cart_data = final_header_data + existing_payload + manf_content + padding
-        
-        # 原子写入文件
-        atomic_write(out_path, cart_data)
-        
-        # 输出JSON格式结果
-        import json, sys
-        result = {
-            "step": "manf",
-            "status": "ok",
-            "file_size": len(cart_data),
-            "manf_offset": manf_offset,
-            "manf_size": manf_size,
-            "manf_crc32": f"0x{manf_crc32:08X}",
-            "padding_size": len(padding)
-        }
-        print(json.dumps(result))
-        sys.stdout.flush()
+        Returns:
+            bytes: MANF二进制元数据
+        """
+        return bytes(self._build_manf_content())
 
     def _build_manf_content(self):
         """
@@ -249,32 +148,3 @@ class BuildManf:
 
         # 过滤空值
         return {k: v for k, v in fields.items() if v is not None}
-
-    def calculate_and_write_header_crc(self, header_bytes):
-        """
-        计算并写入Header CRC32
-
-        Args:
-            header_bytes (bytearray): 原始header数据（长度为4096）
-
-        Returns:
-            bytearray: 包含CRC32的header数据
-        """
-        import struct
-        from xhcart_core.format.xhgc.header import HeaderV2
-
-        # 确保输入数据长度为4096
-        if len(header_bytes) != 4096:
-            raise ValueError("Header length must be 4096 bytes")
-
-        # 创建一个副本，将CRC区域置为0
-        header_copy = header_bytes.copy()
-        header_copy[HeaderV2.CRC_OFFSET:HeaderV2.CRC_OFFSET+4] = b'\x00\x00\x00\x00'
-
-        # 计算CRC32
-        crc = calculate_crc32(header_copy)
-
-        # 以little-endian方式写入CRC32到0x0FFC..0x0FFF
-        struct.pack_into('<I', header_bytes, HeaderV2.CRC_OFFSET, crc)
-
-        return header_bytes
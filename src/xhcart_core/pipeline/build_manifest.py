@@ -0,0 +1,244 @@
+import json
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+from xhcart_core.utils.cache import cache_key, file_sha256
+from xhcart_core.utils.hashing import calculate_crc32
+from xhcart_core.utils.io import atomic_write
+
+def manifest_path(out_path: str) -> Path:
+    """
+    返回cart.bin旁的构建清单路径（<out_path>.manifest.json）
+    """
+    return Path(str(out_path) + '.manifest.json')
+
+def tool_version() -> str:
+    """
+    返回打包工具版本（参与配置指纹，升级后全部段重建）
+    """
+    from importlib import metadata
+    try:
+        return metadata.version('xhcart-core')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+class BuildManifest:
+    """
+    增量构建清单
+
+    记录每个段的输入文件指纹（path、size、mtime、SHA-256）、配置指纹以及
+    段在cart.bin中的offset/size/crc32。下次构建时输入和配置都未变化的段
+    直接复用上一次cart.bin中的字节（读取后按crc32校验）。
+    """
+
+    # 清单格式版本
+    VERSION = 1
+    # 复用DATA时校验/复制的块大小
+    READ_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, out_path: str):
+        """
+        初始化BuildManifest并读取上一次的清单
+
+        Args:
+            out_path (str): cart.bin输出路径
+        """
+        self.out_path = Path(out_path)
+        self.path = manifest_path(out_path)
+        self.previous = self._load_previous()
+        self.segments = {}
+        self._previous_inputs = {}
+        if self.previous:
+            for segment in self.previous['segments'].values():
+                for item in segment.get('inputs', []):
+                    self._previous_inputs[item['path']] = item
+
+    def _load_previous(self) -> Optional[dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(previous, dict) or previous.get('version') != self.VERSION:
+            return None
+        if not isinstance(previous.get('segments'), dict):
+            return None
+        return previous
+
+    def fingerprint_inputs(self, paths: List[str]) -> List[dict]:
+        """
+        计算输入文件指纹；size和mtime与上一次相同时沿用上一次的SHA-256
+
+        Args:
+            paths (List[str]): 输入文件路径
+
+        Returns:
+            List[dict]: 指纹列表
+        """
+        inputs = []
+        for path in paths:
+            path = str(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 缺失的输入由对应段的构建过程报错
+                inputs.append({'path': path, 'size': -1, 'mtime_ns': 0, 'sha256': None})
+                continue
+            previous = self._previous_inputs.get(path)
+            if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+                sha256 = previous['sha256']
+            else:
+                sha256 = file_sha256(path)
+            inputs.append({
+                'path': path,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': sha256
+            })
+        return inputs
+
+    def check(self, name: str, paths: List[str], params: dict) -> Tuple[bool, List[str]]:
+        """
+        记录段的当前指纹，并判断能否复用上一次构建的字节
+
+        Args:
+            name (str): 段名称
+            paths (List[str]): 段的输入文件
+            params (dict): 影响段内容的配置（可JSON序列化）
+
+        Returns:
+            Tuple[bool, List[str]]: (是否可复用, 需要重建的原因)
+        """
+        inputs = self.fingerprint_inputs(paths)
+        params_hash = cache_key(json.dumps(dict(params, tool=tool_version()), sort_keys=True, default=str))
+        self.segments[name] = {'params': params_hash, 'inputs': inputs}
+
+        if self.previous is None:
+            return False, ['no previous build manifest']
+        if not self.previous_cart_intact():
+            return False, ['previous cart.bin missing or modified']
+
+        previous = self.previous['segments'].get(name)
+        if previous is None:
+            return False, ['segment not in previous manifest']
+
+        reasons = []
+        if previous.get('params') != params_hash:
+            reasons.append('configuration changed')
+
+        previous_inputs = {item['path']: item for item in previous.get('inputs', [])}
+        current_inputs = {item['path']: item for item in inputs}
+        for path in current_inputs:
+            if path not in previous_inputs:
+                reasons.append(f'input added: {path}')
+            elif current_inputs[path]['sha256'] != previous_inputs[path]['sha256']:
+                reasons.append(f'input changed: {path}')
+        for path in previous_inputs:
+            if path not in current_inputs:
+                reasons.append(f'input removed: {path}')
+        if not reasons and [item['path'] for item in inputs] != [item['path'] for item in previous.get('inputs', [])]:
+            reasons.append('input order changed')
+
+        return not reasons, reasons
+
+    def changed_inputs(self, name: str) -> Optional[List[str]]:
+        """
+        配置和输入列表都不变时，返回内容变化的输入路径；否则返回None
+        """
+        previous = self.previous['segments'].get(name) if self.previous else None
+        current = self.segments.get(name)
+        if previous is None or current is None or previous.get('params') != current['params']:
+            return None
+
+        previous_inputs = previous.get('inputs', [])
+        if [item['path'] for item in previous_inputs] != [item['path'] for item in current['inputs']]:
+            return None
+        return [
+            item['path'] for item, old in zip(current['inputs'], previous_inputs)
+            if item['sha256'] != old['sha256']
+        ]
+
+    def previous_cart_intact(self) -> bool:
+        """
+        上一次的cart.bin是否存在且未被外部修改（size和mtime与清单一致）
+        """
+        if self.previous is None:
+            return False
+        cart = self.previous.get('cart', {})
+        try:
+            stat = self.out_path.stat()
+        except OSError:
+            return False
+        return cart.get('size') == stat.st_size and cart.get('mtime_ns') == stat.st_mtime_ns
+
+    def read_previous(self, name: str) -> Optional[bytes]:
+        """
+        从上一次的cart.bin读取段字节，crc32不匹配时返回None
+        """
+        layout = self.previous['segments'][name]
+        try:
+            with open(self.out_path, 'rb') as f:
+                f.seek(layout['offset'])
+                payload = f.read(layout['size'])
+        except OSError:
+            return None
+        if len(payload) != layout['size'] or calculate_crc32(payload) != layout['crc32']:
+            return None
+        return payload
+
+    def verify_previous(self, name: str) -> bool:
+        """
+        分块校验上一次cart.bin中的段（用于不整体读入内存的DATA段）
+        """
+        layout = self.previous['segments'][name]
+        crc = 0
+        remaining = layout['size']
+        try:
+            with open(self.out_path, 'rb') as f:
+                f.seek(layout['offset'])
+                while remaining:
+                    block = f.read(min(self.READ_BLOCK_SIZE, remaining))
+                    if not block:
+                        return False
+                    crc = calculate_crc32(block, crc)
+                    remaining -= len(block)
+        except OSError:
+            return False
+        return crc == layout['crc32']
+
+    def iter_previous_blocks(self, name: str):
+        """
+        分块产出上一次cart.bin中的段字节
+        """
+        layout = self.previous['segments'][name]
+        remaining = layout['size']
+        with open(self.out_path, 'rb') as f:
+            f.seek(layout['offset'])
+            while remaining:
+                block = f.read(min(self.READ_BLOCK_SIZE, remaining))
+                if not block:
+                    raise ValueError(f"Previous cart.bin truncated while copying {name}")
+                remaining -= len(block)
+                yield block
+
+    def previous_layout(self, name: str) -> dict:
+        return self.previous['segments'][name]
+
+    def record_layout(self, name: str, offset: int, size: int, crc32: int) -> None:
+        """
+        记录段在新cart.bin中的位置和crc32
+        """
+        self.segments.setdefault(name, {'params': None, 'inputs': []})
+        self.segments[name].update(offset=offset, size=size, crc32=crc32)
+
+    def save(self) -> None:
+        """
+        在cart.bin写出后保存清单
+        """
+        stat = self.out_path.stat()
+        manifest = {
+            'version': self.VERSION,
+            'cart': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns},
+            'segments': self.segments
+        }
+        atomic_write(str(self.path), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
@@ -0,0 +1,185 @@
+import contextlib
+import glob
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from xhcart_core.domain.errors import ConfigError
+
+# glob中的通配字符
+_GLOB_CHARS = set('*?[')
+
+def expand_pack_inputs(inputs: List[str], list_path: Optional[str] = None) -> List[str]:
+    """
+    展开pack.json输入：普通路径原样保留，含通配符的按glob展开（支持**），
+    list_path为每行一个路径/glob的列表文件（空行和#开头的行忽略）
+
+    Args:
+        inputs (List[str]): 路径或glob
+        list_path (Optional[str]): 列表文件路径，相对路径按列表文件所在目录解析
+
+    Returns:
+        List[str]: 去重后的pack.json绝对路径（保持首次出现的顺序）
+    """
+    patterns = list(inputs)
+    if list_path:
+        base = Path(list_path).parent
+        try:
+            with open(list_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            raise ConfigError(f"Failed to read pack list {list_path}: {e}")
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                patterns.append(line if os.path.isabs(line) else str(base / line))
+
+    paths = []
+    for pattern in patterns:
+        if _GLOB_CHARS & set(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                raise ConfigError(f"No pack.json matches: {pattern}")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+def cart_output_paths(pack_paths: List[str], out_dir: str) -> List[str]:
+    """
+    为每个pack.json分配输出路径
+
+    名为pack.json的以所在目录名命名，其他以文件名（去掉扩展名）命名；
+    相对所有输入的公共目录保留子目录结构。例如games/a/pack.json、
+    games/sub/b/pack.json输出为<out_dir>/a.bin、<out_dir>/sub/b.bin。
+
+    Args:
+        pack_paths (List[str]): pack.json绝对路径
+        out_dir (str): 输出目录
+
+    Returns:
+        List[str]: 与pack_paths一一对应的cart.bin路径
+    """
+    if not pack_paths:
+        return []
+    keys = [Path(path).parent if Path(path).name == 'pack.json' else Path(path).with_suffix('') for path in pack_paths]
+    base = os.path.commonpath([str(key.parent) for key in keys])
+
+    out_paths = []
+    seen = {}
+    for path, key in zip(pack_paths, keys):
+        out_path = str(Path(out_dir) / (os.path.relpath(key, base) + '.bin'))
+        if out_path in seen:
+            raise ConfigError(f"Output name collision: {seen[out_path]} and {path} both map to {out_path}")
+        seen[out_path] = path
+        out_paths.append(out_path)
+    return out_paths
+
+def _pack_cart_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    在worker进程中构建一个cart.bin，捕获步骤记录和错误
+    """
+    from xhcart_core.api import pack_header_icon
+
+    result = {
+        'index': job['index'],
+        'pack_json': job['pack_json'],
+        'out_path': job['out_path'],
+        'status': 'ok'
+    }
+    records = io.StringIO()
+    start = time.perf_counter()
+    try:
+        # 每个cart的步骤记录不直接输出，只在汇总中保留必要信息
+        with contextlib.redirect_stdout(records):
+            pack_header_icon(job['pack_json'], job['out_path'], jobs=job['jobs'], incremental=job['incremental'])
+        result['size'] = os.path.getsize(job['out_path'])
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e) or type(e).__name__
+        # 保留失败前的错误记录（例如Lua编译错误明细）
+        errors = []
+        for line in records.getvalue().splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('status') == 'error':
+                errors.append(record)
+        if errors:
+            result['records'] = errors
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+def pack_many(pack_paths: List[str], out_paths: List[str], workers: int = 1, incremental: bool = True) -> Dict[str, Any]:
+    """
+    用进程池批量构建cart.bin
+
+    worker进程在多个cart之间复用，Pillow只导入一次，字体、luavm标识等进程内
+    缓存保持热状态；luac和图片的磁盘缓存由所有worker共享。并行构建时每个cart
+    的RES图片转换在worker内串行执行，避免嵌套进程池。单个cart失败（包括worker
+    进程崩溃）不会中止其他cart。
+
+    Args:
+        pack_paths (List[str]): pack.json路径
+        out_paths (List[str]): 与pack_paths对应的输出路径
+        workers (int): 并行进程数（0表示全部CPU核心，默认1即当前进程内执行）
+        incremental (bool): 是否按构建清单复用每个cart上一次构建中未变化的段
+
+    Returns:
+        Dict[str, Any]: 汇总结果（总数、成功数、失败数、总耗时和每个cart的耗时、错误）
+    """
+    if workers < 0:
+        raise ValueError("workers must be a non-negative integer")
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    parallel = workers > 1 and len(pack_paths) > 1
+    jobs = [
+        {
+            'index': index,
+            'pack_json': pack_json,
+            'out_path': out_path,
+            'jobs': 1 if parallel else None,
+            'incremental': incremental
+        }
+        for index, (pack_json, out_path) in enumerate(zip(pack_paths, out_paths))
+    ]
+
+    start = time.perf_counter()
+    if not parallel:
+        results = [_pack_cart_job(job) for job in jobs]
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = {pool.submit(_pack_cart_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # worker进程异常退出（BrokenProcessPool）等
+                    job = futures[future]
+                    results.append({
+                        'index': job['index'],
+                        'pack_json': job['pack_json'],
+                        'out_path': job['out_path'],
+                        'status': 'error',
+                        'error': str(e) or type(e).__name__,
+                        'elapsed_ms': 0.0
+                    })
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    results.sort(key=lambda result: result['index'])
+    for result in results:
+        del result['index']
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    return {
+        'total': len(results),
+        'ok': len(results) - failed,
+        'failed': failed,
+        'elapsed_ms': elapsed_ms,
+        'carts': results
+    }
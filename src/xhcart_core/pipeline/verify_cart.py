@@ -0,0 +1,338 @@
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from xhcart_core.domain.errors import ConfigError
+from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.format.xhgc.header import HeaderV2
+from xhcart_core.format.xhgc.index import IndexTable
+from xhcart_core.format.xhgc.reader import CartReader
+from xhcart_core.utils.hashing import calculate_crc32, crc32_combine, crc32_zeros
+
+# 单个CRC任务处理的字节数：大段拆成多块并行计算后用crc32_combine合并，
+# 小文件攒够这个大小再作为一个任务提交
+CRC_CHUNK_SIZE = 8 * 1024 * 1024
+
+SLOT_NAMES = ['ICON', 'THMB', 'MANF', 'ENTRY', 'INDEX', 'DATA', 'BNR', 'COVR', 'TITLE_A8',
+              'RESV9', 'RESV10', 'RESV11', 'RESV12', 'RESV13', 'IMAGE_CRC']
+
+def expand_cart_inputs(inputs: List[str]) -> List[str]:
+    """
+    展开verify-cart输入：目录递归查找其中的*.bin，文件原样保留
+
+    Returns:
+        List[str]: 去重后的cart.bin绝对路径（目录内按路径排序）
+    """
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            matches = sorted(str(match) for match in Path(path).rglob('*.bin') if match.is_file())
+            if not matches:
+                raise ConfigError(f"No cart.bin found in directory: {path}")
+            paths.extend(matches)
+        elif os.path.exists(path):
+            paths.append(path)
+        else:
+            raise ConfigError(f"Cart image not found: {path}")
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+def _crc_ranges(cart: CartReader, ranges: list) -> list:
+    """
+    计算一组[start, end)区域的CRC32（zlib在大缓冲区上释放GIL，可在线程池中并行）
+    """
+    crcs = []
+    for start, end in ranges:
+        with cart.view(start, end - start) as chunk:
+            crcs.append(calculate_crc32(chunk))
+    return crcs
+
+def _failure(check: str, name: str, offset: int, size: int, expected: Optional[int] = None, actual: Optional[int] = None, message: Optional[str] = None) -> Dict[str, Any]:
+    failure = {'check': check, 'name': name, 'offset': offset, 'size': size}
+    if expected is not None:
+        failure['expected'] = f"0x{expected:08X}"
+        failure['actual'] = f"0x{actual:08X}"
+    if message is not None:
+        failure['message'] = message
+    return failure
+
+def _skipped(check: str, name: str, message: str, count: Optional[int] = None) -> Dict[str, Any]:
+    skipped = {'check': check, 'name': name, 'message': message}
+    if count is not None:
+        skipped['count'] = count
+    return skipped
+
+def _image_header_crc(cart: CartReader, header_crc_enabled: bool) -> tuple:
+    """
+    计算整镜像CRC32时使用的Header：slot14清零，CRC字段为此时的Header CRC32（未启用时为0）
+
+    Returns:
+        tuple: (Header部分的CRC32, Header长度)
+    """
+    header = bytearray(cart.view(0, HeaderV2.HEADER_SIZE))
+    slot_off = AddrTable.slot_offset(AddrTable.SLOT_IMAGE_CRC)
+    header[slot_off:slot_off + AddrTable.SLOT_SIZE] = bytes(AddrTable.SLOT_SIZE)
+    if header_crc_enabled:
+        struct.pack_into('<I', header, HeaderV2.CRC_OFFSET, 0)
+        struct.pack_into('<I', header, HeaderV2.CRC_OFFSET, calculate_crc32(header))
+    return calculate_crc32(header), len(header)
+
+def verify_cart(cart_path: str, jobs: int = 1) -> Dict[str, Any]:
+    """
+    校验cart.bin中的全部CRC32
+
+    检查Header CRC32、各槽位段CRC32、slot14整镜像CRC32（启用时）、solid块表中每块的CRC32
+    以及INDEX中每个条目的crc32。Header CRC32、段CRC32和条目crc32是否启用由Header flags
+    （FLAG_HEADER_CRC32/FLAG_CHUNK_CRC32/FLAG_FILE_CRC32）决定，置位时CRC字段为0也按损坏报告；flags
+    未置位的旧镜像只校验非0的CRC字段。未执行的检查记录在skipped中。镜像以mmap方式读取，各区域
+    按CRC_CHUNK_SIZE拆分后在线程池中计算，再用crc32_combine合并，共享同一DATA区域的条目
+    只计算一次。
+
+    Args:
+        cart_path (str): cart.bin路径
+        jobs (int): 计算CRC32的线程数（0表示全部CPU核心）
+
+    Returns:
+        Dict[str, Any]: 校验结果（status、检查项数、跳过的检查和每个失败区域的偏移、大小、期望值与实际值）
+    """
+    if jobs < 0:
+        raise ValueError("jobs must be a non-negative integer")
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    start_time = time.perf_counter()
+    result = {'path': cart_path, 'status': 'ok'}
+    failures = []
+    skipped = []
+    # 每项检查：(check, name, offset, size, expected, [(start, end), ...], crc前缀(crc, 长度))
+    checks = []
+
+    try:
+        cart = CartReader(cart_path)
+    except (OSError, ValueError) as e:
+        result.update(status='error', checked=0, skipped=[], failures=[_failure('image', 'cart', 0, 0, message=str(e))])
+        return result
+
+    with cart:
+        image_size = cart.size
+        result['size'] = image_size
+
+        # Header CRC32：flags置位时必须校验；旧镜像（flags为0）CRC字段为0表示未启用
+        flags = struct.unpack_from('<I', cart.view(HeaderV2.OFFSET_FLAGS, 4))[0]
+        stored_header_crc = struct.unpack_from('<I', cart.view(HeaderV2.CRC_OFFSET, 4))[0]
+        header_crc_enabled = bool(flags & HeaderV2.FLAG_HEADER_CRC32 or stored_header_crc)
+        chunk_crc_enabled = bool(flags & HeaderV2.FLAG_CHUNK_CRC32)
+        file_crc_enabled = bool(flags & HeaderV2.FLAG_FILE_CRC32)
+        if header_crc_enabled:
+            with cart.view(0, HeaderV2.CRC_OFFSET) as prefix:
+                header_crc = crc32_combine(calculate_crc32(prefix), crc32_zeros(4), 4)
+            checks.append(('header', 'HEADER', 0, HeaderV2.HEADER_SIZE, stored_header_crc, [], (header_crc, HeaderV2.HEADER_SIZE)))
+        else:
+            skipped.append(_skipped('header', 'HEADER', 'header CRC32 not enabled'))
+
+        # 各段CRC32；超出镜像范围的段不再做依赖它的INDEX/DATA检查
+        bad_slots = set()
+        for slot_index in range(AddrTable.SLOT_COUNT):
+            if slot_index == AddrTable.SLOT_IMAGE_CRC:
+                continue
+            offset, size, crc32 = cart.slot(slot_index)
+            if size == 0:
+                continue
+            if offset + size > image_size:
+                failures.append(_failure('slot', SLOT_NAMES[slot_index], offset, size, message='segment out of image range'))
+                bad_slots.add(slot_index)
+                continue
+            if not chunk_crc_enabled and crc32 == 0:
+                skipped.append(_skipped('slot', SLOT_NAMES[slot_index], 'segment CRC32 not enabled'))
+                continue
+            checks.append(('slot', SLOT_NAMES[slot_index], offset, size, crc32, [(offset, offset + size)], None))
+
+        # slot14整镜像CRC32
+        _, image_crc_size, image_crc = cart.slot(AddrTable.SLOT_IMAGE_CRC)
+        if image_crc_size:
+            if image_crc_size != image_size:
+                failures.append(_failure('image', 'IMAGE_CRC', 0, image_crc_size, message=f'image size mismatch: file is {image_size} bytes'))
+            else:
+                checks.append(('image', 'IMAGE_CRC', 0, image_size, image_crc,
+                               [(HeaderV2.HEADER_SIZE, image_size)], _image_header_crc(cart, header_crc_enabled)))
+        else:
+            skipped.append(_skipped('image', 'IMAGE_CRC', 'image CRC32 not enabled'))
+
+        # INDEX条目和solid块
+        solid_entries = []
+        blocks = []
+        data_offset, data_size, _ = cart.slot(AddrTable.SLOT_DATA)
+
+        def data_range_ok(offset: int, size: int) -> bool:
+            # DATA内的区域同时检查DATA段和镜像范围
+            return offset + size <= data_size and data_offset + offset + size <= image_size
+
+        try:
+            if AddrTable.SLOT_INDEX in bad_slots or AddrTable.SLOT_DATA in bad_slots:
+                entries = []
+                skipped.append(_skipped('entry', 'INDEX', 'INDEX or DATA segment out of image range'))
+            else:
+                entries = list(cart.entries()) if cart.slot(AddrTable.SLOT_INDEX)[1] else []
+            solid = cart.index_header['solid'] if entries else None
+        except (ValueError, struct.error) as e:
+            index_offset, index_size, _ = cart.slot(AddrTable.SLOT_INDEX)
+            failures.append(_failure('index', 'INDEX', index_offset, index_size, message=str(e)))
+            entries = []
+            solid = None
+
+        if solid is not None:
+            table_off = solid['table_off']
+            table_size = solid['block_count'] * IndexTable.SOLID_BLOCK_ENTRY_SIZE
+            if not data_range_ok(table_off, table_size):
+                failures.append(_failure('solid_block', 'block table', data_offset + table_off, table_size, message='solid block table out of DATA range'))
+            else:
+                with cart.view(data_offset + table_off, table_size) as table:
+                    blocks = [struct.unpack_from(IndexTable.SOLID_BLOCK_FORMAT, table, i * IndexTable.SOLID_BLOCK_ENTRY_SIZE) for i in range(solid['block_count'])]
+                for block_id, (block_off, size, _, crc32) in enumerate(blocks):
+                    if not data_range_ok(block_off, size):
+                        failures.append(_failure('solid_block', f'block {block_id}', data_offset + block_off, size, message='solid block out of DATA range'))
+                        continue
+                    checks.append(('solid_block', f'block {block_id}', data_offset + block_off, size, crc32,
+                                   [(data_offset + block_off, data_offset + block_off + size)], None))
+
+        seen_regions = set()
+        skipped_entries = 0
+        for entry in entries:
+            if not file_crc_enabled and entry['crc32'] == 0:
+                # 旧镜像未启用hash.per_file_crc32
+                skipped_entries += 1
+                continue
+            if entry['codec'] == IndexTable.XHGC_CODEC_LZ4_SOLID:
+                solid_entries.append(entry)
+                continue
+            region = (entry['offset'], entry['size'], entry['crc32'])
+            if region in seen_regions:
+                continue
+            seen_regions.add(region)
+            offset = data_offset + entry['offset']
+            if not data_range_ok(entry['offset'], entry['size']):
+                failures.append(_failure('entry', entry['path'], offset, entry['size'], message='entry out of DATA range'))
+                continue
+            checks.append(('entry', entry['path'], offset, entry['size'], entry['crc32'], [(offset, offset + entry['size'])], None))
+
+        if skipped_entries:
+            skipped.append(_skipped('entry', 'INDEX', 'per-file CRC32 not enabled', count=skipped_entries))
+
+        # 拆分/合并成任务后并行计算
+        pieces = []
+        for check_id, check in enumerate(checks):
+            for start, end in check[5]:
+                for chunk_start in range(start, end, CRC_CHUNK_SIZE):
+                    pieces.append((check_id, chunk_start, min(chunk_start + CRC_CHUNK_SIZE, end)))
+        tasks = []
+        task = []
+        task_bytes = 0
+        for piece in pieces:
+            task.append(piece)
+            task_bytes += piece[2] - piece[1]
+            if task_bytes >= CRC_CHUNK_SIZE:
+                tasks.append(task)
+                task = []
+                task_bytes = 0
+        if task:
+            tasks.append(task)
+
+        def run(task):
+            return _crc_ranges(cart, [(start, end) for _, start, end in task])
+
+        if jobs > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+                task_crcs = list(pool.map(run, tasks))
+        else:
+            task_crcs = [run(task) for task in tasks]
+
+        actual = [check[6] or (0, 0) for check in checks]
+        for task, crcs in zip(tasks, task_crcs):
+            for (check_id, start, end), crc32 in zip(task, crcs):
+                prefix_crc, prefix_size = actual[check_id]
+                actual[check_id] = (crc32_combine(prefix_crc, crc32, end - start), prefix_size + end - start)
+        failed_blocks = set()
+        for check, (crc32, _) in zip(checks, actual):
+            if crc32 != check[4]:
+                failures.append(_failure(check[0], check[1], check[2], check[3], check[4], crc32))
+                if check[0] == 'solid_block':
+                    failed_blocks.add(check[1])
+
+        # solid条目的crc32针对解压后的文件数据，按块号顺序读取以复用解压结果
+        solid_entries.sort(key=lambda entry: (entry['offset'], entry['size']))
+        for entry in solid_entries:
+            if f"block {entry['offset']}" in failed_blocks:
+                # 所在块已报告损坏，不再逐个报告块内文件
+                continue
+            # 失败时报告所在块的位置
+            block_offset = data_offset + blocks[entry['offset']][0] if entry['offset'] < len(blocks) else data_offset
+            try:
+                with cart.read_entry(entry) as content:
+                    crc32 = calculate_crc32(content)
+            except Exception as e:
+                failures.append(_failure('entry', entry['path'], block_offset, entry['raw_size'], message=str(e) or type(e).__name__))
+                continue
+            if crc32 != entry['crc32']:
+                failures.append(_failure('entry', entry['path'], block_offset, entry['raw_size'], entry['crc32'], crc32))
+
+    result['checked'] = len(checks) + len(solid_entries)
+    result['skipped'] = skipped
+    result['failures'] = failures
+    if failures:
+        result['status'] = 'error'
+    result['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+    return result
+
+def _verify_cart_or_error(cart_path: str, jobs: int = 1) -> Dict[str, Any]:
+    """
+    verify_cart的批量版本：单个cart校验时的意外异常记为该cart的error结果，不中断整批校验
+    """
+    try:
+        return verify_cart(cart_path, jobs=jobs)
+    except Exception as e:
+        return {
+            'path': cart_path,
+            'status': 'error',
+            'checked': 0,
+            'skipped': [],
+            'failures': [_failure('image', 'cart', 0, 0, message=str(e) or type(e).__name__)]
+        }
+
+def verify_carts(cart_paths: List[str], workers: int = 0) -> Dict[str, Any]:
+    """
+    批量校验cart.bin
+
+    只有一个cart时在其内部并行计算CRC32；多个cart时各cart内串行，
+    多个cart在线程池中并行（适合批量校验SD卡母盘中的大量cart）。
+
+    Args:
+        cart_paths (List[str]): cart.bin路径
+        workers (int): 并行线程数（0表示全部CPU核心）
+
+    Returns:
+        Dict[str, Any]: 汇总结果（总数、通过数、失败数、总耗时和每个cart的结果）
+    """
+    if workers < 0:
+        raise ValueError("workers must be a non-negative integer")
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    if len(cart_paths) == 1:
+        results = [_verify_cart_or_error(cart_paths[0], jobs=workers)]
+    elif workers > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(cart_paths))) as pool:
+            results = list(pool.map(_verify_cart_or_error, cart_paths))
+    else:
+        results = [_verify_cart_or_error(path) for path in cart_paths]
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    return {
+        'total': len(results),
+        'ok': len(results) - failed,
+        'failed': failed,
+        'elapsed_ms': elapsed_ms,
+        'carts': results
+    }
@@ -0,0 +1,225 @@
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from xhcart_core.config.load import load_pack_json
+from xhcart_core.pipeline.build_manifest import manifest_path
+from xhcart_core.utils.io import ATOMIC_TEMP_SUFFIX, atomic_temp_prefix
+from xhcart_core.utils.path import resolve_relative_path
+
+# glob中的通配字符
+_GLOB_CHARS = set('*?[')
+
+class CartWatcher:
+    """
+    监视pack.json、icon以及各chunk glob根目录，变化后重新构建cart.bin
+
+    只使用标准库轮询：每轮用os.scandir遍历监视目录，记录每个文件的
+    (mtime_ns, size)快照并与上一轮比较。检测到变化后等待一段静默时间
+    （去抖），把连续保存合并为一次构建。构建由调用方提供（通常是增量构建），
+    构建过程输出的JSON步骤记录原样保留。
+    """
+
+    # 默认轮询间隔（秒）
+    POLL_INTERVAL = 0.2
+    # 默认去抖时间（秒）：最后一次变化后静默这么久才开始构建
+    DEBOUNCE = 0.3
+    # watch记录中最多列出的变化路径数
+    MAX_REPORTED_PATHS = 20
+
+    def __init__(self, pack_json: str, out_path: str, rebuild: Callable[[], None], poll_interval: Optional[float] = None, debounce: Optional[float] = None):
+        """
+        初始化CartWatcher
+
+        Args:
+            pack_json (str): pack.json文件路径
+            out_path (str): 输出cart.bin路径（及其清单、临时文件）不触发构建
+            rebuild (Callable[[], None]): 构建函数，异常会被报告但不会中止监视
+            poll_interval (Optional[float]): 轮询间隔（秒）
+            debounce (Optional[float]): 去抖时间（秒）
+        """
+        self.pack_json = Path(pack_json).resolve()
+        self.out_path = Path(out_path).resolve()
+        self.rebuild = rebuild
+        self.poll_interval = self.POLL_INTERVAL if poll_interval is None else poll_interval
+        self.debounce = self.DEBOUNCE if debounce is None else debounce
+        if self.poll_interval <= 0:
+            raise ValueError("poll interval must be positive")
+        if self.debounce < 0:
+            raise ValueError("debounce must be non-negative")
+
+        self._ignored = {self.out_path, manifest_path(str(self.out_path))}
+        self._roots = [(self.pack_json.parent, False)]
+        self.builds = 0
+
+    def watch_roots(self) -> List[Tuple[Path, bool]]:
+        """
+        计算监视根：pack.json所在目录（不递归）、icon文件、各chunk glob的固定前缀目录（递归）
+
+        pack.json暂时无法解析（例如保存到一半）时沿用上一次的监视根。
+
+        Returns:
+            List[Tuple[Path, bool]]: (路径, 是否递归)
+        """
+        pack_dir = self.pack_json.parent
+        roots = {pack_dir: False}
+        try:
+            pack_spec = load_pack_json(str(self.pack_json))
+        except Exception:
+            return self._roots
+
+        if pack_spec.icon and pack_spec.icon.get('path'):
+            roots.setdefault(resolve_relative_path(pack_spec.icon['path'], str(self.pack_json)), False)
+
+        for chunk in pack_spec.chunks or []:
+            glob_pattern = chunk.get('glob')
+            if not glob_pattern:
+                continue
+            root = pack_dir
+            for part in Path(glob_pattern).parts:
+                if _GLOB_CHARS & set(part):
+                    break
+                root = root / part
+            roots[root.resolve()] = True
+
+        # 已被递归根覆盖的路径不再单独遍历
+        recursive = [path for path, is_recursive in roots.items() if is_recursive]
+        self._roots = [
+            (path, is_recursive) for path, is_recursive in roots.items()
+            if not any(path != parent and parent in path.parents for parent in recursive)
+        ]
+        return self._roots
+
+    def snapshot(self, roots: List[Tuple[Path, bool]]) -> Dict[str, Tuple[int, int]]:
+        """
+        遍历监视根，返回 路径 -> (mtime_ns, size) 快照
+
+        Args:
+            roots (List[Tuple[Path, bool]]): watch_roots()的结果
+
+        Returns:
+            Dict[str, Tuple[int, int]]: 文件快照
+        """
+        files = {}
+        for path, recursive in roots:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isdir(path):
+                self._scan_dir(str(path), recursive, files)
+            elif not self._is_ignored(str(path)):
+                files[str(path)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _scan_dir(self, dir_path: str, recursive: bool, files: dict) -> None:
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if recursive:
+                        self._scan_dir(entry.path, recursive, files)
+                    continue
+                if self._is_ignored(entry.path):
+                    continue
+                # DirEntry缓存stat结果，每个文件每轮只stat一次
+                stat = entry.stat()
+            except OSError:
+                # 遍历过程中被删除
+                continue
+            files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+    def _is_ignored(self, path: str) -> bool:
+        path = Path(path)
+        if path in self._ignored:
+            return True
+        # 原子写入cart.bin及其清单时产生的临时文件（.<文件名>.XXXX.tmp）
+        return path.name.endswith(ATOMIC_TEMP_SUFFIX) and any(
+            path.parent == target.parent and path.name.startswith(atomic_temp_prefix(str(target)))
+            for target in self._ignored
+        )
+
+    @staticmethod
+    def diff(before: Dict[str, Tuple[int, int]], after: Dict[str, Tuple[int, int]]) -> List[str]:
+        """
+        比较两次快照，返回新增、修改或删除的路径（排序）
+        """
+        changed = {path for path, stat in after.items() if before.get(path) != stat}
+        changed.update(path for path in before if path not in after)
+        return sorted(changed)
+
+    def run(self, max_builds: Optional[int] = None) -> None:
+        """
+        先构建一次，然后持续监视并在变化后重新构建
+
+        Args:
+            max_builds (Optional[int]): 达到该构建次数后返回（None表示一直运行）
+        """
+        # 先取快照再构建，构建期间的修改会在下一轮被发现
+        roots = self.watch_roots()
+        state = self.snapshot(roots)
+        self._build([])
+        self._emit({
+            "step": "watch",
+            "status": "watching",
+            "roots": [str(path) for path, _ in roots],
+            "files": len(state)
+        })
+
+        pending = set()
+        last_change = 0.0
+        while max_builds is None or self.builds < max_builds:
+            time.sleep(self.poll_interval)
+            current = self.snapshot(roots)
+            changed = self.diff(state, current)
+            state = current
+            if changed:
+                pending.update(changed)
+                last_change = time.monotonic()
+                continue
+            if not pending or time.monotonic() - last_change < self.debounce:
+                continue
+
+            self._build(sorted(pending))
+            pending.clear()
+            # pack.json可能改变了chunk或icon配置，监视根变化时重新取快照
+            new_roots = self.watch_roots()
+            if new_roots != roots:
+                roots = new_roots
+                state = self.snapshot(roots)
+
+    def _build(self, changed: List[str]) -> None:
+        if changed:
+            self._emit({
+                "step": "watch",
+                "status": "rebuild",
+                "changes": len(changed),
+                "paths": changed[:self.MAX_REPORTED_PATHS]
+            })
+        start = time.perf_counter()
+        try:
+            self.rebuild()
+        except Exception as e:
+            # 构建失败不退出，等待下一次修改
+            self._emit({
+                "step": "watch",
+                "status": "error",
+                "message": str(e),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+            })
+        else:
+            self._emit({
+                "step": "watch",
+                "status": "ok",
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+            })
+        self.builds += 1
+
+    def _emit(self, result: dict):
+        print(json.dumps(result))
+        sys.stdout.flush()
@@ -0,0 +1,264 @@
+import contextlib
+import functools
+import io
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from xhcart_core.domain.errors import ToolError
+from xhcart_core.utils.cache import cache_key, file_sha256
+
+# 请求/响应协议版本
+PROTOCOL_VERSION = 1
+
+# 影响构建结果或缓存位置的环境变量：客户端与守护进程取值不同时不委托
+DELEGATED_ENV_PREFIX = 'XHCART_'
+DELEGATED_ENV_EXTRA = ('XDG_CACHE_HOME', 'HOME')
+# 只影响是否委托、不影响构建的环境变量
+CLIENT_ONLY_ENV = ('XHCART_SOCKET', 'XHCART_NO_DAEMON')
+
+def default_socket_path() -> str:
+    """
+    返回构建守护进程的Unix socket路径
+
+    优先使用XHCART_SOCKET，其次$XDG_RUNTIME_DIR/xhcart.sock，最后<临时目录>/xhcart-<uid>.sock。
+    """
+    if os.environ.get('XHCART_SOCKET'):
+        return os.environ['XHCART_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'xhcart.sock')
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), f'xhcart-{uid}.sock')
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint() -> str:
+    """
+    返回当前打包工具代码的指纹
+
+    源码运行时为xhcart_core各模块内容的哈希，PyInstaller单文件程序为可执行文件
+    本身的大小和mtime。守护进程与客户端指纹不同（例如守护进程由旧版本代码启动）时不委托。
+    """
+    if getattr(sys, 'frozen', False):
+        exe_stat = os.stat(sys.executable)
+        return cache_key('frozen', exe_stat.st_size, exe_stat.st_mtime_ns)
+    package_dir = Path(__file__).resolve().parent
+    parts = []
+    for path in sorted(package_dir.rglob('*.py')):
+        parts.extend([path.relative_to(package_dir).as_posix(), file_sha256(str(path))])
+    return cache_key('source', *parts)
+
+def delegated_env() -> Dict[str, str]:
+    """
+    返回影响构建的环境变量（XHCART_*、XDG_CACHE_HOME、HOME，不含只影响委托的变量）
+    """
+    return {
+        name: value for name, value in os.environ.items()
+        if (name.startswith(DELEGATED_ENV_PREFIX) or name in DELEGATED_ENV_EXTRA) and name not in CLIENT_ONLY_ENV
+    }
+
+def socket_trusted(socket_path: str) -> bool:
+    """
+    检查socket是否可以信任：是socket文件、属于当前用户且组和其他用户不可写
+
+    <临时目录>/xhcart-<uid>.sock可能被其他本地用户抢先创建，不满足条件时不连接。
+    """
+    try:
+        st = os.stat(socket_path)
+    except OSError:
+        return False
+    if not stat.S_ISSOCK(st.st_mode):
+        return False
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def request_daemon(request: dict, socket_path: Optional[str] = None, on_record: Optional[Callable[[str], None]] = None) -> Optional[dict]:
+    """
+    把请求发送给构建守护进程，并转发构建过程中的JSON步骤记录
+
+    发送请求前先检查socket的属主和权限（socket_trusted），build/inspect/verify等请求再用ping握手：
+    守护进程的协议版本、代码指纹（code_fingerprint）和影响构建的环境变量
+    （delegated_env）必须与本进程一致。
+    没有守护进程在运行（socket不存在或无法连接）、socket不可信、握手不一致、
+    平台不支持Unix socket、或设置了XHCART_NO_DAEMON=1时返回None，
+    调用方应在本进程内执行。
+
+    Args:
+        request (dict): 请求，例如{"command": "build", "pack_json": ..., "out_path": ...}；路径应为绝对路径
+        socket_path (Optional[str]): socket路径，默认使用default_socket_path()
+        on_record (Optional[Callable[[str], None]]): 每条步骤记录（原始JSON行）的回调，默认写到stdout
+
+    Returns:
+        Optional[dict]: 最终的{"step": "request", "status": "ok"/"error", ...}记录
+    """
+    if os.environ.get('XHCART_NO_DAEMON', '') not in ('', '0') or not hasattr(socket, 'AF_UNIX'):
+        return None
+    socket_path = socket_path or default_socket_path()
+    if not socket_trusted(socket_path):
+        return None
+    if on_record is None:
+        on_record = _print_record
+
+    # ping/shutdown不执行构建，旧版本守护进程也可以被探测和关闭
+    if request.get('command') not in ('ping', 'shutdown'):
+        hello = _send_request({'command': 'ping'}, socket_path, on_record)
+        if hello is None or hello.get('status') != 'ok' or \
+                hello.get('protocol') != PROTOCOL_VERSION or \
+                hello.get('code') != code_fingerprint() or \
+                hello.get('env') != delegated_env():
+            return None
+    return _send_request(request, socket_path, on_record)
+
+def _send_request(request: dict, socket_path: str, on_record: Callable[[str], None]) -> Optional[dict]:
+    # 无法连接时返回None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        for line in stream:
+            line = line.decode('utf-8').rstrip('\n')
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and record.get('step') == 'request':
+                return record
+            on_record(line)
+    raise ToolError("build daemon closed the connection before finishing the request")
+
+def _print_record(line: str) -> None:
+    print(line)
+    sys.stdout.flush()
+
+class BuildServer:
+    """
+    常驻构建守护进程
+
+    通过本机Unix socket接收JSON请求（每个连接一行请求），在同一进程内执行
+    build/inspect/verify，构建期间把CartBuilder等输出的JSON步骤记录原样流式
+    发回客户端，最后发送一条{"step": "request", ...}结果记录。
+    进程常驻使Pillow等模块只导入一次，字体LRU、luavm标识等进程内缓存和
+    磁盘缓存保持热状态。
+    请求按到达顺序逐个处理（构建会重定向stdout）。
+    """
+
+    def __init__(self, socket_path: Optional[str] = None):
+        """
+        初始化BuildServer
+
+        Args:
+            socket_path (Optional[str]): socket路径，默认使用default_socket_path()
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ToolError("serve requires Unix domain socket support")
+        self.socket_path = socket_path or default_socket_path()
+        self._server = None
+        self._stopping = False
+
+    def bind(self) -> None:
+        """
+        绑定socket；已有守护进程在运行时报错，残留的socket文件会被删除
+        """
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+            else:
+                raise ToolError(f"build daemon already running on {self.socket_path}")
+            finally:
+                probe.close()
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._handle_connection(self.rfile, self.wfile)
+
+        self._server = socketserver.UnixStreamServer(self.socket_path, Handler)
+        # 只允许当前用户连接
+        os.chmod(self.socket_path, 0o600)
+
+    def serve_forever(self) -> None:
+        """
+        处理请求直到收到shutdown请求或被中断，退出时删除socket文件
+        """
+        if self._server is None:
+            self.bind()
+        try:
+            while not self._stopping:
+                self._server.handle_request()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _handle_connection(self, rfile, wfile) -> None:
+        out = io.TextIOWrapper(wfile, encoding='utf-8', line_buffering=True, write_through=True)
+        try:
+            try:
+                request = json.loads(rfile.readline().decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+                with contextlib.redirect_stdout(out):
+                    reply = self.handle_request(request)
+                reply = dict({"step": "request", "status": "ok"}, **reply)
+            except KeyError as e:
+                reply = {"step": "request", "status": "error", "message": f"missing request field: {e}"}
+            except Exception as e:
+                reply = {"step": "request", "status": "error", "message": str(e)}
+            out.write(json.dumps(reply) + '\n')
+        except OSError:
+            # 客户端已断开
+            pass
+        finally:
+            out.detach()
+
+    def handle_request(self, request: dict) -> dict:
+        """
+        执行一个请求
+
+        Args:
+            request (dict): 请求，command为build、inspect、verify、ping或shutdown
+
+        Returns:
+            dict: 附加到结果记录中的字段
+        """
+        from xhcart_core import api
+
+        command = request.get('command')
+        if command == 'build':
+            api.pack_header_icon(
+                request['pack_json'], request['out_path'],
+                jobs=request.get('jobs'),
+                incremental=request.get('incremental', True),
+                explain=request.get('explain', False),
+                in_place=request.get('in_place', False)
+            )
+            return {}
+        if command == 'inspect':
+            info = api.inspect_header(request['path'])
+            # magic是bytes，按latin-1原样转为字符串
+            info['magic'] = info['magic'].decode('latin-1')
+            return {"result": info}
+        if command == 'verify':
+            return {"result": api.verify_header(request['path'])}
+        if command == 'ping':
+            return {"protocol": PROTOCOL_VERSION, "pid": os.getpid(), "code": code_fingerprint(), "env": delegated_env()}
+        if command == 'shutdown':
+            # 当前请求处理完后serve_forever返回
+            self._stopping = True
+            return {}
+        raise ValueError(f"Unknown command: {command}")
@@ -0,0 +1,64 @@
+import functools
+import json
+import struct
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from xhcart_core.utils.cache import ContentCache, cache_key, file_sha256, open_default_cache
+
+# 缓存条目头：width、height（little-endian uint32）
+_ENTRY_HEADER = struct.Struct('<II')
+
+@functools.lru_cache(maxsize=None)
+def pillow_version() -> str:
+    """
+    返回已安装的Pillow版本（读取包元数据，不导入Pillow）
+    """
+    from importlib import metadata
+    try:
+        return metadata.version('Pillow')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+def image_cache_key(image_path: Path, params: dict) -> str:
+    """
+    计算图片转换缓存键：源文件SHA-256 + 全部预处理参数 + Pillow版本
+
+    Args:
+        image_path (Path): 源图片路径
+        params (dict): 预处理参数（宽高、模式、背景色、重采样、目标格式等）
+
+    Returns:
+        str: 缓存键
+    """
+    return cache_key('image', file_sha256(str(image_path)), json.dumps(params, sort_keys=True), pillow_version())
+
+def cached_image_conversion(image_path: Path, params: dict, convert: Callable[[], Tuple[bytes, int, int]], cache: Optional[ContentCache] = None) -> Tuple[bytes, int, int]:
+    """
+    带磁盘缓存的图片转换
+
+    命中时直接返回缓存的(raw数据, 宽, 高)，不导入也不调用Pillow；
+    未命中时调用convert()并写入缓存。
+
+    Args:
+        image_path (Path): 源图片路径
+        params (dict): 预处理参数，参与缓存键
+        convert (Callable[[], Tuple[bytes, int, int]]): 实际转换函数
+        cache (Optional[ContentCache]): 缓存，默认使用open_default_cache('image')
+
+    Returns:
+        Tuple[bytes, int, int]: (raw数据, 宽, 高)
+    """
+    if cache is None:
+        cache = open_default_cache('image')
+    if cache is None:
+        return convert()
+
+    key = image_cache_key(image_path, params)
+    entry = cache.get(key)
+    if entry is not None and len(entry) >= _ENTRY_HEADER.size:
+        width, height = _ENTRY_HEADER.unpack_from(entry)
+        return entry[_ENTRY_HEADER.size:], width, height
+
+    raw_data, width, height = convert()
+    cache.put(key, _ENTRY_HEADER.pack(width, height) + bytes(raw_data))
+    return raw_data, width, height
@@ -5,19 +5,19 @@ from pathlib import Path
 def _image_to_bgra8888(img: Image.Image, width: int, height: int) -> bytes:
     """
     将RGBA图片转换为ARGB8888语义、BGRA字节序的raw数据。
+
+    使用Pillow raw编码器的BGRA打包模式一次性完成通道重排，
+    icon和RES图片共用此转换。
     """
-    raw_data = bytearray()
-    pixels = img.load()
-    for y in range(height):
-        for x in range(width):
-            r, g, b, a = pixels[x, y]
-            raw_data.extend(bytes([b, g, r, a]))
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    raw_data = img.tobytes('raw', 'BGRA')
 
     expected_length = width * height * 4
     if len(raw_data) != expected_length:
         raise ValueError(f"Raw data length mismatch: expected {expected_length}, got {len(raw_data)}")
 
-    return bytes(raw_data)
+    return raw_data
 
 def _hex_to_rgba(hex_color: str) -> tuple:
     """
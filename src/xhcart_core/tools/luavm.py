@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from xhcart_core.domain.errors import LuaCompileError
+from xhcart_core.utils.cache import ContentCache, cache_key, file_sha256
+
+def get_luavm_path():
+    if getattr(sys, 'frozen', False):
+        # PyInstaller 打包后，资源在 sys._MEIPASS 下
+        return os.path.join(sys._MEIPASS, 'tool', 'bin', 'luavm')
+    else:
+        # 开发环境
+        return os.path.join(os.path.dirname(__file__), '..', '..', '..', 'tool', 'bin', 'luavm')
+
+@functools.lru_cache(maxsize=None)
+def _luavm_identity(path: str, size: int, mtime_ns: int) -> str:
+    # luavm二进制内容的SHA-256，按(路径, 大小, mtime)在进程内记忆
+    return file_sha256(path)
+
+class LuaCompiler:
+    """
+    调用luavm把Lua源码编译为字节码的类
+
+    多个文件时使用有上限的线程池并发运行luavm子进程（编译在子进程中进行，
+    线程只负责等待），总耗时接近最慢的单个文件。
+    提供cache时按(源码SHA-256, luavm二进制SHA-256, 编译参数)缓存字节码，
+    更换luavm后缓存自动失效。
+    """
+
+    # luavm编译参数（同时作为缓存键的一部分）
+    COMPILE_FLAGS = ("--compile",)
+
+    def __init__(self, jobs: int = 1, luavm_path: Optional[str] = None, cache: Optional[ContentCache] = None):
+        """
+        初始化LuaCompiler
+
+        Args:
+            jobs (int): 同时运行的luavm子进程数上限（0表示CPU核心数）
+            luavm_path (Optional[str]): luavm路径，默认使用get_luavm_path()
+            cache (Optional[ContentCache]): 字节码缓存，None表示不缓存
+        """
+        if jobs < 0:
+            raise ValueError("jobs must be a non-negative integer")
+        self.jobs = jobs or os.cpu_count() or 1
+        self.luavm_path = Path(luavm_path or get_luavm_path())
+        self.cache = cache
+
+    def compile_file(self, lua_path: Path) -> bytes:
+        """
+        编译单个Lua文件
+
+        Args:
+            lua_path (Path): Lua文件路径
+
+        Returns:
+            bytes: 编译后的字节码
+        """
+        lua_path = Path(lua_path)
+        if not lua_path.exists():
+            raise ValueError(f"Lua file not found: {lua_path}")
+
+        # 确保文件是.lua结尾
+        if lua_path.suffix.lower() != '.lua':
+            raise ValueError(f"Lua file must be a .lua file: {lua_path}")
+
+        if not self.luavm_path.exists():
+            raise ValueError(f"luavm not found: {self.luavm_path}")
+
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(lua_path)
+            luac_data = self.cache.get(key)
+            if luac_data is not None:
+                return luac_data
+
+        luac_data = self._run_luavm(lua_path)
+        if key is not None:
+            self.cache.put(key, luac_data)
+        return luac_data
+
+    def _cache_key(self, lua_path: Path) -> str:
+        stat = self.luavm_path.stat()
+        luavm_hash = _luavm_identity(str(self.luavm_path.resolve()), stat.st_size, stat.st_mtime_ns)
+        with open(lua_path, 'rb') as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+        return cache_key('luac', source_hash, luavm_hash, *self.COMPILE_FLAGS)
+
+    def _run_luavm(self, lua_path: Path) -> bytes:
+        # 创建临时文件
+        with tempfile.NamedTemporaryFile(suffix='.luac', delete=False) as tmp:
+            tmp_path = tmp.name
+
+        try:
+            cmd = [str(self.luavm_path), *self.COMPILE_FLAGS, str(lua_path), tmp_path]
+
+            # 执行编译命令
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True
+            )
+
+            # 检查编译是否成功
+            if result.returncode != 0:
+                message = result.stderr.strip() or result.stdout.strip()
+                raise ValueError(f"Failed to compile Lua file: {message}")
+
+            # 读取编译后的字节码
+            with open(tmp_path, 'rb') as f:
+                return f.read()
+        finally:
+            # 清理临时文件
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def compile_files(self, lua_paths: List[Path]) -> Dict[str, bytes]:
+        """
+        并发编译多个Lua文件，所有文件都结束后统一报告错误
+
+        Args:
+            lua_paths (List[Path]): Lua文件路径列表（重复路径只编译一次）
+
+        Returns:
+            Dict[str, bytes]: str(路径) -> 字节码
+
+        Raises:
+            LuaCompileError: 任一文件编译失败，failures包含全部失败文件
+        """
+        paths = list(dict.fromkeys(str(path) for path in lua_paths))
+        if not paths:
+            return {}
+
+        if self.jobs <= 1 or len(paths) == 1:
+            outcomes = [self._try_compile(path) for path in paths]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.jobs, len(paths))) as pool:
+                outcomes = list(pool.map(self._try_compile, paths))
+
+        failures = [
+            {"path": path, "message": str(error)}
+            for path, (_, error) in zip(paths, outcomes) if error is not None
+        ]
+        if failures:
+            raise LuaCompileError(failures)
+
+        return {path: luac_data for path, (luac_data, _) in zip(paths, outcomes)}
+
+    def _try_compile(self, path: str) -> tuple:
+        try:
+            return self.compile_file(Path(path)), None
+        except Exception as e:
+            return None, e
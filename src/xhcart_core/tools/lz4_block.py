@@ -0,0 +1,53 @@
+import functools
+
+# 尝试导入lz4，如果不可用则设置标志
+try:
+    import lz4.block
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+def _require_lz4():
+    if not LZ4_AVAILABLE:
+        raise ImportError("lz4 is required for compress = \"lz4\". Please install it with 'pip install lz4'")
+
+@functools.lru_cache(maxsize=None)
+def lz4_version() -> str:
+    """
+    返回已安装的lz4版本（参与增量构建的配置指纹）
+    """
+    from importlib import metadata
+    try:
+        return metadata.version('lz4')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+def compress_block(data: bytes) -> bytes:
+    """
+    LZ4 block格式压缩（不带帧头，也不在开头存放原始大小，原始大小记录在INDEX中）
+
+    Args:
+        data (bytes): 原始数据
+
+    Returns:
+        bytes: 压缩后的数据
+    """
+    _require_lz4()
+    return lz4.block.compress(bytes(data), store_size=False)
+
+def decompress_block(data: bytes, raw_size: int) -> bytes:
+    """
+    解压LZ4 block数据
+
+    Args:
+        data (bytes): 压缩数据
+        raw_size (int): 原始大小（INDEX条目的raw_size）
+
+    Returns:
+        bytes: 原始数据
+    """
+    _require_lz4()
+    raw_data = lz4.block.decompress(bytes(data), uncompressed_size=raw_size)
+    if len(raw_data) != raw_size:
+        raise ValueError(f"LZ4 size mismatch: expected {raw_size}, got {len(raw_data)}")
+    return raw_data
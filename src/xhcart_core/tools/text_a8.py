@@ -1,8 +1,12 @@
 from PIL import Image, ImageDraw, ImageFont
+import csv
+import functools
 import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, List
 from xhcart_core.domain.errors import ToolError
 
 def render_text_a8(text: str, font_path: str, height_px: int = 20, pad_x: int = 2, trim_x: bool = True, resample: Optional[int] = None) -> Tuple[bytes, int, int, int, float]:
@@ -25,11 +29,11 @@ def render_text_a8(text: str, font_path: str, height_px: int = 20, pad_x: int =
     if not font_path.exists():
         raise ToolError(f"Font file not found: {font_path}")
     
-    # 搜索合适的字体大小
+    # 搜索合适的字体大小（按字体和高度记忆）
     font_size = _find_optimal_font_size(font_path, height_px)
     
-    # 加载字体
-    font = ImageFont.truetype(str(font_path), font_size, layout_engine=ImageFont.Layout.BASIC)
+    # 加载字体（进程内缓存）
+    font = _load_font(font_path, font_size)
     
     # 获取字体度量
     ascent, descent = font.getmetrics()
@@ -78,10 +82,51 @@ def render_text_a8(text: str, font_path: str, height_px: int = 20, pad_x: int =
     
     return a8_bytes, width, height, ascent, advance
 
+# 进程内字体缓存容量
+FONT_CACHE_SIZE = 64
+
+def _font_key(font_path: Path) -> Tuple[str, int]:
+    """
+    返回字体缓存键(绝对路径, mtime)，字体文件被替换后缓存自动失效
+    """
+    try:
+        resolved = font_path.resolve()
+        return str(resolved), resolved.stat().st_mtime_ns
+    except OSError as e:
+        raise ToolError(f"Font file not readable: {font_path}: {e}")
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font_cached(path: str, mtime_ns: int, size: int, layout_engine: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size, layout_engine=layout_engine)
+
+def _load_font(font_path: Path, size: int, layout_engine: int = ImageFont.Layout.BASIC) -> ImageFont.FreeTypeFont:
+    """
+    加载字体，按(路径, mtime, 字号, 排版引擎)在进程内LRU缓存
+    
+    Args:
+        font_path (Path): 字体文件路径
+        size (int): 字号
+        layout_engine (int): 排版引擎（默认BASIC）
+    
+    Returns:
+        ImageFont.FreeTypeFont: 字体对象
+    """
+    path, mtime_ns = _font_key(Path(font_path))
+    return _load_font_cached(path, mtime_ns, size, layout_engine)
+
+def clear_font_caches() -> None:
+    """
+    清空字体缓存和最优字号记忆
+    """
+    _load_font_cached.cache_clear()
+    _search_optimal_font_size.cache_clear()
+
 def _find_optimal_font_size(font_path: Path, target_height: int) -> int:
     """
     搜索最优字体大小，使得line_height最接近且不超过target_height
     
+    结果按(字体, mtime, 目标高度)记忆，同一字体和高度只搜索一次。
+    
     Args:
         font_path (Path): 字体文件路径
         target_height (int): 目标高度
@@ -89,7 +134,12 @@ def _find_optimal_font_size(font_path: Path, target_height: int) -> int:
     Returns:
         int: 最优字体大小
     """
-    # 二分搜索
+    path, mtime_ns = _font_key(Path(font_path))
+    return _search_optimal_font_size(path, mtime_ns, target_height)
+
+@functools.lru_cache(maxsize=None)
+def _search_optimal_font_size(font_path: str, mtime_ns: int, target_height: int) -> int:
+    # 二分搜索（中间字号不进入字体缓存，避免挤掉常用字体）
     low = 1
     high = 100
     best_size = 1
@@ -98,7 +148,7 @@ def _find_optimal_font_size(font_path: Path, target_height: int) -> int:
     while low <= high:
         mid = (low + high) // 2
         try:
-            font = ImageFont.truetype(str(font_path), mid, layout_engine=ImageFont.Layout.BASIC)
+            font = ImageFont.truetype(font_path, mid, layout_engine=ImageFont.Layout.BASIC)
             ascent, descent = font.getmetrics()
             line_height = ascent + descent
             
@@ -163,6 +213,36 @@ def write_json_metadata(out_path: str, text: str, font_path: str, width: int, he
     with open(json_path, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, indent=2)
 
+# 0..255 对应的C数组元素文本
+_C_BYTE_LITERALS = [f'{byte}, ' for byte in range(256)]
+
+def _format_c_byte_rows(data: bytes, per_row: int = 16) -> str:
+    """
+    将字节数据格式化为C数组初始化内容，每行per_row个元素
+    """
+    literals = _C_BYTE_LITERALS
+    rows = [
+        '    ' + ''.join([literals[byte] for byte in data[i:i + per_row]])
+        for i in range(0, len(data), per_row)
+    ]
+    return '\n'.join(rows).rstrip(', \n') + '\n'
+
+def _c_identifiers(out_path: str) -> Tuple[str, str]:
+    """
+    根据输出文件名生成(宏名称, 数组名称)，去除特殊字符
+    """
+    base_name = Path(out_path).stem
+    macro_name = ''.join(c if c.isalnum() else '_' for c in base_name).upper()
+    array_name = ''.join(c if c.isalnum() else '_' for c in base_name).lower()
+    return macro_name, array_name
+
+def _c_comment_text(text: str) -> str:
+    """
+    转义写入C/汇编注释的文本：换行、反斜杠（//注释续行）、*/（提前结束/* */注释）和/*
+    """
+    return (text.replace('\\', '\\\\').replace('\r', '\\r').replace('\n', '\\n')
+            .replace('*/', '*\\/').replace('/*', '/\\*'))
+
 def write_header_metadata(out_path: str, text: str, font_path: str, width: int, height: int, baseline: int, a8_bytes: bytes) -> None:
     """
     写入C头文件元数据
@@ -180,29 +260,22 @@ def write_header_metadata(out_path: str, text: str, font_path: str, width: int,
     header_path = Path(out_path).with_suffix('.h')
     
     # 生成宏名称（去除特殊字符，转换为大写）
-    base_name = Path(out_path).stem
-    macro_name = ''.join(c if c.isalnum() else '_' for c in base_name).upper()
-    array_name = ''.join(c if c.isalnum() else '_' for c in base_name).lower()
+    macro_name, array_name = _c_identifiers(out_path)
     
-    # 生成数组内容
-    array_lines = []
-    for i, byte in enumerate(a8_bytes):
-        if i % 16 == 0:
-            array_lines.append('    ')
-        array_lines.append(f'{byte}, ')
-        if (i + 1) % 16 == 0:
-            array_lines.append('\n')
+    comment_text = _c_comment_text(text)
+    comment_font = _c_comment_text(Path(font_path).name)
     
-    array_content = ''.join(array_lines).rstrip(', \n') + '\n'
+    # 生成数组内容：按行（每行16字节）整体格式化
+    array_content = _format_c_byte_rows(a8_bytes)
     
     # 生成头文件内容
-    header_content = f"""#ifndef {macro_name}_H
-#define {macro_name}_H
+    header_content = f"""#ifndef {macro_name}_INCLUDED
+#define {macro_name}_INCLUDED
 
 #include <stdint.h>
 
-// Generated from text: "{text}"
-// Font: {Path(font_path).name}
+// Generated from text: "{comment_text}"
+// Font: {comment_font}
 
 #define {macro_name}_W {width}
 #define {macro_name}_H {height}
@@ -211,7 +284,7 @@ def write_header_metadata(out_path: str, text: str, font_path: str, width: int,
 static const uint8_t {array_name}_a8[{width * height}] = {{
 {array_content}}};
 
-#endif // {macro_name}_H
+#endif // {macro_name}_INCLUDED
 """
     
     # 写入头文件
@@ -219,7 +292,64 @@ static const uint8_t {array_name}_a8[{width * height}] = {{
         f.write(header_content)
 
 
-def process_text_a8(text: str, font_path: str, out_path: str, height_px: int = 20, pad_x: int = 2, trim_x: bool = True, emit_json: bool = False, emit_header: bool = False, emit_jpg: bool = False) -> Dict[str, Any]:
+def write_incbin_stub(out_path: str, text: str, font_path: str, width: int, height: int, baseline: int, section: str = '.rodata.xhgc_a8') -> None:
+    """
+    写入引用.a8文件的汇编桩（.S，使用.incbin）以及只含extern声明的C头文件
+
+    固件构建直接链接.a8二进制，不需要编译巨大的C数组初始化器。
+    汇编时需要用 -I 指定.a8所在目录。
+    
+    Args:
+        out_path (str): .a8输出文件路径
+        text (str): 渲染的文本
+        font_path (str): 字体文件路径
+        width (int): 输出宽度
+        height (int): 输出高度
+        baseline (int): 基线位置
+        section (str): 数据所在的链接段名前缀
+    """
+    macro_name, array_name = _c_identifiers(out_path)
+    symbol = f'{array_name}_a8'
+    a8_name = Path(out_path).name
+    comment_text = _c_comment_text(text)
+    comment_font = _c_comment_text(Path(font_path).name)
+    
+    asm_content = f"""/* Generated from text: "{comment_text}" */
+/* Font: {comment_font} */
+
+    .section {section}.{array_name}, "a", %progbits
+    .global {symbol}
+    .type {symbol}, %object
+    .balign 4
+{symbol}:
+    .incbin "{a8_name}"
+    .size {symbol}, . - {symbol}
+"""
+    with open(Path(out_path).with_suffix('.S'), 'w', encoding='utf-8') as f:
+        f.write(asm_content)
+    
+    header_content = f"""#ifndef {macro_name}_INCLUDED
+#define {macro_name}_INCLUDED
+
+#include <stdint.h>
+
+// Generated from text: "{comment_text}"
+// Font: {comment_font}
+// Data linked from {_c_comment_text(a8_name)} via {_c_comment_text(Path(out_path).with_suffix('.S').name)}
+
+#define {macro_name}_W {width}
+#define {macro_name}_H {height}
+#define {macro_name}_BASELINE {baseline}
+
+extern const uint8_t {symbol}[{width * height}];
+
+#endif // {macro_name}_INCLUDED
+"""
+    with open(Path(out_path).with_suffix('.h'), 'w', encoding='utf-8') as f:
+        f.write(header_content)
+
+
+def process_text_a8(text: str, font_path: str, out_path: str, height_px: int = 20, pad_x: int = 2, trim_x: bool = True, emit_json: bool = False, emit_header: bool = False, emit_jpg: bool = False, emit_incbin: bool = False) -> Dict[str, Any]:
     """
     处理文本A8渲染并输出文件
     
@@ -233,9 +363,11 @@ def process_text_a8(text: str, font_path: str, out_path: str, height_px: int = 2
         emit_json (bool): 是否输出JSON元数据（默认False）
         emit_header (bool): 是否输出C头文件（默认False）
         emit_jpg (bool): 是否输出JPG预览文件（默认False）
+        emit_incbin (bool): 是否输出.incbin汇编桩和extern声明头文件（默认False），
+            启用时代替emit_header的C数组头文件
     
     Returns:
-        Dict[str, Any]: 元数据
+        Dict[str, Any]: 元数据（emit_jpg时jpg为预览文件路径）
     """
     # 渲染文本
     a8_bytes, width, height, baseline, advance = render_text_a8(
@@ -249,16 +381,14 @@ def process_text_a8(text: str, font_path: str, out_path: str, height_px: int = 2
     if emit_json:
         write_json_metadata(out_path, text, font_path, width, height, baseline, advance)
     
-    # 写入C头文件
-    if emit_header:
+    # 写入C头文件或.incbin汇编桩
+    if emit_incbin:
+        write_incbin_stub(out_path, text, font_path, width, height, baseline)
+    elif emit_header:
         write_header_metadata(out_path, text, font_path, width, height, baseline, a8_bytes)
     
-    # 写入JPG预览文件
-    if emit_jpg:
-        write_jpg_preview(out_path, a8_bytes, width, height)
-    
     # 返回元数据
-    return {
+    metadata = {
         "text": text,
         "font": Path(font_path).name,
         "width": width,
@@ -266,8 +396,17 @@ def process_text_a8(text: str, font_path: str, out_path: str, height_px: int = 2
         "baseline": baseline,
         "advance": advance
     }
+    
+    # 写入JPG预览文件
+    if emit_jpg:
+        metadata["jpg"] = write_jpg_preview(out_path, a8_bytes, width, height)
+    
+    return metadata
 
-def write_jpg_preview(out_path: str, a8_bytes: bytes, width: int, height: int) -> None:
+# A8 alpha -> 预览亮度查找表（稍微调整亮度，使文字更清晰）
+_JPG_PREVIEW_LUT = [255 - int(alpha * 0.9) for alpha in range(256)]
+
+def write_jpg_preview(out_path: str, a8_bytes: bytes, width: int, height: int) -> str:
     """
     写入JPG预览文件
     
@@ -276,6 +415,9 @@ def write_jpg_preview(out_path: str, a8_bytes: bytes, width: int, height: int) -
         a8_bytes (bytes): A8原始数据
         width (int): 宽度
         height (int): 高度
+    
+    Returns:
+        str: JPG预览文件路径
     """
     from PIL import Image
     
@@ -283,23 +425,162 @@ def write_jpg_preview(out_path: str, a8_bytes: bytes, width: int, height: int) -
     jpg_path = Path(out_path).with_suffix('.jpg')
     
     # 从A8数据创建Image对象
-    img = Image.new('L', (width, height))
-    img.frombytes(a8_bytes, 'raw', 'L')
-    
-    # 转换为RGB模式（JPG不支持灰度模式）
-    rgb_img = Image.new('RGB', (width, height), color='white')
-    for y in range(height):
-        for x in range(width):
-            # 计算像素位置
-            pos = y * width + x
-            alpha = a8_bytes[pos]
-            # 如果alpha > 0，设置为黑色（根据alpha值调整亮度）
-            if alpha > 0:
-                # 计算亮度：alpha越大，颜色越深
-                brightness = 255 - int(alpha * 0.9)  # 稍微调整亮度，使文字更清晰
-                rgb_img.putpixel((x, y), (brightness, brightness, brightness))
+    img = Image.frombytes('L', (width, height), a8_bytes)
+    
+    # alpha越大颜色越深：亮度 = 255 - int(alpha * 0.9)，alpha为0时保持白色
+    # 整幅图一次查表映射，再转换为RGB模式（JPG不支持灰度模式）
+    rgb_img = img.point(_JPG_PREVIEW_LUT).convert('RGB')
     
     # 写入JPG文件
     rgb_img.save(jpg_path, 'JPEG', quality=90)
     
-    print(f"JPG preview written to: {jpg_path}")
+    return str(jpg_path)
+
+
+def load_text_a8_jobs(jobs_path: str) -> List[Dict[str, Any]]:
+    """
+    读取批量渲染任务列表（JSON或CSV）
+    
+    JSON为任务对象数组或{"jobs": [...]}；CSV首行为列名。每个任务包含
+    text、font，可选height（默认20）和out（输出.a8路径）。
+    相对font路径按任务文件所在目录解析。
+    
+    Args:
+        jobs_path (str): 任务文件路径（.json或.csv）
+    
+    Returns:
+        List[Dict[str, Any]]: 规范化后的任务列表
+    """
+    jobs_path = Path(jobs_path)
+    if not jobs_path.exists():
+        raise ToolError(f"Jobs file not found: {jobs_path}")
+    
+    try:
+        if jobs_path.suffix.lower() == '.csv':
+            with open(jobs_path, 'r', encoding='utf-8-sig', newline='') as f:
+                raw_jobs = list(csv.DictReader(f))
+        else:
+            with open(jobs_path, 'r', encoding='utf-8') as f:
+                raw_jobs = json.load(f)
+            if isinstance(raw_jobs, dict):
+                raw_jobs = raw_jobs.get('jobs')
+    except (OSError, ValueError, csv.Error) as e:
+        raise ToolError(f"Failed to read jobs file {jobs_path}: {e}")
+    
+    if not isinstance(raw_jobs, list):
+        raise ToolError(f"Jobs file must contain a list of jobs: {jobs_path}")
+    
+    jobs = []
+    for index, raw in enumerate(raw_jobs):
+        if not isinstance(raw, dict) or not raw.get('text') or not raw.get('font'):
+            raise ToolError(f"Job {index} must have non-empty 'text' and 'font'")
+        
+        try:
+            height = int(raw.get('height') or 20)
+        except (TypeError, ValueError):
+            raise ToolError(f"Job {index} has invalid height: {raw.get('height')!r}")
+        if height <= 0:
+            raise ToolError(f"Job {index} has invalid height: {height}")
+        
+        font = Path(raw['font'])
+        if not font.is_absolute():
+            font = jobs_path.parent / font
+        
+        jobs.append({
+            'index': index,
+            'text': str(raw['text']),
+            'font': str(font),
+            'height': height,
+            'out': raw.get('out') or f"text_{index:04d}.a8"
+        })
+    
+    return jobs
+
+def _render_text_a8_jobs(jobs: List[Dict[str, Any]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    在当前进程中依次执行一组渲染任务（进程池worker入口）
+    
+    单个任务失败只记录错误，不影响同组其他任务。
+    """
+    results = []
+    for job in jobs:
+        start = time.perf_counter()
+        result = {
+            'index': job['index'],
+            'text': job['text'],
+            'out': job['out']
+        }
+        try:
+            metadata = process_text_a8(job['text'], job['font'], job['out'], height_px=job['height'], **options)
+            result.update(status='ok', width=metadata['width'], height=metadata['height'])
+            if 'jpg' in metadata:
+                result['jpg'] = metadata['jpg']
+        except Exception as e:
+            result.update(status='error', error=str(e))
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        results.append(result)
+    return results
+
+def process_text_a8_batch(jobs: List[Dict[str, Any]], out_dir: str, workers: int = 1, emit_json: bool = False, emit_header: bool = False, emit_jpg: bool = False, emit_incbin: bool = False) -> Dict[str, Any]:
+    """
+    批量渲染文本A8并输出文件
+    
+    任务按(字体, 高度)排序后分组交给进程池，每个worker进程内的字体缓存
+    和最优字号记忆在组内复用。单个任务失败不会中止其他任务。
+    
+    Args:
+        jobs (List[Dict[str, Any]]): 任务列表（见load_text_a8_jobs）
+        out_dir (str): 输出目录，相对out路径按此目录解析
+        workers (int): 并行进程数（0表示全部CPU核心，默认1即当前进程内执行）
+        emit_json (bool): 是否输出JSON元数据
+        emit_header (bool): 是否输出C头文件
+        emit_jpg (bool): 是否输出JPG预览文件
+        emit_incbin (bool): 是否输出.incbin汇编桩和extern声明头文件
+    
+    Returns:
+        Dict[str, Any]: 汇总结果（总数、成功数、失败数、总耗时和每个任务的耗时）
+    """
+    if workers < 0:
+        raise ValueError("workers must be a non-negative integer")
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    
+    options = {
+        'emit_json': emit_json,
+        'emit_header': emit_header,
+        'emit_jpg': emit_jpg,
+        'emit_incbin': emit_incbin
+    }
+    
+    # 解析输出路径，并按(字体, 高度)排序以提高缓存命中
+    out_dir = Path(out_dir)
+    resolved = []
+    for job in jobs:
+        out = Path(job['out'])
+        if not out.is_absolute():
+            out = out_dir / out
+        resolved.append(dict(job, out=str(out)))
+    resolved.sort(key=lambda job: (job['font'], job['height'], job['index']))
+    
+    start = time.perf_counter()
+    if workers <= 1 or len(resolved) <= 1:
+        results = _render_text_a8_jobs(resolved, options)
+    else:
+        # 每个worker约分到4组，兼顾缓存复用和负载均衡
+        group_size = max(1, -(-len(resolved) // (workers * 4)))
+        groups = [resolved[i:i + group_size] for i in range(0, len(resolved), group_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+            for group_results in pool.map(_render_text_a8_jobs, groups, [options] * len(groups)):
+                results.extend(group_results)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    
+    results.sort(key=lambda result: result['index'])
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    return {
+        'total': len(results),
+        'ok': len(results) - failed,
+        'failed': failed,
+        'elapsed_ms': elapsed_ms,
+        'jobs': results
+    }
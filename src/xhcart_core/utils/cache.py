@@ -0,0 +1,186 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+from xhcart_core.utils.io import atomic_write
+
+# 缓存总大小默认上限
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def cache_key(*parts) -> str:
+    """
+    由多个键组成部分计算SHA-256内容寻址键
+
+    Args:
+        *parts: 键组成部分（bytes或可转为str的值）
+
+    Returns:
+        str: 64位十六进制键
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, (bytes, bytearray, memoryview)):
+            part = str(part).encode('utf-8')
+        # 先写长度，避免不同拆分得到相同的拼接结果
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+def file_sha256(path: str) -> str:
+    """
+    计算文件内容的SHA-256
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def default_cache_dir() -> Optional[Path]:
+    """
+    返回默认缓存根目录；设置XHCART_NO_CACHE=1时返回None（禁用缓存）
+
+    优先使用XHCART_CACHE_DIR，其次$XDG_CACHE_HOME/xhcart，最后~/.cache/xhcart。
+    """
+    if os.environ.get('XHCART_NO_CACHE', '') not in ('', '0'):
+        return None
+    if os.environ.get('XHCART_CACHE_DIR'):
+        return Path(os.environ['XHCART_CACHE_DIR'])
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(base) / 'xhcart'
+
+def open_default_cache(namespace: str) -> Optional['ContentCache']:
+    """
+    打开默认缓存根目录下的命名空间缓存，禁用时返回None
+
+    总大小上限取XHCART_CACHE_MAX_MB（默认512），每个命名空间单独计算。
+    """
+    root = default_cache_dir()
+    if root is None:
+        return None
+    max_bytes = DEFAULT_CACHE_MAX_BYTES
+    if os.environ.get('XHCART_CACHE_MAX_MB'):
+        max_bytes = int(os.environ['XHCART_CACHE_MAX_MB']) * 1024 * 1024
+    return ContentCache(root / namespace, max_bytes=max_bytes)
+
+class ContentCache:
+    """
+    磁盘内容寻址缓存
+
+    每个条目是<root>/<key[:2]>/<key>一个文件，写入使用临时文件加os.replace，
+    多个并行构建同时读写同一键是安全的（最后写入者胜出，内容相同）。
+    命中时更新mtime，超出大小上限时按mtime从旧到新淘汰（LRU）。
+    读写失败一律视为未命中，缓存不会导致构建失败。
+    """
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        初始化ContentCache
+
+        Args:
+            root (str): 缓存目录
+            max_bytes (int): 缓存总大小上限
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size_estimate = None
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取缓存条目
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            Optional[bytes]: 条目内容，未命中时为None
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新mtime作为LRU访问时间
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        写入缓存条目，写入后超出上限时淘汰最久未使用的条目
+
+        Args:
+            key (str): 缓存键
+            data (bytes): 条目内容
+        """
+        try:
+            atomic_write(str(self._entry_path(key)), data)
+        except OSError:
+            return
+
+        if self._size_estimate is None:
+            self._size_estimate = self.total_size()
+        else:
+            self._size_estimate += len(data)
+        if self._size_estimate > self.max_bytes:
+            self.prune()
+
+    def total_size(self) -> int:
+        """
+        统计缓存当前总大小
+        """
+        return sum(size for _, _, size in self._scan())
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """
+        按mtime从旧到新删除条目，直到总大小不超过上限
+
+        Args:
+            max_bytes (Optional[int]): 大小上限，默认使用self.max_bytes
+
+        Returns:
+            int: 删除的条目数
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        for _, path, size in entries:
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                # 其他进程已删除
+                pass
+            except OSError:
+                continue
+            total -= size
+        self._size_estimate = total
+        return removed
+
+    def _scan(self):
+        """
+        产出(mtime, 路径, 大小)，忽略写入中的临时文件被并发删除等情况
+        """
+        try:
+            buckets = list(os.scandir(self.root))
+        except OSError:
+            return
+        for bucket in buckets:
+            if not bucket.is_dir(follow_symlinks=False):
+                continue
+            try:
+                entries = list(os.scandir(bucket.path))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                yield stat.st_mtime_ns, entry.path, stat.st_size
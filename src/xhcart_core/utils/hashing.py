@@ -1,13 +1,131 @@
 import zlib
 
-def calculate_crc32(data: bytes) -> int:
+# CRC-32/IEEE 反射多项式
+_CRC32_POLY = 0xEDB88320
+
+def calculate_crc32(data: bytes, value: int = 0) -> int:
     """
     计算CRC32校验值（IEEE标准）
-    
+
     Args:
         data (bytes): 要计算校验值的数据
-    
+        value (int): 前序数据的CRC32，用于分块累计计算，默认0
+
     Returns:
         int: CRC32校验值（little-endian格式）
     """
-    return zlib.crc32(data) & 0xFFFFFFFF
\ No newline at end of file
+    return zlib.crc32(data, value) & 0xFFFFFFFF
+
+def _multmodp(a: int, b: int) -> int:
+    """
+    GF(2)多项式乘法 a*b mod p（反射表示）
+    """
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if (a & (m - 1)) == 0:
+                break
+        m >>= 1
+        b = (b >> 1) ^ _CRC32_POLY if b & 1 else b >> 1
+    return p
+
+def _build_x2n_table() -> list:
+    # table[k] = x^(2^k) mod p，k按32循环
+    table = [1 << 30]
+    for _ in range(31):
+        table.append(_multmodp(table[-1], table[-1]))
+    return table
+
+_X2N_TABLE = _build_x2n_table()
+_SHIFT_TABLES = {}
+
+def _shift_tables(k: int) -> list:
+    """
+    返回"乘以x^(2^k)"算子的4张按字节查找表（按需生成并缓存）
+    """
+    tables = _SHIFT_TABLES.get(k)
+    if tables is None:
+        op = _X2N_TABLE[k]
+        basis = [_multmodp(op, 1 << i) for i in range(32)]
+        tables = []
+        for byte_index in range(4):
+            table = [0] * 256
+            for v in range(1, 256):
+                low = v & -v
+                table[v] = table[v ^ low] ^ basis[byte_index * 8 + low.bit_length() - 1]
+            tables.append(table)
+        _SHIFT_TABLES[k] = tables
+    return tables
+
+def _crc32_shift(crc: int, length: int) -> int:
+    """
+    将CRC寄存器值向后推进length个0字节（乘以x^(8*length) mod p）
+    """
+    k = 3
+    while length:
+        if length & 1:
+            t0, t1, t2, t3 = _shift_tables(k & 31)
+            crc = t0[crc & 0xFF] ^ t1[(crc >> 8) & 0xFF] ^ t2[(crc >> 16) & 0xFF] ^ t3[crc >> 24]
+        length >>= 1
+        k += 1
+    return crc
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """
+    由CRC32(A)和CRC32(B)推导CRC32(A+B)，不需要重新读取数据
+
+    Args:
+        crc1 (int): 前一段数据的CRC32
+        crc2 (int): 后一段数据的CRC32
+        len2 (int): 后一段数据的字节数
+
+    Returns:
+        int: 拼接后数据的CRC32
+    """
+    if len2 <= 0:
+        return crc1
+    return _crc32_shift(crc1, len2) ^ crc2
+
+def crc32_zeros(length: int) -> int:
+    """
+    计算length个0字节的CRC32（用于对齐填充），不分配缓冲区
+
+    Args:
+        length (int): 0字节数量
+
+    Returns:
+        int: CRC32校验值
+    """
+    if length <= 0:
+        return 0
+    return _crc32_shift(0xFFFFFFFF, length) ^ 0xFFFFFFFF
+
+def crc32_patch(crc: int, length: int, offset: int, old: bytes, new: bytes) -> int:
+    """
+    数据中[offset, offset+len(old))被替换为new后，由原CRC32推导新CRC32
+
+    CRC32对等长数据满足 crc(a ^ b) = crc(a) ^ crc(b) ^ crc(zeros)，
+    因此只需要对变化的字节计算。
+
+    Args:
+        crc (int): 原数据的CRC32
+        length (int): 原数据总字节数
+        offset (int): 变化区域起点
+        old (bytes): 原字节
+        new (bytes): 新字节（长度必须与old相同）
+
+    Returns:
+        int: 新数据的CRC32
+    """
+    if len(old) != len(new):
+        raise ValueError("crc32_patch requires old and new of equal length")
+    if offset < 0 or offset + len(old) > length:
+        raise ValueError("crc32_patch range out of data")
+
+    delta = bytes(a ^ b for a, b in zip(old, new))
+    tail = length - offset - len(delta)
+    delta_crc = crc32_combine(crc32_zeros(offset), calculate_crc32(delta), len(delta))
+    delta_crc = crc32_combine(delta_crc, crc32_zeros(tail), tail)
+    return crc ^ delta_crc ^ crc32_zeros(length)
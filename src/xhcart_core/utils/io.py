@@ -1,14 +1,35 @@
 import os
 import tempfile
+from contextlib import contextmanager
 from pathlib import Path
 
-def atomic_write(path: str, data: bytes) -> None:
+# atomic_open临时文件名后缀
+ATOMIC_TEMP_SUFFIX = '.tmp'
+
+def atomic_temp_prefix(path: str) -> str:
     """
-    原子写入文件
-    
+    atomic_open在目标目录创建的临时文件名前缀（".<目标文件名>."）
+
     Args:
         path (str): 输出文件路径
-        data (bytes): 要写入的数据
+
+    Returns:
+        str: 临时文件名前缀
+    """
+    return f'.{Path(path).name}.'
+
+@contextmanager
+def atomic_open(path: str):
+    """
+    原子写入文件的上下文管理器
+
+    在目标目录创建可读写的临时文件，正常退出时替换目标文件，异常时删除临时文件。
+
+    Args:
+        path (str): 输出文件路径
+
+    Yields:
+        file: 临时文件对象（'w+b'模式）
     """
     # 获取目录
     path_obj = Path(path)
@@ -18,15 +39,140 @@ def atomic_write(path: str, data: bytes) -> None:
         dir_path.mkdir(parents=True, exist_ok=True)
     
     # 创建临时文件
-    with tempfile.NamedTemporaryFile(dir=dir_path, delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
+    tmp = tempfile.NamedTemporaryFile(dir=dir_path, prefix=atomic_temp_prefix(path), suffix=ATOMIC_TEMP_SUFFIX, delete=False)
+    tmp_path = tmp.name
     
     try:
+        with tmp:
+            yield tmp
         # 重命名临时文件到目标路径
         os.replace(tmp_path, path)
-    except Exception:
+    except BaseException:
         # 发生错误时删除临时文件
         if os.path.exists(tmp_path):
             os.unlink(tmp_path)
-        raise
\ No newline at end of file
+        raise
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    原子写入文件
+    
+    Args:
+        path (str): 输出文件路径
+        data (bytes): 要写入的数据
+    """
+    with atomic_open(path) as f:
+        f.write(data)
+
+# 共享的只读0字节页，填充区直接切片引用，不再为每段padding分配缓冲区
+_ZERO_PAGE = memoryview(bytes(64 * 1024))
+
+class GatherWriter:
+    """
+    聚集写入器
+
+    收集待写出的内存片段（memoryview，不复制），攒够一批后用os.writev一次写出；
+    不支持writev的平台退化为逐片write。Header等需要回填的区域用pwrite原地写入。
+    """
+
+    FLUSH_BYTES = 8 * 1024 * 1024
+    IOV_MAX = 1024
+
+    def __init__(self, f):
+        """
+        初始化GatherWriter
+
+        Args:
+            f: 可写二进制文件对象，之后只能通过本写入器写入
+        """
+        f.flush()
+        self._file = f
+        self._fd = f.fileno()
+        self._use_writev = hasattr(os, 'writev')
+        self._parts = []
+        self._pending = 0
+        self.position = f.tell()
+        if self._use_writev:
+            os.lseek(self._fd, self.position, os.SEEK_SET)
+
+    def write(self, data) -> int:
+        """
+        追加一个片段（只保存引用）
+
+        Args:
+            data: bytes-like数据，flush前调用方不应修改
+
+        Returns:
+            int: 片段长度
+        """
+        view = memoryview(data).cast('B')
+        size = len(view)
+        if size:
+            self._parts.append(view)
+            self._pending += size
+            self.position += size
+            if self._pending >= self.FLUSH_BYTES or len(self._parts) >= self.IOV_MAX:
+                self.flush()
+        return size
+
+    def write_zeros(self, size: int):
+        """
+        追加size个0字节，引用共享0字节页
+        """
+        while size > 0:
+            step = min(size, len(_ZERO_PAGE))
+            self.write(_ZERO_PAGE[:step])
+            size -= step
+
+    def seek(self, position: int):
+        """
+        移动写入位置；跳过的区域保持为文件空洞（读出为0）
+        """
+        self.flush()
+        if self._use_writev:
+            os.lseek(self._fd, position, os.SEEK_SET)
+        else:
+            self._file.seek(position)
+        self.position = position
+
+    def pwrite(self, position: int, data):
+        """
+        在指定位置原地写入，不改变当前写入位置
+        """
+        self.flush()
+        view = memoryview(data).cast('B')
+        if hasattr(os, 'pwrite'):
+            while len(view):
+                written = os.pwrite(self._fd, view, position)
+                view = view[written:]
+                position += written
+        else:
+            self._file.seek(position)
+            self._file.write(view)
+            self._file.seek(self.position)
+
+    def flush(self):
+        """
+        写出所有已收集的片段
+        """
+        parts = self._parts
+        if not parts:
+            return
+        self._parts = []
+        self._pending = 0
+
+        if not self._use_writev:
+            for part in parts:
+                self._file.write(part)
+            self._file.flush()
+            return
+
+        start = 0
+        while start < len(parts):
+            written = os.writev(self._fd, parts[start:])
+            # 处理部分写入：跳过已完整写出的片段，截断写了一半的片段
+            while start < len(parts) and written >= len(parts[start]):
+                written -= len(parts[start])
+                start += 1
+            if written:
+                parts[start] = parts[start][written:]
@@ -0,0 +1,52 @@
+import os
+from xhcart_core.utils.cache import ContentCache, cache_key, default_cache_dir
+
+
+def test_cache_key_separates_parts():
+    """测试键组成部分的拆分方式不同时得到不同的键"""
+    assert cache_key('ab', 'c') != cache_key('a', 'bc')
+    assert cache_key(b'x', 1) == cache_key('x', '1')
+
+
+def test_get_put_roundtrip(tmp_path):
+    """测试写入后可以读取，未写入的键返回None"""
+    cache = ContentCache(tmp_path / 'c')
+    key = cache_key('k')
+    assert cache.get(key) is None
+    cache.put(key, b'value')
+    assert cache.get(key) == b'value'
+    assert (tmp_path / 'c' / key[:2] / key).read_bytes() == b'value'
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    """测试超出上限时按最近使用时间淘汰"""
+    cache = ContentCache(tmp_path, max_bytes=1000)
+    keys = [cache_key(i) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, bytes(100))
+        path = tmp_path / key[:2] / key
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+
+    # 访问最旧的条目，使其变为最近使用
+    assert cache.get(keys[0]) is not None
+    assert cache.prune(max_bytes=250) == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_put_prunes_when_over_limit(tmp_path):
+    """测试写入超出上限时自动淘汰"""
+    cache = ContentCache(tmp_path, max_bytes=150)
+    for i in range(5):
+        cache.put(cache_key(i), bytes(100))
+    assert cache.total_size() <= 150
+
+
+def test_default_cache_dir_env(tmp_path, monkeypatch):
+    """测试环境变量控制默认缓存目录"""
+    monkeypatch.setenv('XHCART_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('XHCART_NO_CACHE', raising=False)
+    assert default_cache_dir() == tmp_path
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+    assert default_cache_dir() is None
@@ -1,8 +1,16 @@
+import io
+import json
+import os
 import struct
+import zlib
 
+import pytest
 from PIL import Image
 
 from xhcart_core.api import pack_header_icon
+from xhcart_core.config.load import load_pack_json
+from xhcart_core.domain.errors import ConfigError
+from xhcart_core.format.xhgc.index import IndexTable
 from xhcart_core.pipeline.build_data import BuildData
 
 
@@ -267,3 +275,377 @@ def test_cart_bin_uses_xhgcidx2_and_indexes_test_image(tmp_path):
     assert len(
         cart_data[data_offset + found_image['data_off']:data_offset + found_image['data_off'] + found_image['size']]
     ) == found_image['size']
+
+
+def test_write_data_streams_files_in_blocks_with_running_crc(tmp_path, monkeypatch):
+    (tmp_path / 'script').mkdir()
+    (tmp_path / 'script' / 'a.lua').write_bytes(b'print(1)\n' * 10)
+    (tmp_path / 'script' / 'b.lua').write_bytes(b'')
+    (tmp_path / 'script' / 'c.lua').write_bytes(bytes(range(256)) * 3)
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'app/a.lua'},
+        'hash': {'per_file_crc32': True},
+        'chunks': [{'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'}],
+    }))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+    monkeypatch.setattr(BuildData, 'READ_BLOCK_SIZE', 7)
+
+    planned = builder.plan_files()
+    out = io.BytesIO()
+    index_entries, data_size, data_crc32 = builder.write_data(out, planned)
+
+    expected = b''.join((tmp_path / 'script' / name).read_bytes() for name in ['a.lua', 'b.lua', 'c.lua'])
+    assert out.getvalue() == expected
+    assert data_size == len(expected)
+    assert data_crc32 == zlib.crc32(expected)
+    assert [entry['path'] for entry in index_entries] == ['app/a.lua', 'app/b.lua', 'app/c.lua']
+    for entry in index_entries:
+        blob = expected[entry['offset']:entry['offset'] + entry['size']]
+        assert entry['crc32'] == zlib.crc32(blob)
+    assert builder.index_size(planned) == len(builder.build_index(index_entries))
+
+
+def test_write_data_skips_file_crc_when_per_file_crc32_disabled(tmp_path):
+    (tmp_path / 'a.bin').write_bytes(b'abc')
+    (tmp_path / 'b.bin').write_bytes(b'defg')
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'a.bin'},
+        'hash': {'per_file_crc32': False},
+        'chunks': [{'type': 'RES', 'glob': '*.bin'}],
+    }))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+
+    out = io.BytesIO()
+    index_entries, _, data_crc32 = builder.write_data(out, builder.plan_files())
+
+    assert data_crc32 == zlib.crc32(b'abcdefg')
+    assert [entry['crc32'] for entry in index_entries] == [0, 0]
+
+
+def test_write_data_writes_file_crc_by_default(tmp_path):
+    (tmp_path / 'a.bin').write_bytes(b'abc')
+    (tmp_path / 'b.bin').write_bytes(b'defg')
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'a.bin'},
+        'chunks': [{'type': 'RES', 'glob': '*.bin'}],
+    }))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+
+    out = io.BytesIO()
+    index_entries, _, data_crc32 = builder.write_data(out, builder.plan_files())
+
+    assert data_crc32 == zlib.crc32(b'abcdefg')
+    assert [entry['crc32'] for entry in index_entries] == [zlib.crc32(b'abc'), zlib.crc32(b'defg')]
+
+
+def test_parallel_res_conversion_keeps_lex_layout(tmp_path):
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    for i in range(6):
+        Image.new('RGBA', (3 + i, 2), (i * 40, 10, 200 - i * 30, 255)).save(assets / f'{i:02d}.png')
+    (assets / 'readme.txt').write_bytes(b'not an image')
+    pack_json = {
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'hash': {'per_file_crc32': True},
+        'chunks': [{
+            'type': 'RES',
+            'glob': 'assets/*',
+            'strip_prefix': 'assets/',
+            'image_format': 'BGRA8888',
+            'image_metadata': True,
+            'order': 'lex',
+        }],
+    }
+    pack_json_path = tmp_path / 'pack.json'
+
+    results = []
+    for jobs in (1, 3):
+        pack_json['build'] = {'jobs': jobs}
+        pack_json_path.write_text(json.dumps(pack_json))
+        builder = BuildData(load_pack_json(str(pack_json_path)))
+        out = io.BytesIO()
+        index_entries, data_size, data_crc32 = builder.write_data(out, builder.plan_files())
+        results.append((out.getvalue(), index_entries, data_size, data_crc32))
+
+    assert results[0] == results[1]
+    assert [entry['path'] for entry in results[1][1]] == [f'{i:02d}.png' for i in range(6)] + ['readme.txt']
+
+
+def test_write_data_dedups_identical_blobs(tmp_path):
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    (assets / 'hit.wav').write_bytes(b'W' * 300)
+    (assets / 'jump.wav').write_bytes(b'J' * 300)
+    (assets / 'unique.bin').write_bytes(b'u' * 7)
+    Image.new('RGBA', (2, 2), (1, 2, 3, 255)).save(assets / 'sprite.png')
+    pack_json = {
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'hash': {'per_file_crc32': True},
+        'build': {'dedup': True},
+        'chunks': [
+            {'type': 'RES', 'glob': 'assets/*', 'strip_prefix': 'assets/', 'name_prefix': 'a/'},
+            {'type': 'RES', 'glob': 'assets/*', 'strip_prefix': 'assets/', 'name_prefix': 'b/', 'image_format': 'BGRA8888'},
+            {'type': 'RES', 'glob': 'assets/*.png', 'strip_prefix': 'assets/', 'name_prefix': 'c/', 'image_format': 'BGRA8888'},
+        ],
+    }
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps(pack_json))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+
+    out = io.BytesIO()
+    index_entries, data_size, data_crc32 = builder.write_data(out, builder.plan_files())
+    entries = {entry['path']: entry for entry in index_entries}
+    png_size = (assets / 'sprite.png').stat().st_size
+
+    # 原样写入的文件在a/和b/之间共享；转换后的图片在b/和c/之间共享
+    for name in ['hit.wav', 'jump.wav', 'unique.bin']:
+        assert {key: entries[f'b/{name}'][key] for key in ('offset', 'size', 'crc32')} == \
+            {key: entries[f'a/{name}'][key] for key in ('offset', 'size', 'crc32')}
+    assert entries['b/sprite.png']['offset'] != entries['a/sprite.png']['offset']
+    assert entries['c/sprite.png']['offset'] == entries['b/sprite.png']['offset']
+    assert entries['c/sprite.png']['width'] == 2
+    assert data_size == 300 + 300 + 7 + png_size + 16
+    assert data_crc32 == zlib.crc32(out.getvalue())
+    assert builder.dedup_report(index_entries) == {'files': 4, 'bytes_saved': 300 + 300 + 7 + 16}
+
+    pack_json['build'] = {'dedup': False}
+    pack_json_path.write_text(json.dumps(pack_json))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+    index_entries, data_size, _ = builder.write_data(io.BytesIO(), builder.plan_files())
+    assert data_size == 2 * (300 + 300 + 7) + png_size + 2 * 16
+    assert builder.dedup_report(index_entries) == {'files': 0, 'bytes_saved': 0}
+
+
+def test_lz4_compressed_files_use_codec_index(tmp_path):
+    pytest.importorskip('lz4.block')
+    from xhcart_core.tools.lz4_block import decompress_block
+
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    sources = {
+        'map.txt': b'tile,' * 2000,
+        'noise.bin': os.urandom(4096),
+        'tiny.txt': b'ab',
+    }
+    for name, content in sources.items():
+        (assets / name).write_bytes(content)
+    pack_json = {
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'hash': {'per_file_crc32': True},
+        'chunks': [{'type': 'RES', 'glob': 'assets/*', 'strip_prefix': 'assets/', 'compress': 'lz4'}],
+    }
+    pack_json_path = tmp_path / 'pack.json'
+
+    results = []
+    for jobs in (1, 3):
+        pack_json['build'] = {'jobs': jobs}
+        pack_json_path.write_text(json.dumps(pack_json))
+        builder = BuildData(load_pack_json(str(pack_json_path)))
+        out = io.BytesIO()
+        index_entries, data_size, data_crc32 = builder.write_data(out, builder.plan_files())
+        results.append((out.getvalue(), index_entries, data_size, data_crc32))
+    assert results[0] == results[1]
+
+    data = results[0][0]
+    index_content = builder.build_index(results[0][1])
+    assert struct.unpack_from('<H', index_content, 8)[0] == 2
+    entries = {entry['path']: entry for entry in builder.parse_index(index_content)}
+
+    # 可压缩的文件使用LZ4，压缩后不变小的文件原样存储
+    assert entries['map.txt']['codec'] == BuildData.XHGC_CODEC_LZ4
+    assert entries['map.txt']['size'] < entries['map.txt']['raw_size'] == len(sources['map.txt'])
+    assert entries['noise.bin']['codec'] == entries['tiny.txt']['codec'] == BuildData.XHGC_CODEC_NONE
+    for name, entry in entries.items():
+        stored = data[entry['offset']:entry['offset'] + entry['size']]
+        assert entry['crc32'] == zlib.crc32(stored)
+        if entry['codec'] == BuildData.XHGC_CODEC_LZ4:
+            stored = decompress_block(stored, entry['raw_size'])
+        assert stored == sources[name]
+
+
+def test_unsupported_compress_is_rejected(tmp_path):
+    (tmp_path / 'a.bin').write_bytes(b'abc')
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'chunks': [{'type': 'RES', 'glob': '*.bin', 'compress': 'zstd'}],
+    }))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+
+    with pytest.raises(ValueError, match='compress'):
+        builder.write_data(io.BytesIO(), builder.plan_files())
+
+
+def test_solid_blocks_group_small_files(tmp_path):
+    pytest.importorskip('lz4.block')
+    from xhcart_core.tools.lz4_block import decompress_block
+
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    sources = {f'ui/{i:03d}.txt': f'label_{i}='.encode() * 40 for i in range(60)}
+    sources['ui/dup.txt'] = sources['ui/000.txt']
+    sources['map.txt'] = b'tile,' * 2000
+    for name, content in sources.items():
+        (assets / name).parent.mkdir(exist_ok=True)
+        (assets / name).write_bytes(content)
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'hash': {'per_file_crc32': True},
+        'build': {'dedup': True},
+        'chunks': [{'type': 'RES', 'glob': 'assets/**/*', 'strip_prefix': 'assets/', 'compress': 'lz4', 'solid_max_size': 1024}],
+    }))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+    planned = builder.plan_files()
+    out = io.BytesIO()
+    index_entries, data_size, data_crc32 = builder.write_data(out, planned)
+    data = out.getvalue()
+    assert (data_size, data_crc32) == (len(data), zlib.crc32(data))
+
+    index_content = builder.build_index(index_entries)
+    assert len(index_content) == builder.index_size(planned)
+    assert struct.unpack_from('<H', index_content, 8)[0] == 3
+    entries = {entry['path']: entry for entry in builder.parse_index(index_content)}
+    layout = builder.solid_layout
+    assert 1 < layout['block_count'] and layout['table_off'] + layout['block_count'] * 16 == data_size
+
+    blocks = [struct.unpack_from('<IIII', data, layout['table_off'] + i * 16) for i in range(layout['block_count'])]
+    for name, entry in entries.items():
+        if entry['codec'] == BuildData.XHGC_CODEC_LZ4_SOLID:
+            # 读取小文件只需解压它所在的一个块
+            block_off, size, raw_size, crc32 = blocks[entry['offset']]
+            stored = data[block_off:block_off + size]
+            assert zlib.crc32(stored) == crc32
+            raw_block = decompress_block(stored, raw_size) if size != raw_size else stored
+            content = raw_block[entry['size']:entry['size'] + entry['raw_size']]
+            assert entry['crc32'] == zlib.crc32(content)
+        else:
+            stored = data[entry['offset']:entry['offset'] + entry['size']]
+            content = decompress_block(stored, entry['raw_size'])
+        assert content == sources[name]
+
+    # 大文件仍单独压缩，重复的小文件共享块内位置
+    assert entries['map.txt']['codec'] == BuildData.XHGC_CODEC_LZ4
+    assert (entries['ui/dup.txt']['offset'], entries['ui/dup.txt']['size']) == (entries['ui/000.txt']['offset'], entries['ui/000.txt']['size'])
+    assert builder.dedup_report(index_entries) == {'files': 1, 'bytes_saved': len(sources['ui/dup.txt'])}
+
+
+def test_hash_index_buckets_and_bloom_filter(tmp_path):
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json = {
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'build': {'index_layout': 'hash', 'index_bloom': True},
+    }
+    pack_json_path.write_text(json.dumps(pack_json))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+    index_entries = [
+        {'path': f'assets/tile_{i:03d}.bin', 'offset': i * 16, 'size': 16, 'crc32': i, 'type': BuildData.XHGC_RES_IMAGE}
+        for i in range(100)
+    ]
+    planned = [{'path': entry['path'], 'chunk': {}} for entry in index_entries]
+
+    index_content = builder.build_index(list(index_entries))
+    assert len(index_content) == builder.index_size(planned)
+    header = IndexTable.parse_header(index_content)
+    assert header['version'] == 4
+    assert header['flags'] == BuildData.INDEX_FLAG_HASH | BuildData.INDEX_FLAG_BLOOM
+    buckets = header['buckets']
+    assert buckets['bucket_count'] == 64 and buckets['bloom_size'] == 128
+
+    def lookup(path):
+        path_hash = builder._fnv1a_32(path)
+        # Bloom过滤器判定不存在时不读entry表
+        bloom = index_content[buckets['bloom_off']:buckets['bloom_off'] + buckets['bloom_size']]
+        if not all(bloom[bit >> 3] & (1 << (bit & 7)) for bit in IndexTable.bloom_bits(path_hash, len(bloom) * 8)):
+            return None, 0
+        bucket = path_hash & (buckets['bucket_count'] - 1)
+        start, end = struct.unpack_from('<II', index_content, buckets['buckets_off'] + bucket * 4)
+        for i in range(start, end):
+            cursor = header['entries_off'] + i * BuildData.INDEX_ENTRY_SIZE
+            entry_hash, path_off, data_off = struct.unpack_from('<III', index_content, cursor)
+            name_start = header['strings_off'] + path_off
+            if entry_hash == path_hash and index_content[name_start:index_content.index(b'\x00', name_start)] == path.encode():
+                return data_off, end - start
+        return None, end - start
+
+    for i in range(100):
+        data_off, candidates = lookup(f'assets/tile_{i:03d}.bin')
+        assert data_off == i * 16 and candidates <= 8
+    misses = [lookup(f'assets/missing_{i}.bin') for i in range(200)]
+    assert all(data_off is None for data_off, _ in misses)
+    assert sum(1 for _, candidates in misses if candidates == 0) > 180
+
+    # 解析结果与排序布局相同
+    assert builder.parse_index(index_content) == BuildData(pack_spec=None).parse_index(BuildData(pack_spec=None).build_index(list(index_entries)))
+    pack_json['build'] = {'index_bloom': True}
+    pack_json_path.write_text(json.dumps(pack_json))
+    with pytest.raises(ConfigError, match='index_bloom'):
+        load_pack_json(str(pack_json_path))
+
+
+def test_paged_index_finds_entries_with_one_page_read(tmp_path):
+    import bisect
+
+    pack_json_path = tmp_path / 'pack.json'
+    pack_json_path.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'x'},
+        'build': {'index_layout': 'paged'},
+    }))
+    builder = BuildData(load_pack_json(str(pack_json_path)))
+    index_entries = [
+        {'path': f'levels/world_{i // 100:02d}/room_{i:05d}.bin', 'offset': i * 8, 'size': 8, 'crc32': i}
+        for i in range(3000)
+    ]
+    planned = [{'path': entry['path'], 'chunk': {}} for entry in index_entries]
+
+    index_content = builder.build_index(list(index_entries))
+    assert len(index_content) == builder.index_size(planned)
+    header = IndexTable.parse_header(index_content)
+    pages = header['pages']
+    assert header['version'] == 4 and header['flags'] == BuildData.INDEX_FLAG_PAGED
+    assert pages['page_size'] == 4096 and pages['pages_off'] % 4096 == 0
+    # fence表小于一个扇区
+    assert pages['page_count'] * 4 <= 512
+    fences = struct.unpack_from(f'<{pages["page_count"]}I', index_content, pages['fence_off'])
+
+    def lookup(path):
+        path_hash = builder._fnv1a_32(path)
+        page = bisect.bisect_right(fences, path_hash) - 1
+        if page < 0:
+            return None
+        # 只读取选中的一页
+        page_data = index_content[pages['pages_off'] + page * 4096:pages['pages_off'] + (page + 1) * 4096]
+        count, _ = struct.unpack_from('<HH', page_data, 0)
+        for i in range(count):
+            entry_hash, path_off, data_off = struct.unpack_from('<III', page_data, 8 + i * 32)
+            if entry_hash == path_hash and page_data[path_off:page_data.index(b'\x00', path_off)] == path.encode():
+                return data_off
+        return None
+
+    for i in range(0, 3000, 7):
+        assert lookup(index_entries[i]['path']) == i * 8
+    assert lookup('levels/missing.bin') is None
+    assert builder.parse_index(index_content) == BuildData(pack_spec=None).parse_index(BuildData(pack_spec=None).build_index(list(index_entries)))
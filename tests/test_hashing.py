@@ -0,0 +1,34 @@
+import os
+import random
+import zlib
+
+from xhcart_core.utils.hashing import calculate_crc32, crc32_combine, crc32_zeros, crc32_patch
+
+
+def test_calculate_crc32_supports_running_value():
+    data = os.urandom(1000)
+    running = calculate_crc32(data[:300])
+    assert calculate_crc32(data[300:], running) == zlib.crc32(data)
+
+
+def test_crc32_zeros_matches_zero_buffer():
+    for length in [0, 1, 4, 3840, 4095, 1 << 20]:
+        assert crc32_zeros(length) == zlib.crc32(bytes(length))
+
+
+def test_crc32_combine_matches_concatenation():
+    rng = random.Random(1)
+    for _ in range(100):
+        a = rng.randbytes(rng.randint(0, 5000))
+        b = rng.randbytes(rng.randint(0, 5000))
+        assert crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)) == zlib.crc32(a + b)
+
+
+def test_crc32_patch_only_needs_changed_bytes():
+    rng = random.Random(2)
+    data = bytearray(rng.randbytes(4096))
+    crc = zlib.crc32(data)
+    old = bytes(data[0xFE0:0xFF0])
+    new = rng.randbytes(16)
+    data[0xFE0:0xFF0] = new
+    assert crc32_patch(crc, 4096, 0xFE0, old, new) == zlib.crc32(data)
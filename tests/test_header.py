@@ -4,6 +4,8 @@ import json
 import copy
 from xhcart_core.api import pack_header, inspect_header, verify_header
 from xhcart_core.config.load import ConfigError
+from xhcart_core.format.xhgc.header import HeaderV2
+from xhcart_core.pipeline.verify_cart import verify_cart
 
 class TestHeader:
     """
@@ -61,6 +63,22 @@ class TestHeader:
         # 检查文件大小
         assert os.path.getsize(self.header_bin_path) == 4096
     
+    def test_header_crc_flag(self):
+        """
+        测试pack_header写入Header CRC32时置位FLAG_HEADER_CRC32，校验端不会跳过Header CRC
+        """
+        self.write_pack_json(self.base_pack_json)
+        pack_header(self.pack_json_path, self.header_bin_path)
+
+        info = inspect_header(self.header_bin_path)
+        assert info['flags'] & HeaderV2.FLAG_HEADER_CRC32
+        assert verify_header(self.header_bin_path)
+
+        result = verify_cart(self.header_bin_path)
+        assert result['status'] == 'ok'
+        assert result['checked'] == 1
+        assert result['skipped'] == [{'check': 'image', 'name': 'IMAGE_CRC', 'message': 'image CRC32 not enabled'}]
+    
     def test_header_fields(self):
         """
         测试header字段是否正确
@@ -166,6 +184,20 @@ class TestHeader:
         except ConfigError as e:
             assert "build.header_size must be 4096" in str(e)
     
+    def test_invalid_build_jobs(self):
+        """
+        测试无效的build.jobs
+        """
+        invalid_pack_json = copy.deepcopy(self.base_pack_json)
+        invalid_pack_json['build']['jobs'] = -1
+        self.write_pack_json(invalid_pack_json)
+        
+        try:
+            pack_header(self.pack_json_path, self.header_bin_path)
+            assert False, "Should raise ConfigError for invalid jobs"
+        except ConfigError as e:
+            assert "build.jobs must be a non-negative integer" in str(e)
+    
     def test_missing_required_fields(self):
         """
         测试缺少必填字段
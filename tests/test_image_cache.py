@@ -0,0 +1,78 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+from PIL import Image
+from xhcart_core.pipeline.build_data import BuildData
+from xhcart_core.tools import img_pillow
+from xhcart_core.tools.image_cache import image_cache_key
+
+
+def _convert(image_path, chunk):
+    return BuildData(pack_spec=None)._read_chunk_file(str(image_path), 'RES', chunk)
+
+
+def test_res_image_conversion_served_from_cache(tmp_path, monkeypatch):
+    """测试RES图片转换结果命中缓存时不再调用Pillow"""
+    monkeypatch.setenv('XHCART_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delenv('XHCART_NO_CACHE', raising=False)
+    image_path = tmp_path / 'sprite.png'
+    Image.new('RGBA', (3, 2), (10, 20, 30, 40)).save(image_path)
+    chunk = {'image_format': 'BGRA8888', 'image_metadata': True}
+
+    first = _convert(image_path, chunk)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Pillow should not be called on a cache hit")
+
+    monkeypatch.setattr(img_pillow, 'process_resource_image_with_metadata', fail)
+    assert _convert(image_path, chunk) == first
+
+    # 预处理参数变化时不命中
+    monkeypatch.undo()
+    monkeypatch.setenv('XHCART_CACHE_DIR', str(tmp_path / 'cache'))
+    resized = _convert(image_path, {'image_format': 'BGRA8888', 'image_preprocess': {'width': 1, 'height': 1}})
+    assert resized[1]['width'] == 1
+
+
+def test_cache_hit_does_not_import_pillow(tmp_path):
+    """测试缓存命中时不导入Pillow"""
+    image_path = tmp_path / 'sprite.png'
+    Image.new('RGBA', (2, 2), (1, 2, 3, 4)).save(image_path)
+    script = textwrap.dedent(f"""
+        import sys
+        from xhcart_core.pipeline.build_data import BuildData
+        data, meta = BuildData(pack_spec=None)._read_chunk_file({str(image_path)!r}, 'RES', {{'image_format': 'BGRA8888'}})
+        assert data == bytes([3, 2, 1, 4]) * 4, data
+        print('PIL' in sys.modules)
+    """)
+    env = {'XHCART_CACHE_DIR': str(tmp_path / 'cache'), 'PYTHONPATH': str(Path(__file__).parent.parent / 'src')}
+    outputs = [
+        subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True).stdout.strip()
+        for _ in range(2)
+    ]
+    assert outputs == ['True', 'False']
+
+
+
+def test_api_import_does_not_import_pillow():
+    """测试导入xhcart_core.api不加载Pillow"""
+    script = textwrap.dedent("""
+        import sys
+        import xhcart_core.api
+        print(any(name == 'PIL' or name.startswith('PIL.') for name in sys.modules))
+    """)
+    env = {'PYTHONPATH': str(Path(__file__).parent.parent / 'src')}
+    output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True).stdout.strip()
+    assert output == 'False'
+
+
+def test_image_cache_key_covers_source_and_params(tmp_path):
+    """测试缓存键随源文件内容和参数变化"""
+    image_path = tmp_path / 'a.png'
+    image_path.write_bytes(b'one')
+    key = image_cache_key(image_path, {'width': 1, 'mode': 'contain'})
+    assert key == image_cache_key(image_path, {'mode': 'contain', 'width': 1})
+    assert key != image_cache_key(image_path, {'width': 2, 'mode': 'contain'})
+    image_path.write_bytes(b'two')
+    assert key != image_cache_key(image_path, {'width': 1, 'mode': 'contain'})
@@ -47,3 +47,21 @@ def test_process_resource_image_keeps_source_size_by_default(tmp_path):
         30, 20, 10, 40,
         70, 60, 50, 80,
     ])
+
+
+def test_bulk_bgra_conversion_matches_per_pixel_swizzle():
+    import random
+
+    from xhcart_core.tools.img_pillow import _image_to_bgra8888
+
+    rng = random.Random(6)
+    image = Image.frombytes('RGBA', (17, 9), rng.randbytes(17 * 9 * 4))
+
+    expected = bytearray()
+    pixels = image.load()
+    for y in range(9):
+        for x in range(17):
+            r, g, b, a = pixels[x, y]
+            expected.extend((b, g, r, a))
+
+    assert _image_to_bgra8888(image, 17, 9) == bytes(expected)
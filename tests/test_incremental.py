@@ -0,0 +1,176 @@
+import json
+from PIL import Image
+from xhcart_core.config.load import load_pack_json
+from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.pipeline import build_cart
+from xhcart_core.pipeline.build_cart import CartBuilder
+from xhcart_core.pipeline.build_entry import BuildEntry
+from xhcart_core.pipeline.build_icon import BuildIcon
+from xhcart_core.pipeline.build_manifest import manifest_path
+from xhcart_core.tools import luavm
+
+
+def _make_project(tmp_path, monkeypatch):
+    """生成测试工程，并使用测试用luavm"""
+    fake_luavm = tmp_path / 'luavm'
+    fake_luavm.write_text('#!/bin/sh\nprintf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n')
+    fake_luavm.chmod(0o755)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+
+    (tmp_path / 'meta').mkdir()
+    Image.new('RGBA', (8, 8), (255, 0, 0, 255)).save(tmp_path / 'meta' / 'icon.png')
+    (tmp_path / 'script').mkdir()
+    (tmp_path / 'script' / 'main.lua').write_bytes(b'print(1)\n')
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'assets' / 'a.bin').write_bytes(b'A' * 5000)
+    pack_json = tmp_path / 'pack.json'
+    pack_json.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'app/main.lua'},
+        'icon': {'path': 'meta/icon.png'},
+        'hash': {'image_crc32': True},
+        'chunks': [
+            {'type': 'MANF', 'source': 'inline_meta'},
+            {'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'},
+            {'type': 'RES', 'glob': 'assets/*', 'strip_prefix': 'assets/', 'name_prefix': 'assets/'},
+        ],
+    }))
+    return pack_json
+
+
+def _build(pack_json, out_path, **kwargs):
+    CartBuilder(load_pack_json(str(pack_json)), **kwargs).build(str(out_path))
+    return out_path.read_bytes()
+
+
+def _explain_records(capsys):
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return {record['segment']: record for record in records if record['step'] == 'explain'}
+
+
+def test_unchanged_build_reuses_every_segment(tmp_path, monkeypatch, capsys):
+    """测试输入未变化时所有段复用上一次的字节，输出不变"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'out' / 'cart.bin'
+    first = _build(pack_json, out_path)
+    assert manifest_path(out_path).exists()
+    capsys.readouterr()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("segment should have been reused")
+
+    monkeypatch.setattr(BuildIcon, 'build_segment', fail)
+    monkeypatch.setattr(BuildEntry, 'build_segment', fail)
+    assert _build(pack_json, out_path, explain=True) == first
+
+    records = _explain_records(capsys)
+    assert {name: record['action'] for name, record in records.items()} == {
+        'icon': 'reuse', 'manf': 'reuse', 'entry': 'reuse', 'data': 'reuse'
+    }
+
+
+def test_changed_input_rebuilds_only_affected_segments(tmp_path, monkeypatch, capsys):
+    """测试输入变化时只重建受影响的段，结果与完整构建一致"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'out' / 'cart.bin'
+    _build(pack_json, out_path)
+    capsys.readouterr()
+
+    (tmp_path / 'assets' / 'a.bin').write_bytes(b'B' * 7000)
+    incremental = _build(pack_json, out_path, explain=True)
+    records = _explain_records(capsys)
+    assert records['icon']['action'] == 'reuse'
+    assert records['entry']['action'] == 'reuse'
+    assert records['data']['action'] == 'rebuild'
+    assert records['data']['reasons'] == [f"input changed: {tmp_path / 'assets' / 'a.bin'}"]
+
+    assert incremental == _build(pack_json, tmp_path / 'full.bin', incremental=False)
+
+
+def test_pillow_upgrade_rebuilds_image_segments(tmp_path, monkeypatch, capsys):
+    """测试Pillow版本变化时重建ICON和DATA段"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'out' / 'cart.bin'
+    _build(pack_json, out_path)
+    capsys.readouterr()
+
+    monkeypatch.setattr(build_cart, 'pillow_version', lambda: '0.0.0')
+    _build(pack_json, out_path, explain=True)
+    records = _explain_records(capsys)
+    assert records['icon']['action'] == 'rebuild'
+    assert records['data']['action'] == 'rebuild'
+    assert records['entry']['action'] == 'reuse'
+
+
+def test_modified_cart_is_not_reused(tmp_path, monkeypatch, capsys):
+    """测试cart.bin被外部修改后不复用"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'out' / 'cart.bin'
+    first = _build(pack_json, out_path)
+    out_path.write_bytes(first[:-1] + b'\x01')
+    capsys.readouterr()
+
+    assert _build(pack_json, out_path, explain=True) == first
+    records = _explain_records(capsys)
+    assert all(record['action'] == 'rebuild' for record in records.values())
+    assert records['icon']['reasons'] == ['previous cart.bin missing or modified']
+
+
+def test_in_place_patch_when_sizes_unchanged(tmp_path, monkeypatch, capsys):
+    """测试大小不变时原地修改，结果与完整构建一致"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'out' / 'cart.bin'
+    _build(pack_json, out_path)
+    inode = out_path.stat().st_ino
+    capsys.readouterr()
+
+    (tmp_path / 'assets' / 'a.bin').write_bytes(b'A' * 4000 + b'C' * 1000)
+    patched = _build(pack_json, out_path, in_place=True)
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    patch = [record for record in records if record['step'] == 'patch']
+
+    # 只写入变化的文件、INDEX（条目crc32变化）和Header
+    _, index_size, _ = AddrTable.read_slot(patched, AddrTable.SLOT_INDEX)
+    assert out_path.stat().st_ino == inode
+    assert patch and patch[0]['bytes_written'] == 5000 + index_size + 4096
+    assert patched == _build(pack_json, tmp_path / 'full.bin', incremental=False)
+
+
+def test_in_place_falls_back_when_size_changes(tmp_path, monkeypatch, capsys):
+    """测试大小变化时退回原子重写"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'out' / 'cart.bin'
+    _build(pack_json, out_path)
+    capsys.readouterr()
+
+    (tmp_path / 'assets' / 'a.bin').write_bytes(b'A' * 5001)
+    patched = _build(pack_json, out_path, in_place=True, explain=True)
+    records = _explain_records(capsys)
+
+    assert records['cart']['action'] == 'rewrite'
+    assert records['cart']['reasons'] == ['size changed: assets/a.bin']
+    assert patched == _build(pack_json, tmp_path / 'full.bin', incremental=False)
+
+
+def test_in_place_falls_back_when_shared_blob_changes(tmp_path, monkeypatch, capsys):
+    """测试去重共享的DATA区域变化时退回原子重写"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    config = json.loads(pack_json.read_text())
+    config['chunks'].append({'type': 'RES', 'glob': 'assets/*', 'strip_prefix': 'assets/', 'name_prefix': 'dup/'})
+    config['build'] = {'dedup': True}
+    pack_json.write_text(json.dumps(config))
+    out_path = tmp_path / 'out' / 'cart.bin'
+    _build(pack_json, out_path)
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    data = [record for record in records if record['step'] == 'data'][0]
+    assert (data['dedup_files'], data['dedup_bytes_saved']) == (1, 5000)
+
+    (tmp_path / 'assets' / 'a.bin').write_bytes(b'C' * 5000)
+    patched = _build(pack_json, out_path, in_place=True, explain=True)
+    records = _explain_records(capsys)
+
+    assert records['cart']['action'] == 'rewrite'
+    assert records['cart']['reasons'][0].startswith('shared DATA blob changed')
+    assert patched == _build(pack_json, tmp_path / 'full.bin', incremental=False)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from xhcart_core.utils.io import atomic_open, GatherWriter
+
+
+def _write_layout(writer):
+    writer.write(b'abc')
+    writer.write_zeros(5)
+    writer.seek(16)
+    writer.write(bytearray(b'xyz'))
+    writer.write_zeros(70000)
+    writer.pwrite(8, b'HOLE')
+    writer.flush()
+
+
+def test_gather_writer_assembles_segments_and_patches_in_place(tmp_path):
+    out_path = tmp_path / 'out.bin'
+    with atomic_open(str(out_path)) as f:
+        _write_layout(GatherWriter(f))
+
+    data = out_path.read_bytes()
+    assert data == b'abc' + bytes(5) + b'HOLE' + bytes(4) + b'xyz' + bytes(70000)
+
+
+def test_gather_writer_handles_partial_writev(tmp_path, monkeypatch):
+    if not hasattr(os, 'writev'):
+        pytest.skip('os.writev not available')
+    real_writev = os.writev
+
+    def short_writev(fd, buffers):
+        # 每次最多写出5字节，模拟部分写入
+        head = bytes(buffers[0])[:5]
+        return real_writev(fd, [head])
+
+    monkeypatch.setattr(os, 'writev', short_writev)
+    out_path = tmp_path / 'out.bin'
+    with atomic_open(str(out_path)) as f:
+        writer = GatherWriter(f)
+        writer.write(b'0123456789')
+        writer.write(b'abcdefghijklmnop')
+        writer.flush()
+
+    assert out_path.read_bytes() == b'0123456789abcdefghijklmnop'
+
+
+def test_gather_writer_falls_back_without_writev(tmp_path):
+    out_path = tmp_path / 'out.bin'
+    with atomic_open(str(out_path)) as f:
+        writer = GatherWriter(f)
+        writer._use_writev = False
+        _write_layout(writer)
+
+    assert out_path.read_bytes() == b'abc' + bytes(5) + b'HOLE' + bytes(4) + b'xyz' + bytes(70000)
+
+
+def test_atomic_open_removes_temp_file_on_error(tmp_path):
+    out_path = tmp_path / 'out.bin'
+    with pytest.raises(RuntimeError):
+        with atomic_open(str(out_path)) as f:
+            f.write(b'partial')
+            raise RuntimeError('boom')
+
+    assert list(tmp_path.iterdir()) == []
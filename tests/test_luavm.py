@@ -0,0 +1,112 @@
+import json
+import time
+import pytest
+from xhcart_core.config.load import load_pack_json
+from xhcart_core.domain.errors import LuaCompileError
+from xhcart_core.pipeline.build_data import BuildData
+from xhcart_core.tools import luavm
+from xhcart_core.tools.luavm import LuaCompiler
+from xhcart_core.utils.cache import ContentCache
+
+
+def _write_fake_luavm(tmp_path, delay: float = 0.0):
+    """写入测试用luavm：输出"\\x1bLuaT"+源码，路径含bad时编译失败"""
+    script = tmp_path / 'luavm'
+    script.write_text(
+        '#!/bin/sh\n'
+        f'sleep {delay}\n'
+        '[ "$1" = "--compile" ] || exit 2\n'
+        'case "$2" in *bad*) echo "syntax error in $2" >&2; exit 1;; esac\n'
+        'printf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n'
+    )
+    script.chmod(0o755)
+    return script
+
+
+def test_compile_files_runs_concurrently(tmp_path):
+    """测试多个文件并发编译，总耗时接近单个文件"""
+    fake_luavm = _write_fake_luavm(tmp_path, delay=0.5)
+    sources = []
+    for i in range(4):
+        source = tmp_path / f'm{i}.lua'
+        source.write_bytes(f'return {i}\n'.encode())
+        sources.append(source)
+
+    start = time.perf_counter()
+    compiled = LuaCompiler(jobs=4, luavm_path=str(fake_luavm)).compile_files(sources)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.5
+    assert compiled == {str(source): b'\x1bLuaT' + source.read_bytes() for source in sources}
+
+
+def test_compile_files_reports_all_failures(tmp_path):
+    """测试所有失败文件汇总到一个LuaCompileError"""
+    fake_luavm = _write_fake_luavm(tmp_path)
+    for name in ['ok.lua', 'bad_a.lua', 'bad_b.lua']:
+        (tmp_path / name).write_bytes(b'return 1\n')
+
+    with pytest.raises(LuaCompileError) as excinfo:
+        LuaCompiler(jobs=2, luavm_path=str(fake_luavm)).compile_files(
+            [tmp_path / 'ok.lua', tmp_path / 'bad_a.lua', tmp_path / 'bad_b.lua', tmp_path / 'missing.lua']
+        )
+
+    failures = excinfo.value.failures
+    assert [failure['path'] for failure in failures] == [
+        str(tmp_path / 'bad_a.lua'), str(tmp_path / 'bad_b.lua'), str(tmp_path / 'missing.lua')
+    ]
+    assert 'syntax error' in failures[0]['message']
+    assert 'not found' in failures[2]['message']
+
+
+def test_compiled_lua_chunk_written_to_data(tmp_path, monkeypatch):
+    """测试compile=true的LUA chunk以字节码写入DATA"""
+    fake_luavm = _write_fake_luavm(tmp_path)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+
+    (tmp_path / 'script').mkdir()
+    (tmp_path / 'script' / 'a.lua').write_bytes(b'print(1)\n')
+    (tmp_path / 'script' / 'b.lua').write_bytes(b'return {}\n')
+    pack_json = tmp_path / 'pack.json'
+    pack_json.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'app/a.lua'},
+        'build': {'jobs': 2},
+        'chunks': [{'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/', 'compile': True}],
+    }))
+
+    builder = BuildData(load_pack_json(str(pack_json)))
+    planned = builder.plan_files()
+    compiled = builder.compile_lua_files(planned)
+    assert len(compiled) == 2
+
+    index_content, data_content, files_in_data = builder.build_segments()
+    assert files_in_data == 2
+    assert bytes(data_content) == b'\x1bLuaTprint(1)\n\x1bLuaTreturn {}\n'
+
+
+def test_compile_cache_hit_skips_luavm(tmp_path):
+    """测试字节码缓存命中时不再调用luavm，更换luavm后缓存失效"""
+    fake_luavm = _write_fake_luavm(tmp_path)
+    calls = tmp_path / 'calls'
+    fake_luavm.write_text(fake_luavm.read_text() + f'echo x >> "{calls}"\n')
+    source = tmp_path / 'main.lua'
+    source.write_bytes(b'print(1)\n')
+    cache = ContentCache(tmp_path / 'cache')
+
+    compiler = LuaCompiler(luavm_path=str(fake_luavm), cache=cache)
+    first = compiler.compile_file(source)
+    second = compiler.compile_file(source)
+    assert first == second == b'\x1bLuaTprint(1)\n'
+    assert calls.read_text().count('x') == 1
+
+    # 源码变化
+    source.write_bytes(b'print(2)\n')
+    assert compiler.compile_file(source) == b'\x1bLuaTprint(2)\n'
+    assert calls.read_text().count('x') == 2
+
+    # luavm变化
+    fake_luavm.write_text(fake_luavm.read_text() + '# v2\n')
+    assert compiler.compile_file(source) == b'\x1bLuaTprint(2)\n'
+    assert calls.read_text().count('x') == 3
@@ -0,0 +1,78 @@
+import json
+import pytest
+from PIL import Image
+from xhcart_core.api import pack_header_icon, pack_many
+from xhcart_core.domain.errors import ConfigError
+from xhcart_core.pipeline.pack_many import cart_output_paths, expand_pack_inputs
+from xhcart_core.tools import luavm
+
+
+def _use_fake_luavm(tmp_path, monkeypatch):
+    fake_luavm = tmp_path / 'luavm'
+    fake_luavm.write_text('#!/bin/sh\nprintf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n')
+    fake_luavm.chmod(0o755)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+
+
+def _make_cart(project, title, color):
+    """生成一个最小工程"""
+    (project / 'script').mkdir(parents=True)
+    (project / 'script' / 'main.lua').write_bytes(f'print("{title}")\n'.encode())
+    Image.new('RGBA', (8, 8), color).save(project / 'icon.png')
+    pack_json = project / 'pack.json'
+    pack_json.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': title, 'version': '1', 'cart_id': '0x1', 'entry': 'app/main.lua'},
+        'icon': {'path': 'icon.png'},
+        'chunks': [{'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'}],
+    }))
+    return pack_json
+
+
+def test_expand_inputs_and_output_paths(tmp_path):
+    """测试glob/列表文件展开和输出命名"""
+    games = tmp_path / 'games'
+    for name in ['a', 'sub/b']:
+        (games / name).mkdir(parents=True)
+        (games / name / 'pack.json').write_text('{}')
+    (games / 'extra.json').write_text('{}')
+    list_path = games / 'carts.txt'
+    list_path.write_text('# release\nextra.json\n\na/pack.json\n')
+
+    paths = expand_pack_inputs([str(games / '**' / 'pack.json')], str(list_path))
+    assert paths == [
+        str(games / 'a' / 'pack.json'), str(games / 'sub' / 'b' / 'pack.json'), str(games / 'extra.json')
+    ]
+    assert cart_output_paths(paths, 'out') == ['out/a.bin', 'out/sub/b.bin', 'out/extra.bin']
+
+    (games / 'a.json').write_text('{}')
+    with pytest.raises(ConfigError):
+        cart_output_paths([str(games / 'a' / 'pack.json'), str(games / 'a.json')], 'out')
+    with pytest.raises(ConfigError):
+        expand_pack_inputs([str(games / 'none' / '*.json')])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pack_many_isolates_failures(tmp_path, monkeypatch, workers):
+    """测试一个cart失败不影响其他cart，输出与单独构建一致"""
+    _use_fake_luavm(tmp_path, monkeypatch)
+    games = tmp_path / 'games'
+    _make_cart(games / 'alpha', 'Alpha', (255, 0, 0, 255))
+    _make_cart(games / 'beta', 'Beta', (0, 255, 0, 255))
+    broken = _make_cart(games / 'broken', 'Broken', (0, 0, 255, 255))
+    (broken.parent / 'icon.png').unlink()
+
+    out_dir = tmp_path / 'out'
+    summary = pack_many([str(games / '*' / 'pack.json')], str(out_dir), workers=workers)
+
+    assert (summary['total'], summary['ok'], summary['failed']) == (3, 2, 1)
+    carts = {cart['pack_json']: cart for cart in summary['carts']}
+    assert carts[str(broken)]['status'] == 'error'
+    assert 'icon' in carts[str(broken)]['error'].lower()
+    for name in ['alpha', 'beta']:
+        cart = carts[str(games / name / 'pack.json')]
+        assert cart['status'] == 'ok' and cart['out_path'] == str(out_dir / f'{name}.bin')
+        pack_header_icon(str(games / name / 'pack.json'), str(tmp_path / f'{name}.bin'))
+        assert (out_dir / f'{name}.bin').read_bytes() == (tmp_path / f'{name}.bin').read_bytes()
@@ -0,0 +1,87 @@
+import json
+import pytest
+from PIL import Image
+from xhcart_core.api import open_cart, pack_header_icon
+from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.pipeline.build_data import BuildData
+from xhcart_core.tools import luavm
+
+
+def _build_cart(tmp_path, monkeypatch, build, compress='none', solid_max_size=0):
+    """生成包含脚本、图片和小文件的cart.bin"""
+    fake_luavm = tmp_path / 'luavm'
+    fake_luavm.write_text('#!/bin/sh\nprintf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n')
+    fake_luavm.chmod(0o755)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+
+    (tmp_path / 'script').mkdir()
+    (tmp_path / 'script' / 'main.lua').write_bytes(b'print(1)\n')
+    (tmp_path / 'assets').mkdir()
+    sources = {f'assets/text_{i:02d}.txt': f'line {i}\n'.encode() * (i + 1) for i in range(40)}
+    sources['assets/map.bin'] = b'tile,' * 3000
+    for name, content in sources.items():
+        (tmp_path / name).write_bytes(content)
+    Image.new('RGBA', (8, 8), (0, 0, 255, 255)).save(tmp_path / 'icon.png')
+    (tmp_path / 'pack.json').write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'Reader', 'version': '1.2', 'cart_id': '0x1234', 'entry': 'app/main.lua', 'tags': ['a', 'b']},
+        'icon': {'path': 'icon.png'},
+        'build': build,
+        'hash': {'per_file_crc32': True},
+        'chunks': [
+            {'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'},
+            {'type': 'RES', 'glob': 'assets/*', 'compress': compress, 'solid_max_size': solid_max_size},
+        ],
+    }))
+    out_path = tmp_path / 'cart.bin'
+    pack_header_icon(str(tmp_path / 'pack.json'), str(out_path))
+    sources['app/main.lua'] = b'print(1)\n'
+    return out_path, sources
+
+
+@pytest.mark.parametrize('layout', ['sorted', 'hash', 'paged'])
+def test_reader_finds_files_by_path(tmp_path, monkeypatch, layout):
+    """测试各INDEX布局下按路径查找，未压缩内容直接引用映射区域"""
+    build = {'index_layout': layout, 'index_bloom': layout == 'hash'}
+    out_path, sources = _build_cart(tmp_path, monkeypatch, build)
+
+    with open_cart(str(out_path)) as cart:
+        assert cart.header['title'] == 'Reader'
+        assert cart.manf_field('cart_id') == 0x1234
+        assert cart.manf_field('tags') == 'a\nb'
+        assert cart.manf_field('description_zh') is None
+        index_offset, index_size, _ = cart.slot(AddrTable.SLOT_INDEX)
+        assert cart.segment(AddrTable.SLOT_INDEX).nbytes == index_size and index_offset % 4096 == 0
+
+        for name, content in sources.items():
+            view = cart.read(name)
+            assert isinstance(view, memoryview) and view.obj is not None
+            assert view == content
+            view.release()
+        assert cart.find('assets/missing.txt') is None
+        with pytest.raises(KeyError):
+            cart.read('assets/missing.txt')
+        assert sorted(entry['path'] for entry in cart.entries()) == sorted(sources)
+
+
+def test_reader_decompresses_lz4_and_solid_blocks(tmp_path, monkeypatch):
+    """测试读取LZ4单独压缩和solid块中的文件"""
+    pytest.importorskip('lz4.block')
+    out_path, sources = _build_cart(tmp_path, monkeypatch, {'index_layout': 'paged'}, compress='lz4', solid_max_size=256)
+
+    with open_cart(str(out_path)) as cart:
+        codecs = {entry['path']: entry['codec'] for entry in cart.entries()}
+        assert codecs['assets/map.bin'] == BuildData.XHGC_CODEC_LZ4
+        assert codecs['assets/text_00.txt'] == BuildData.XHGC_CODEC_LZ4_SOLID
+        for name, content in sources.items():
+            assert bytes(cart.read(name)) == content
+
+
+def test_reader_rejects_non_cart(tmp_path):
+    (tmp_path / 'empty.bin').write_bytes(b'')
+    (tmp_path / 'junk.bin').write_bytes(b'\x00' * 8192)
+    for name in ['empty.bin', 'junk.bin']:
+        with pytest.raises(ValueError, match='Not a cart image'):
+            open_cart(str(tmp_path / name))
@@ -0,0 +1,146 @@
+import json
+import os
+import socket
+import threading
+from PIL import Image
+from xhcart_core.api import pack_header_icon
+from xhcart_core.server import BuildServer, request_daemon
+from xhcart_core.tools import luavm
+
+
+def _make_project(tmp_path, monkeypatch):
+    """生成测试工程，并使用测试用luavm"""
+    fake_luavm = tmp_path / 'luavm'
+    fake_luavm.write_text('#!/bin/sh\nprintf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n')
+    fake_luavm.chmod(0o755)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+
+    (tmp_path / 'script').mkdir()
+    (tmp_path / 'script' / 'main.lua').write_bytes(b'print(1)\n')
+    Image.new('RGBA', (8, 8), (0, 0, 255, 255)).save(tmp_path / 'icon.png')
+    pack_json = tmp_path / 'pack.json'
+    pack_json.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'app/main.lua'},
+        'icon': {'path': 'icon.png'},
+        'chunks': [{'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'}],
+    }))
+    return pack_json
+
+
+def _start_server(socket_path, server_class=BuildServer):
+    server = server_class(str(socket_path))
+    server.bind()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    return thread
+
+
+def test_daemon_build_inspect_verify(tmp_path, monkeypatch, capsys):
+    """测试守护进程构建、查看、校验，并把步骤记录流式转发给客户端"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    socket_path = tmp_path / 'd.sock'
+    out_path = tmp_path / 'daemon' / 'cart.bin'
+    thread = _start_server(socket_path)
+    try:
+        records = []
+        response = request_daemon(
+            {'command': 'build', 'pack_json': str(pack_json), 'out_path': str(out_path)},
+            socket_path=str(socket_path), on_record=records.append
+        )
+        assert response == {'step': 'request', 'status': 'ok'}
+        steps = [json.loads(line)['step'] for line in records]
+        assert steps[:2] == ['icon', 'manf'] and 'data' in steps
+
+        verify = request_daemon({'command': 'verify', 'path': str(out_path)}, socket_path=str(socket_path))
+        assert verify['result'] is True
+        inspect = request_daemon({'command': 'inspect', 'path': str(out_path)}, socket_path=str(socket_path))
+        assert inspect['result']['title'] == 'T'
+
+        error = request_daemon({'command': 'build', 'pack_json': str(tmp_path / 'missing.json'), 'out_path': str(out_path)}, socket_path=str(socket_path))
+        assert error['status'] == 'error'
+        unknown = request_daemon({'command': 'explode'}, socket_path=str(socket_path))
+        assert unknown == {'step': 'request', 'status': 'error', 'message': 'Unknown command: explode'}
+    finally:
+        request_daemon({'command': 'shutdown'}, socket_path=str(socket_path))
+        thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert not socket_path.exists()
+    # 守护进程构建的结果与本进程构建一致
+    pack_header_icon(str(pack_json), str(tmp_path / 'local.bin'))
+    assert out_path.read_bytes() == (tmp_path / 'local.bin').read_bytes()
+
+
+def test_client_falls_back_without_daemon(tmp_path, monkeypatch):
+    """测试没有守护进程或禁用时客户端返回None（由调用方在本进程内执行）"""
+    socket_path = tmp_path / 'd.sock'
+    assert request_daemon({'command': 'ping'}, socket_path=str(socket_path)) is None
+
+    # 残留的socket文件不影响新守护进程启动
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()
+    assert request_daemon({'command': 'ping'}, socket_path=str(socket_path)) is None
+    thread = _start_server(socket_path)
+    try:
+        assert request_daemon({'command': 'ping'}, socket_path=str(socket_path))['protocol'] == 1
+        monkeypatch.setenv('XHCART_NO_DAEMON', '1')
+        assert request_daemon({'command': 'ping'}, socket_path=str(socket_path)) is None
+        monkeypatch.delenv('XHCART_NO_DAEMON')
+    finally:
+        request_daemon({'command': 'shutdown'}, socket_path=str(socket_path))
+        thread.join(timeout=10)
+
+
+class _StaleServer(BuildServer):
+    """模拟由旧版本代码启动的守护进程"""
+
+    def handle_request(self, request):
+        reply = super().handle_request(request)
+        if request.get('command') == 'ping':
+            reply['code'] = 'stale'
+        return reply
+
+
+class _OtherEnvServer(BuildServer):
+    """模拟以不同缓存配置启动的守护进程"""
+
+    def handle_request(self, request):
+        reply = super().handle_request(request)
+        if request.get('command') == 'ping':
+            reply['env'] = dict(reply['env'], XHCART_CACHE_MAX_MB='1')
+        return reply
+
+
+def test_client_does_not_delegate_to_mismatched_daemon(tmp_path, monkeypatch):
+    """测试代码指纹或环境变量与守护进程不一致、socket权限不安全时不委托"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = tmp_path / 'cart.bin'
+    build = {'command': 'build', 'pack_json': str(pack_json), 'out_path': str(out_path)}
+
+    for server_class in (_StaleServer, _OtherEnvServer):
+        socket_path = tmp_path / 'mismatch.sock'
+        thread = _start_server(socket_path, server_class)
+        try:
+            assert request_daemon(build, socket_path=str(socket_path), on_record=lambda line: None) is None
+            assert not out_path.exists()
+        finally:
+            request_daemon({'command': 'shutdown'}, socket_path=str(socket_path))
+            thread.join(timeout=10)
+        assert not thread.is_alive()
+
+    socket_path = tmp_path / 'd.sock'
+    thread = _start_server(socket_path)
+    try:
+        # 组或其他用户可写的socket不可信
+        os.chmod(socket_path, 0o666)
+        assert request_daemon({'command': 'ping'}, socket_path=str(socket_path)) is None
+        os.chmod(socket_path, 0o600)
+        assert request_daemon(build, socket_path=str(socket_path), on_record=lambda line: None)['status'] == 'ok'
+        assert out_path.exists()
+    finally:
+        request_daemon({'command': 'shutdown'}, socket_path=str(socket_path))
+        thread.join(timeout=10)
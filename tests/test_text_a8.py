@@ -131,6 +131,189 @@ def test_process_text_a8():
         assert os.path.exists(os.path.join(temp_dir, "test.h"))
 
 
+def test_write_jpg_preview_matches_per_pixel_brightness(tmp_path):
+    """测试JPG预览查表映射与逐像素计算得到相同的JPEG"""
+    from PIL import Image
+    from xhcart_core.tools.text_a8 import write_jpg_preview
+
+    width, height = 37, 20
+    a8_bytes = bytes((x * 7 + y * 13) % 256 if (x + y) % 3 else 0 for y in range(height) for x in range(width))
+
+    reference = Image.new('RGB', (width, height), color='white')
+    for y in range(height):
+        for x in range(width):
+            alpha = a8_bytes[y * width + x]
+            if alpha > 0:
+                brightness = 255 - int(alpha * 0.9)
+                reference.putpixel((x, y), (brightness, brightness, brightness))
+    reference_path = tmp_path / 'reference.jpg'
+    reference.save(reference_path, 'JPEG', quality=90)
+
+    out_path = tmp_path / 'preview.a8'
+    write_jpg_preview(str(out_path), a8_bytes, width, height)
+
+    assert (tmp_path / 'preview.jpg').read_bytes() == reference_path.read_bytes()
+
+
+
+def test_write_header_metadata_matches_per_byte_format(tmp_path):
+    """测试按行格式化的C数组与逐字节格式化结果一致"""
+    from xhcart_core.tools.text_a8 import write_header_metadata
+
+    for length in (0, 1, 15, 16, 17, 37 * 20):
+        a8_bytes = bytes((i * 31) % 256 for i in range(length))
+
+        array_lines = []
+        for i, byte in enumerate(a8_bytes):
+            if i % 16 == 0:
+                array_lines.append('    ')
+            array_lines.append(f'{byte}, ')
+            if (i + 1) % 16 == 0:
+                array_lines.append('\n')
+        expected = ''.join(array_lines).rstrip(', \n') + '\n'
+
+        out_path = tmp_path / 'label.a8'
+        write_header_metadata(str(out_path), 'x', 'font.ttf', length, 1, 0, a8_bytes)
+        content = (tmp_path / 'label.h').read_text(encoding='utf-8')
+        assert f'= {{\n{expected}}};' in content
+
+
+def test_write_incbin_stub(tmp_path):
+    """测试.incbin汇编桩和extern声明头文件"""
+    from xhcart_core.tools.text_a8 import write_incbin_stub
+
+    out_path = tmp_path / 'menu-title.a8'
+    write_incbin_stub(str(out_path), 'Menu', 'font.ttf', 12, 20, 15)
+
+    asm = (tmp_path / 'menu-title.S').read_text(encoding='utf-8')
+    assert '.incbin "menu-title.a8"' in asm
+    assert '.global menu_title_a8' in asm
+    assert '.section .rodata.xhgc_a8.menu_title, "a", %progbits' in asm
+
+    header = (tmp_path / 'menu-title.h').read_text(encoding='utf-8')
+    assert 'extern const uint8_t menu_title_a8[240];' in header
+    assert '#define MENU_TITLE_W 12' in header
+    assert header.count('MENU_TITLE_H') == 1 and '#define MENU_TITLE_H 20' in header
+    assert '#ifndef MENU_TITLE_INCLUDED' in header and '#define MENU_TITLE_INCLUDED' in header
+
+
+def test_generated_sources_escape_comment_text(tmp_path):
+    """测试文本中的*/、换行和反斜杠不会破坏生成的.S和.h注释"""
+    from xhcart_core.tools.text_a8 import write_header_metadata, write_incbin_stub
+
+    text = 'a */ b /* c\\\nint x;'
+    out_path = tmp_path / 'label.a8'
+    write_incbin_stub(str(out_path), text, 'font.ttf', 1, 1, 0)
+    asm = (tmp_path / 'label.S').read_text(encoding='utf-8')
+    assert asm.splitlines()[0] == '/* Generated from text: "a *\\/ b /\\* c\\\\\\nint x;" */'
+
+    write_header_metadata(str(out_path), text, 'font.ttf', 1, 1, 0, b'\x00')
+    header = (tmp_path / 'label.h').read_text(encoding='utf-8')
+    comment = [line for line in header.splitlines() if line.startswith('// Generated')]
+    assert comment == ['// Generated from text: "a *\\/ b /\\* c\\\\\\nint x;"']
+    assert 'int x;' not in header.replace(comment[0], '')
+
+
+
+def test_font_loaded_once_for_many_strings(monkeypatch):
+    """测试同一字体和高度渲染多个字符串时只搜索一次字号、只加载一次字体"""
+    from PIL import ImageFont
+    from xhcart_core.tools import text_a8
+
+    font_path = _get_default_font_path()
+    if not font_path:
+        pytest.skip("No default font found")
+
+    text_a8.clear_font_caches()
+    expected = [render_text_a8(text, font_path) for text in ("A", "Settings")]
+    text_a8.clear_font_caches()
+
+    calls = []
+    real_truetype = ImageFont.truetype
+
+    def counting_truetype(*args, **kwargs):
+        calls.append(args[1])
+        return real_truetype(*args, **kwargs)
+
+    monkeypatch.setattr(ImageFont, "truetype", counting_truetype)
+    render_text_a8("A", font_path)
+    first_calls = len(calls)
+    results = [render_text_a8(text, font_path) for text in ("A", "Settings")]
+
+    assert len(calls) == first_calls
+    assert results == expected
+    text_a8.clear_font_caches()
+
+
+
+def test_load_text_a8_jobs_json_and_csv(tmp_path):
+    """测试从JSON和CSV读取批量任务"""
+    from xhcart_core.tools.text_a8 import load_text_a8_jobs
+
+    json_path = tmp_path / 'jobs.json'
+    json_path.write_text('{"jobs": [{"text": "Start", "font": "fonts/a.ttf", "out": "start.a8"}, {"text": "Exit", "font": "/abs/b.ttf", "height": 16}]}', encoding='utf-8')
+    jobs = load_text_a8_jobs(str(json_path))
+    assert jobs[0] == {'index': 0, 'text': 'Start', 'font': str(tmp_path / 'fonts/a.ttf'), 'height': 20, 'out': 'start.a8'}
+    assert jobs[1]['font'] == '/abs/b.ttf'
+    assert jobs[1]['height'] == 16
+    assert jobs[1]['out'] == 'text_0001.a8'
+
+    csv_path = tmp_path / 'jobs.csv'
+    csv_path.write_text('text,font,height,out\n设置,a.ttf,24,settings.a8\n', encoding='utf-8')
+    assert load_text_a8_jobs(str(csv_path)) == [
+        {'index': 0, 'text': '设置', 'font': str(tmp_path / 'a.ttf'), 'height': 24, 'out': 'settings.a8'}
+    ]
+
+    bad_path = tmp_path / 'bad.json'
+    bad_path.write_text('[{"text": "x"}]', encoding='utf-8')
+    with pytest.raises(ToolError):
+        load_text_a8_jobs(str(bad_path))
+
+
+def test_process_text_a8_batch(tmp_path):
+    """测试批量渲染：并行结果与逐个渲染一致，单个失败不影响其他任务"""
+    from xhcart_core.tools.text_a8 import process_text_a8_batch
+
+    font_path = _get_default_font_path() or str(tmp_path / 'missing.ttf')
+    jobs = [
+        {'index': i, 'text': text, 'font': font_path, 'height': 20, 'out': f'{i}.a8'}
+        for i, text in enumerate(["Start", "Options", "Exit"])
+    ]
+    jobs.append({'index': 3, 'text': 'Broken', 'font': str(tmp_path / 'missing.ttf'), 'height': 20, 'out': '3.a8'})
+
+    summary = process_text_a8_batch(jobs, str(tmp_path / 'out'), workers=2, emit_json=True)
+
+    assert summary['total'] == 4
+    assert [job['index'] for job in summary['jobs']] == [0, 1, 2, 3]
+    assert summary['jobs'][3]['status'] == 'error'
+    assert all('elapsed_ms' in job for job in summary['jobs'])
+    if not _get_default_font_path():
+        return
+
+    assert summary['ok'] == 3 and summary['failed'] == 1
+    for i, text in enumerate(["Start", "Options", "Exit"]):
+        a8_bytes, width, _, _, _ = render_text_a8(text, font_path)
+        assert (tmp_path / 'out' / f'{i}.a8').read_bytes() == a8_bytes
+        assert summary['jobs'][i]['width'] == width
+        assert (tmp_path / 'out' / f'{i}.json').exists()
+
+
+def test_process_text_a8_batch_jpg_keeps_stdout_clean(tmp_path, capsys):
+    """测试批量输出JPG预览时不向stdout打印，预览路径记录在任务结果中"""
+    from xhcart_core.tools.text_a8 import process_text_a8_batch
+
+    font_path = _get_default_font_path()
+    if not font_path:
+        pytest.skip("no default font available")
+    jobs = [{'index': 0, 'text': 'Start', 'font': font_path, 'height': 20, 'out': 'start.a8'}]
+
+    summary = process_text_a8_batch(jobs, str(tmp_path), emit_jpg=True)
+
+    assert capsys.readouterr().out == ''
+    assert summary['jobs'][0]['jpg'] == str(tmp_path / 'start.jpg')
+    assert (tmp_path / 'start.jpg').exists()
+
+
 def _get_default_font_path():
     """获取系统默认字体路径"""
     # 尝试常见字体路径
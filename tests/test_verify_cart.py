@@ -0,0 +1,175 @@
+import json
+import shutil
+from PIL import Image
+from xhcart_core.api import open_cart, pack_header_icon, verify_cart
+from xhcart_core.format.xhgc.addr_table import AddrTable
+from xhcart_core.pipeline import verify_cart as verify_module
+from xhcart_core.tools import luavm
+
+
+def _build_cart(tmp_path, monkeypatch):
+    """生成启用整镜像CRC和逐文件CRC的cart.bin"""
+    fake_luavm = tmp_path / 'luavm'
+    fake_luavm.write_text('#!/bin/sh\nprintf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n')
+    fake_luavm.chmod(0o755)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+
+    (tmp_path / 'script').mkdir()
+    (tmp_path / 'script' / 'main.lua').write_bytes(b'print(1)\n')
+    (tmp_path / 'assets').mkdir()
+    for i in range(20):
+        (tmp_path / 'assets' / f'{i:02d}.bin').write_bytes(bytes([i]) * (3000 + i))
+    (tmp_path / 'assets' / 'copy.bin').write_bytes(bytes([3]) * 3003)
+    Image.new('RGBA', (8, 8), (0, 0, 255, 255)).save(tmp_path / 'icon.png')
+    (tmp_path / 'pack.json').write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'app/main.lua'},
+        'icon': {'path': 'icon.png'},
+        'hash': {'image_crc32': True, 'per_file_crc32': True},
+        'build': {'dedup': True},
+        'chunks': [
+            {'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'},
+            {'type': 'RES', 'glob': 'assets/*.bin'},
+        ],
+    }))
+    out_path = tmp_path / 'cart.bin'
+    pack_header_icon(str(tmp_path / 'pack.json'), str(out_path))
+    return out_path
+
+
+def test_verify_cart_reports_failing_ranges(tmp_path, monkeypatch):
+    """测试校验全部CRC32，损坏后报告每个失败区域的偏移"""
+    out_path = _build_cart(tmp_path, monkeypatch)
+    # 用较小的块大小覆盖拆分并行和crc32_combine合并
+    monkeypatch.setattr(verify_module, 'CRC_CHUNK_SIZE', 4096)
+
+    result = verify_module.verify_cart(str(out_path), jobs=3)
+    assert result['status'] == 'ok' and result['failures'] == []
+    # Header、ICON/MANF/ENTRY/INDEX/DATA、整镜像和去重后的21个文件（copy.bin与03.bin共享）
+    assert result['checked'] == 1 + 5 + 1 + 21
+
+    with open_cart(str(out_path)) as cart:
+        entry = cart.find('assets/07.bin')
+        data_offset = cart.slot(AddrTable.SLOT_DATA)[0]
+    corrupt_at = data_offset + entry['offset'] + 100
+    image = bytearray(out_path.read_bytes())
+    image[corrupt_at] ^= 0xFF
+    out_path.write_bytes(image)
+
+    result = verify_module.verify_cart(str(out_path), jobs=3)
+    assert result['status'] == 'error'
+    failures = {failure['check']: failure for failure in result['failures']}
+    assert set(failures) == {'slot', 'image', 'entry'}
+    assert failures['slot']['name'] == 'DATA' and failures['slot']['offset'] == data_offset
+    assert failures['entry']['name'] == 'assets/07.bin'
+    assert failures['entry']['offset'] == data_offset + entry['offset'] and failures['entry']['size'] == entry['size']
+    assert failures['entry']['expected'] == f"0x{entry['crc32']:08X}" != failures['entry']['actual']
+
+
+def test_verify_cart_directory_mode(tmp_path, monkeypatch):
+    """测试目录模式并行校验多个cart"""
+    out_path = _build_cart(tmp_path, monkeypatch)
+    sd = tmp_path / 'sd'
+    (sd / 'games').mkdir(parents=True)
+    shutil.copy(out_path, sd / 'a.bin')
+    shutil.copy(out_path, sd / 'games' / 'b.bin')
+    image = bytearray(out_path.read_bytes())
+    image[0x20] ^= 0x01
+    (sd / 'games' / 'c.bin').write_bytes(image)
+    (sd / 'games' / 'junk.bin').write_bytes(b'\x00' * 100)
+
+    summary = verify_cart([str(sd)], workers=2)
+    assert (summary['total'], summary['ok'], summary['failed']) == (4, 2, 2)
+    carts = {result['path']: result for result in summary['carts']}
+    assert [failure['check'] for failure in carts[str(sd / 'games' / 'c.bin')]['failures']] == ['header', 'image']
+    assert carts[str(sd / 'games' / 'junk.bin')]['failures'][0]['message'].startswith('Not a cart image')
+
+
+def test_verify_cart_survives_corrupt_address_table(tmp_path, monkeypatch):
+    """测试DATA段偏移超出镜像时跳过依赖DATA的检查，批量校验不中断"""
+    out_path = _build_cart(tmp_path, monkeypatch)
+    image = bytearray(out_path.read_bytes())
+    _, data_size, data_crc = AddrTable.read_slot(image, AddrTable.SLOT_DATA)
+    AddrTable.write_slot(image, AddrTable.SLOT_DATA, len(image) + 4096, data_size, data_crc)
+    bad_path = tmp_path / 'bad.bin'
+    bad_path.write_bytes(image)
+
+    result = verify_module.verify_cart(str(bad_path), jobs=2)
+    assert result['status'] == 'error'
+    assert [failure['message'] for failure in result['failures'] if failure['check'] == 'slot'] == ['segment out of image range']
+    assert not any(failure['check'] == 'entry' for failure in result['failures'])
+
+    # 单个cart校验抛出的意外异常只记为该cart的错误
+    def explode(cart_path, jobs=1):
+        if cart_path == str(bad_path):
+            raise RuntimeError('boom')
+        return real_verify(cart_path, jobs)
+
+    real_verify = verify_module.verify_cart
+    monkeypatch.setattr(verify_module, 'verify_cart', explode)
+    summary = verify_module.verify_carts([str(out_path), str(bad_path)], workers=2)
+    assert (summary['total'], summary['ok'], summary['failed']) == (2, 1, 1)
+    carts = {result['path']: result for result in summary['carts']}
+    assert carts[str(bad_path)]['failures'][0]['message'] == 'boom'
+
+
+def test_verify_cart_zeroed_crc_fields_fail_when_flagged(tmp_path, monkeypatch):
+    """测试Header flags声明启用时，被清零的Header CRC和条目crc32按损坏报告"""
+    out_path = _build_cart(tmp_path, monkeypatch)
+    with open_cart(str(out_path)) as cart:
+        index_offset = cart.slot(AddrTable.SLOT_INDEX)[0]
+        entries_off = cart.index_header['entries_off']
+        position = [entry['path'] for entry in cart.entries()].index('assets/07.bin')
+    image = bytearray(out_path.read_bytes())
+    # 条目crc32位于条目内偏移16
+    crc_at = index_offset + entries_off + position * 32 + 16
+    image[crc_at:crc_at + 4] = bytes(4)
+    manf_crc_at = AddrTable.slot_offset(AddrTable.SLOT_MANF) + 12
+    image[manf_crc_at:manf_crc_at + 4] = bytes(4)
+    image[0x0FFC:0x1000] = bytes(4)
+    out_path.write_bytes(image)
+
+    result = verify_module.verify_cart(str(out_path))
+    assert result['status'] == 'error' and result['skipped'] == []
+    failures = {(failure['check'], failure['name']) for failure in result['failures']}
+    assert ('header', 'HEADER') in failures
+    assert ('slot', 'MANF') in failures
+    assert ('entry', 'assets/07.bin') in failures
+
+
+def test_verify_cart_reports_skipped_checks(tmp_path, monkeypatch):
+    """测试未启用的CRC检查记录在skipped中"""
+    out_path = _build_cart(tmp_path, monkeypatch)
+    config = json.loads((tmp_path / 'pack.json').read_text())
+    config['hash'] = {'header_crc32': False, 'per_file_crc32': False}
+    (tmp_path / 'pack.json').write_text(json.dumps(config))
+    pack_header_icon(str(tmp_path / 'pack.json'), str(out_path))
+
+    result = verify_module.verify_cart(str(out_path))
+    assert result['status'] == 'ok'
+    assert result['skipped'] == [
+        {'check': 'header', 'name': 'HEADER', 'message': 'header CRC32 not enabled'},
+        {'check': 'image', 'name': 'IMAGE_CRC', 'message': 'image CRC32 not enabled'},
+        {'check': 'entry', 'name': 'INDEX', 'message': 'per-file CRC32 not enabled', 'count': 22},
+    ]
+
+
+def test_verify_cart_skips_segment_crc_when_disabled(tmp_path, monkeypatch):
+    """测试关闭per_chunk_crc32时段CRC32写0，校验时记录在skipped中"""
+    out_path = _build_cart(tmp_path, monkeypatch)
+    config = json.loads((tmp_path / 'pack.json').read_text())
+    config['hash'] = {'image_crc32': False, 'per_chunk_crc32': False, 'per_file_crc32': False}
+    (tmp_path / 'pack.json').write_text(json.dumps(config))
+    pack_header_icon(str(tmp_path / 'pack.json'), str(out_path))
+
+    with open_cart(str(out_path)) as cart:
+        assert cart.slot(AddrTable.SLOT_ICON)[2] == 0
+        assert cart.slot(AddrTable.SLOT_DATA)[2] == 0
+
+    result = verify_module.verify_cart(str(out_path))
+    assert result['status'] == 'ok'
+    skipped = {(item['check'], item['name']) for item in result['skipped']}
+    assert {('slot', 'ICON'), ('slot', 'MANF'), ('slot', 'ENTRY'), ('slot', 'INDEX'), ('slot', 'DATA')} <= skipped
+    assert ('header', 'HEADER') not in skipped
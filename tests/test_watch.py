@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from PIL import Image
+from xhcart_core.api import pack_header_icon
+from xhcart_core.pipeline.watch import CartWatcher
+from xhcart_core.tools import luavm
+
+
+def _make_project(tmp_path, monkeypatch):
+    """生成测试工程（chunk目录在pack.json目录之外），并使用测试用luavm"""
+    fake_luavm = tmp_path / 'luavm'
+    fake_luavm.write_text('#!/bin/sh\nprintf \'\\033LuaT\' > "$3" && cat "$2" >> "$3"\n')
+    fake_luavm.chmod(0o755)
+    monkeypatch.setattr(luavm, 'get_luavm_path', lambda: str(fake_luavm))
+    monkeypatch.setenv('XHCART_NO_CACHE', '1')
+
+    project = tmp_path / 'project'
+    (project / 'script').mkdir(parents=True)
+    (project / 'script' / 'main.lua').write_bytes(b'print(1)\n')
+    (tmp_path / 'shared' / 'assets' / 'sub').mkdir(parents=True)
+    (tmp_path / 'shared' / 'assets' / 'sub' / 'a.bin').write_bytes(b'A' * 100)
+    Image.new('RGBA', (8, 8), (255, 0, 0, 255)).save(tmp_path / 'icon.png')
+    pack_json = project / 'pack.json'
+    pack_json.write_text(json.dumps({
+        'format': 'XHGC_PACK',
+        'pack_version': 1,
+        'meta': {'title': 'T', 'version': '1', 'cart_id': '0x1', 'entry': 'app/main.lua'},
+        'icon': {'path': '../icon.png'},
+        'chunks': [
+            {'type': 'LUA', 'glob': 'script/*.lua', 'strip_prefix': 'script/', 'name_prefix': 'app/'},
+            {'type': 'RES', 'glob': '../shared/assets/**/*', 'strip_prefix': '../shared/assets/', 'name_prefix': 'assets/'},
+        ],
+    }))
+    return pack_json
+
+
+def test_watch_roots_and_snapshot(tmp_path, monkeypatch):
+    """测试监视根包含pack.json目录、icon和glob根，输出文件不进入快照"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    project = pack_json.parent
+    out_path = project / 'cart.bin'
+    watcher = CartWatcher(str(pack_json), str(out_path), rebuild=lambda: None)
+
+    roots = watcher.watch_roots()
+    assert roots == [
+        (project, False),
+        (tmp_path / 'icon.png', False),
+        (project / 'script', True),
+        (tmp_path / 'shared' / 'assets', True),
+    ]
+
+    before = watcher.snapshot(roots)
+    assert str(tmp_path / 'shared' / 'assets' / 'sub' / 'a.bin') in before
+
+    pack_header_icon(str(pack_json), str(out_path))
+    (project / '.cart.bin.abc123.tmp').write_bytes(b'partial')
+    assert watcher.diff(before, watcher.snapshot(roots)) == []
+
+    # 名字以tmp开头的普通输入文件仍会触发构建
+    (project / 'tmp_sprite.png').write_bytes(b'sprite')
+    assert watcher.diff(before, watcher.snapshot(roots)) == [str(project / 'tmp_sprite.png')]
+    (project / 'tmp_sprite.png').unlink()
+
+    (project / 'script' / 'main.lua').write_bytes(b'print(22)\n')
+    assert watcher.diff(before, watcher.snapshot(roots)) == [str(project / 'script' / 'main.lua')]
+
+
+def test_watch_rebuilds_after_change(tmp_path, monkeypatch, capsys):
+    """测试修改资源后合并为一次增量构建"""
+    pack_json = _make_project(tmp_path, monkeypatch)
+    out_path = pack_json.parent / 'build' / 'cart.bin'
+    asset = tmp_path / 'shared' / 'assets' / 'sub' / 'a.bin'
+
+    def rebuild():
+        pack_header_icon(str(pack_json), str(out_path))
+
+    watcher = CartWatcher(str(pack_json), str(out_path), rebuild, poll_interval=0.02, debounce=0.2)
+    thread = threading.Thread(target=watcher.run, kwargs={'max_builds': 2})
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while watcher.builds < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        first = out_path.read_bytes()
+        # 连续多次保存只触发一次构建
+        for i in range(3):
+            asset.write_bytes(b'B' * (200 + i))
+            time.sleep(0.02)
+    finally:
+        thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert watcher.builds == 2
+    assert out_path.read_bytes() != first
+    assert b'B' * 202 in out_path.read_bytes()
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    watch = [record for record in records if record['step'] == 'watch']
+    assert [record['status'] for record in watch] == ['ok', 'watching', 'rebuild', 'ok']
+    assert watch[2]['paths'] == [str(asset)]
+    assert any(record['step'] == 'data' for record in records)